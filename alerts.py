@@ -0,0 +1,412 @@
+import logging
+import os
+import random
+import smtplib
+import ssl
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from email.message import EmailMessage
+from email.utils import make_msgid
+
+from sqlalchemy import and_, func, insert, or_
+
+import metrics
+from models import db, AlertOutbox, User, utcnow
+
+logger = logging.getLogger(__name__)
+
+# Mail-Benachrichtigungen für neue Treffer gespeicherter Suchen.
+# saved_searches.poll -> enqueue() schreibt die Treffer in alert_outbox (Bulk-INSERT, kein SMTP im Poll-Pfad).
+# Der Dispatcher (worker.py) fasst pro User alle Treffer eines Digest-Fensters zu einer Mail zusammen und
+# verschickt sie über einen kleinen Pool offener SMTP-Verbindungen, gedrosselt und mit Retry/Backoff.
+SENDER_EMAIL = os.getenv("SENDER_EMAIL")
+EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER") or SENDER_EMAIL
+# 587: STARTTLS, 465: SMTP_SSL=1; lokale Test-Senke: SMTP_STARTTLS=0
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+SMTP_SSL = os.getenv("SMTP_SSL", "0") == "1"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "20"))
+SMTP_POOL_SIZE = int(os.getenv("ALERT_SMTP_POOL", "2"))
+# viele Provider trennen nach N Mails pro Verbindung -> vorher selbst neu verbinden
+SMTP_MAX_PER_CONN = int(os.getenv("ALERT_SMTP_MAX_PER_CONN", "100"))
+SMTP_MAX_IDLE = 60
+
+# Treffer kommen oft schubweise: erst senden, wenn der älteste so lange wartet (alles bis dahin in eine Mail)
+DIGEST_WINDOW = int(os.getenv("ALERT_DIGEST_WINDOW", "300"))
+DIGEST_MAX_ITEMS = int(os.getenv("ALERT_DIGEST_MAX_ITEMS", "50"))
+RATE_PER_MINUTE = float(os.getenv("ALERT_RATE_PER_MINUTE", "60"))
+MAX_ATTEMPTS = int(os.getenv("ALERT_MAX_ATTEMPTS", "5"))
+BACKOFF_BASE = float(os.getenv("ALERT_BACKOFF_BASE", "30"))
+BACKOFF_MAX = float(os.getenv("ALERT_BACKOFF_MAX", "3600"))
+BATCH_USERS = int(os.getenv("ALERT_BATCH_USERS", "50"))
+TICK_SECONDS = float(os.getenv("ALERT_TICK", "5"))
+RETENTION_DAYS = int(os.getenv("ALERT_RETENTION_DAYS", "7"))
+LEASE_SECONDS = 300
+INSERT_CHUNK = 1000
+PURGE_INTERVAL = 3600
+ITEM_FIELDS = ("id", "title", "price", "currency", "url", "image")
+
+alerts_queued = metrics.registry.counter("alerts_queued_total", "Treffer in der Mail-Outbox")
+alert_mails = metrics.registry.counter("alert_mails_total", "Digest-Mails nach Ergebnis", ("result",))
+
+
+class AlertError(Exception):
+    # nicht zustellbar, Retry sinnlos (User gelöscht, keine Adresse)
+    pass
+
+
+def enabled():
+    return bool(SENDER_EMAIL)
+
+
+# -------------------------
+# Outbox
+# -------------------------
+def enqueue(saved, items):
+    # Hook für saved_searches.on_new_items; nur die Felder, die die Mail braucht
+    if not enabled() or not items:
+        return 0
+    now = utcnow()
+    rows = [
+        {"user_id": saved.user_id, "saved_search_id": saved.id, "search_query": saved.search_query,
+         "item": {k: item.get(k) for k in ITEM_FIELDS}, "status": "pending", "attempts": 0,
+         "next_attempt_at": now, "created_at": now}
+        for item in items
+    ]
+    for start in range(0, len(rows), INSERT_CHUNK):
+        db.session.execute(insert(AlertOutbox), rows[start:start + INSERT_CHUNK])
+    db.session.commit()
+    alerts_queued.inc(len(rows))
+    return len(rows)
+
+
+def _claimable(now):
+    # fällig oder von einem abgestürzten Worker liegengelassen
+    return or_(
+        and_(AlertOutbox.status == "pending", AlertOutbox.next_attempt_at <= now),
+        and_(AlertOutbox.status == "sending", AlertOutbox.locked_until < now),
+    )
+
+
+def due_users(limit=BATCH_USERS, now=None):
+    # User, deren ältester offener Treffer das Digest-Fenster hinter sich hat; am längsten wartende zuerst
+    now = now or utcnow()
+    cutoff = now - timedelta(seconds=DIGEST_WINDOW)
+    rows = (
+        db.session.query(AlertOutbox.user_id)
+        .filter(_claimable(now))
+        .group_by(AlertOutbox.user_id)
+        .having(func.min(AlertOutbox.created_at) <= cutoff)
+        .order_by(func.min(AlertOutbox.created_at))
+        .limit(limit)
+        .all()
+    )
+    return [row[0] for row in rows]
+
+
+def claim(user_id, now=None):
+    # alle fälligen Treffer des Users auf einmal leasen; bei mehreren Workern gewinnt genau einer
+    now = now or utcnow()
+    token = uuid.uuid4().hex
+    updated = (
+        AlertOutbox.query.filter(AlertOutbox.user_id == user_id, _claimable(now))
+        .update({
+            AlertOutbox.status: "sending",
+            AlertOutbox.locked_by: token,
+            AlertOutbox.locked_until: now + timedelta(seconds=LEASE_SECONDS),
+            AlertOutbox.attempts: AlertOutbox.attempts + 1,
+        }, synchronize_session=False)
+    )
+    db.session.commit()
+    return token if updated else None
+
+
+def backoff(attempts):
+    return min(BACKOFF_MAX, BACKOFF_BASE * (2 ** (attempts - 1))) * random.uniform(0.5, 1.5)
+
+
+def is_permanent(error):
+    # 5xx zu Empfänger/Inhalt: Wiederholen hilft nicht. 4xx sowie Login-/Absenderfehler (Konfiguration) -> Retry
+    if isinstance(error, AlertError):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(500 <= code < 600 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPDataError) and 500 <= error.smtp_code < 600
+
+
+def format_price(item):
+    price = item.get("price")
+    if price is None:
+        return "Preis unbekannt"
+    if isinstance(price, (int, float)):
+        price = f"{price:.2f}"
+    currency = item.get("currency")
+    return f"{price} {'€' if currency in (None, 'EUR') else currency}"
+
+
+def build_message(user, rows, total):
+    groups = {}
+    for row in rows:
+        groups.setdefault(row.search_query, []).append(row.item or {})
+    if len(groups) == 1:
+        subject = f"🔔 {total} neue Treffer für „{next(iter(groups))}“"
+    else:
+        subject = f"🔔 {total} neue Treffer für deine gespeicherten Suchen"
+    lines = ["Hallo,", "", "es gibt neue Angebote zu deinen gespeicherten Suchen:", ""]
+    for query, items in groups.items():
+        lines.append(f"„{query}“")
+        for item in items:
+            lines.append(f"  • {item.get('title') or 'Ohne Titel'} – {format_price(item)}")
+            if item.get("url"):
+                lines.append(f"    {item['url']}")
+        lines.append("")
+    if total > len(rows):
+        lines.append(f"… und {total - len(rows)} weitere Treffer.")
+        lines.append("")
+    lines.append("Du bekommst diese Mail, weil du Suchen gespeichert hast.")
+
+    message = EmailMessage()
+    message["Subject"] = subject
+    message["From"] = SENDER_EMAIL
+    message["To"] = user.email
+    message["Message-ID"] = make_msgid()
+    message.set_content("\n".join(lines))
+    return message
+
+
+def deliver(user_id, pool, limiter):
+    # ein Digest für einen User: claimen -> Mail bauen -> senden -> Zeilen abschließen bzw. zurückstellen
+    token = claim(user_id)
+    if token is None:
+        return None
+    claimed = AlertOutbox.query.filter(AlertOutbox.locked_by == token, AlertOutbox.status == "sending")
+    attempts = 1
+    try:
+        total = claimed.count()
+        rows = claimed.order_by(AlertOutbox.id).limit(DIGEST_MAX_ITEMS).all()
+        attempts = max((row.attempts for row in rows), default=attempts)
+        user = db.session.get(User, user_id)
+        if user is None or not user.email:
+            raise AlertError(f"User {user_id} hat keine Mail-Adresse")
+        message = build_message(user, rows, total)
+        limiter.acquire()
+        pool.send(message)
+    except Exception as e:
+        db.session.rollback()
+        failed = is_permanent(e) or attempts >= MAX_ATTEMPTS
+        claimed.update({
+            AlertOutbox.status: "failed" if failed else "pending",
+            AlertOutbox.next_attempt_at: utcnow() + timedelta(seconds=backoff(attempts)),
+            AlertOutbox.locked_by: None,
+            AlertOutbox.locked_until: None,
+            AlertOutbox.last_error: str(e)[:500],
+        }, synchronize_session=False)
+        db.session.commit()
+        alert_mails.inc(result="failed" if failed else "retry")
+        logger.warning("Alert-Mail an User %s fehlgeschlagen (%s): %s", user_id,
+                       "endgültig" if failed else f"Versuch {attempts}", e)
+        return False
+    # alle geclaimten Zeilen gelten als zugestellt, auch die über DIGEST_MAX_ITEMS ("… und N weitere")
+    claimed.update({
+        AlertOutbox.status: "sent",
+        AlertOutbox.sent_at: utcnow(),
+        AlertOutbox.locked_by: None,
+        AlertOutbox.locked_until: None,
+    }, synchronize_session=False)
+    db.session.commit()
+    alert_mails.inc(result="sent")
+    return True
+
+
+def purge(days=RETENTION_DAYS):
+    cutoff = utcnow() - timedelta(days=days)
+    deleted = (
+        AlertOutbox.query.filter(AlertOutbox.status.in_(("sent", "failed")), AlertOutbox.created_at < cutoff)
+        .delete(synchronize_session=False)
+    )
+    db.session.commit()
+    return deleted
+
+
+# -------------------------
+# SMTP
+# -------------------------
+SESSION_INTACT = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+class SMTPPool:
+    # offene Verbindungen wiederverwenden: TLS-Handshake + Login kosten sonst pro Mail mehrere Roundtrips
+    def __init__(self, size=SMTP_POOL_SIZE, host=SMTP_HOST, port=SMTP_PORT, user=SMTP_USER,
+                 password=EMAIL_PASSWORD, starttls=SMTP_STARTTLS, use_ssl=SMTP_SSL, timeout=SMTP_TIMEOUT,
+                 max_per_conn=SMTP_MAX_PER_CONN):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.max_per_conn = max_per_conn
+        self.slots = threading.BoundedSemaphore(size)
+        self.idle = []  # [Verbindung, gesendet, zuletzt benutzt]
+        self.lock = threading.Lock()
+        self.connects = 0
+
+    def _connect(self):
+        if self.use_ssl:
+            conn = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout,
+                                    context=ssl.create_default_context())
+        else:
+            conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                conn.starttls(context=ssl.create_default_context())
+        if self.user and self.password:
+            conn.login(self.user, self.password)
+        self.connects += 1
+        return [conn, 0, time.monotonic()]
+
+    @staticmethod
+    def _close(entry):
+        try:
+            entry[0].quit()
+        except (smtplib.SMTPException, OSError):
+            entry[0].close()
+
+    @contextmanager
+    def connection(self):
+        with self.slots:
+            with self.lock:
+                entry = self.idle.pop() if self.idle else None
+            if entry is not None and (entry[1] >= self.max_per_conn
+                                      or time.monotonic() - entry[2] > SMTP_MAX_IDLE):
+                self._close(entry)
+                entry = None
+            if entry is None:
+                entry = self._connect()
+            try:
+                yield entry
+            except SESSION_INTACT:
+                # smtplib hat die Sitzung schon per RSET zurückgesetzt, Verbindung bleibt nutzbar
+                self._release(entry)
+                raise
+            except BaseException:
+                # Zustand der Sitzung unklar -> nicht zurück in den Pool
+                self._close(entry)
+                raise
+            self._release(entry)
+
+    def _release(self, entry):
+        entry[2] = time.monotonic()
+        with self.lock:
+            self.idle.append(entry)
+
+    def send(self, message):
+        for attempt in range(2):
+            try:
+                with self.connection() as entry:
+                    entry[0].send_message(message)
+                    entry[1] += 1
+                    return
+            except smtplib.SMTPServerDisconnected:
+                # Server hat die Verbindung im Leerlauf geschlossen: einmal frisch verbinden
+                if attempt:
+                    raise
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for entry in idle:
+            self._close(entry)
+
+
+class RateLimiter:
+    # Token-Bucket pro Prozess: im Schnitt per_minute Mails, Bursts bis zu 10 s Vorrat
+    def __init__(self, per_minute=RATE_PER_MINUTE, burst=None):
+        self.rate = per_minute / 60.0
+        self.burst = burst or max(1.0, self.rate * 10)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# -------------------------
+# Dispatcher
+# -------------------------
+class Dispatcher:
+    # pro Tick bis zu batch_users fällige Digests, parallel über den SMTP-Pool; bei vollem Batch sofort weiter
+    def __init__(self, app, pool=None, limiter=None, tick=TICK_SECONDS, batch_users=BATCH_USERS):
+        self.app = app
+        self.pool = pool or SMTPPool()
+        self.limiter = limiter or RateLimiter()
+        self.tick = tick
+        self.batch_users = batch_users
+        self._executor = ThreadPoolExecutor(max_workers=max(1, SMTP_POOL_SIZE), thread_name_prefix="alerts")
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_purge = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="alert-dispatcher")
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._executor.shutdown(wait=True)
+        self.pool.close()
+
+    def _deliver(self, user_id):
+        with self.app.app_context():
+            try:
+                return deliver(user_id, self.pool, self.limiter)
+            except Exception:
+                db.session.rollback()
+                logger.exception("Alert-Dispatcher: User %s fehlgeschlagen", user_id)
+                return False
+            finally:
+                db.session.remove()
+
+    def run_once(self):
+        # gibt die Anzahl bearbeiteter User zurück
+        with self.app.app_context():
+            try:
+                users = due_users(self.batch_users)
+                if time.monotonic() - self._last_purge > PURGE_INTERVAL:
+                    self._last_purge = time.monotonic()
+                    purge()
+            finally:
+                db.session.remove()
+        list(self._executor.map(self._deliver, users))
+        return len(users)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                handled = self.run_once()
+            except Exception:
+                logger.exception("Alert-Dispatcher: Tick fehlgeschlagen")
+                handled = 0
+            if handled < self.batch_users:
+                self._stop.wait(self.tick * random.uniform(0.8, 1.2))
@@ -0,0 +1,51 @@
+import hashlib
+import os
+import secrets
+
+from models import db, User
+from search_cache import MemoryCache
+
+# Bearer-Tokens für Skript-Clients (Batch-API): kein Login-Formular, keine Session.
+# Gespeichert wird nur der SHA-256-Hash; Auflösung Hash -> User-ID kurz im Prozess gecacht.
+TOKEN_CACHE_TTL = int(os.getenv("API_TOKEN_CACHE_TTL", "60"))
+PREFIX = "ebt_"
+
+_cache = MemoryCache(max_size=10000, ttl=TOKEN_CACHE_TTL)
+_MISSING = 0
+
+
+def token_hash(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def issue(user):
+    # neues Token, altes wird damit ungültig (spätestens nach TOKEN_CACHE_TTL in anderen Workern)
+    token = PREFIX + secrets.token_urlsafe(32)
+    if user.api_token_hash:
+        _cache.delete(user.api_token_hash)
+    user.api_token_hash = token_hash(token)
+    db.session.commit()
+    return token
+
+
+def revoke(user):
+    if user.api_token_hash:
+        _cache.delete(user.api_token_hash)
+        user.api_token_hash = None
+        db.session.commit()
+
+
+def resolve(token):
+    if not token or not token.startswith(PREFIX):
+        return None
+    digest = token_hash(token)
+    user_id = _cache.get(digest)
+    if user_id is None:
+        user_id = db.session.query(User.id).filter_by(api_token_hash=digest).scalar() or _MISSING
+        _cache.set(digest, user_id)
+    return user_id or None
+
+
+def from_header(value):
+    scheme, _, token = (value or "").partition(" ")
+    return resolve(token.strip()) if scheme.lower() == "bearer" else None
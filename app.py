@@ -1,70 +1,155 @@
-print("\U0001F7E2 App wird gestartet …")
-
+import hmac
+import ipaddress
+import json
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager, login_user, logout_user, login_required, UserMixin, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+import threading
+import time
+from datetime import timedelta
+
 from dotenv import load_dotenv
-import stripe
-import requests
 
-# ENV laden
+# ENV laden – vor den eigenen Modulen, die ihre Einstellungen beim Import lesen
 load_dotenv()
 
-# Stripe konfigurieren
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
-endpoint_secret = os.getenv("STRIPE_WEBHOOK_SECRET")
+from flask import (Flask, Response, current_app, render_template, request, redirect, url_for, flash, jsonify,
+                   stream_template, stream_with_context)
+from markupsafe import Markup
+from sqlalchemy.exc import SQLAlchemyError
+from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from werkzeug.security import generate_password_hash, check_password_hash
 
-# Flask App & Config
-app = Flask(__name__)
-app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "devkey")
-app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL", "sqlite:///instance/db.sqlite3")
+import alerts
+import api_tokens
+import assets
+import batch_search
+import config
+import db_profile
+import ebay_api
+import metrics
+import page_cache
+import pagination
+import rate_limit
+import stripe_catalog
+import stripe_client
 
 # Datenbank & Login
-from models import db, User
+from models import db, User, Job, SavedSearch, utcnow
+import jobs
+import listing_index
+import price_history
+import result_pipeline
+import saved_searches
+import stripe_events
+import thumbnails
+import user_cache
+from search_cache import create_cache, normalize_query
+from singleflight import RemoteFlightError, create_flight
+
+# Ergebnis-Cache für /search (TTL + LRU, memory oder sqlite)
+search_cache = create_cache()
+# gleiche Suchen gleichzeitig -> ein Upstream-Aufruf
+search_flight = create_flight()
+# Preisverlauf aller gesehenen Angebote
+price_store = price_history.PriceHistory()
 
-db.init_app(app)
 login_manager = LoginManager()
 login_manager.login_view = "login"
-login_manager.init_app(app)
+
+
+class Routes:
+    # sammelt Routen wie ein Blueprint, aber ohne Endpoint-Präfix (url_for("search") bleibt gleich);
+    # registriert werden sie erst in create_app()
+    def __init__(self):
+        self._deferred = []
+
+    def route(self, rule, **options):
+        endpoint = options.pop("endpoint", None)
+
+        def decorator(f):
+            self._deferred.append(lambda app: app.add_url_rule(rule, endpoint or f.__name__, f, **options))
+            return f
+        return decorator
+
+    def get(self, rule, **options):
+        return self.route(rule, methods=["GET"], **options)
+
+    def post(self, rule, **options):
+        return self.route(rule, methods=["POST"], **options)
+
+    def delete(self, rule, **options):
+        return self.route(rule, methods=["DELETE"], **options)
+
+    def errorhandler(self, code):
+        def decorator(f):
+            self._deferred.append(lambda app: app.register_error_handler(code, f))
+            return f
+        return decorator
+
+    def init_app(self, app):
+        for register in self._deferred:
+            register(app)
+
+
+routes = Routes()
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # aus dem Identitäts-Cache; DB nur bei Miss oder nach Invalidierung
+    return user_cache.load(user_id)
+
+@login_manager.request_loader
+def load_user_from_request(req):
+    # Skript-Clients: Authorization: Bearer <token> statt Login-Formular + Session
+    user_id = api_tokens.from_header(req.headers.get("Authorization"))
+    return user_cache.load(user_id) if user_id else None
+
+# Premium-Status per Stripe geändert -> zwischengespeicherte Identität verwerfen
+stripe_events.on_premium_change(lambda user: user_cache.invalidate(user.id))
+stripe_events.on_premium_change(lambda user: page_cache.invalidate_user(user.id))
 
 # -------------------------
 # Public Seiten
 # -------------------------
-@app.get("/public")
+@routes.get("/public")
+@page_cache.page()
 def public_home():
     return render_template("public_home.html")
 
-@app.get("/pricing")
+def pro_price():
+    # Anzeige des Pro-Preises aus dem Stripe-Katalog (None -> Template-Fallback)
+    return stripe_catalog.display(os.getenv("STRIPE_PRICE_PRO"))
+
+@routes.get("/pricing")
+@page_cache.page(version=stripe_catalog.version)
 def public_pricing():
-    return render_template("public_pricing.html")
+    return render_template("public_pricing.html", pro=pro_price())
 
-@app.get("/debug")
+@routes.get("/debug")
 def debug_simple():
     return {"alive": True}
 
+@routes.get("/ping")
+def ping():
+    return "pong"
+
 # -------------------------
 # Hauptseiten (Login nötig)
 # -------------------------
-@app.route('/')
+@routes.route('/')
 @login_required
 def home():
     return redirect(url_for("dashboard"))
 
-@app.route('/dashboard')
+@routes.route('/dashboard')
 @login_required
 def dashboard():
-    return render_template("dashboard.html", user=current_user)
+    return render_template("dashboard.html", user=current_user, jobs_queued=jobs.queue_depth(),
+                           perf=metrics.summary())
 
 # -------------------------
 # Auth
 # -------------------------
-@app.route('/login', methods=["GET", "POST"])
+@routes.route('/login', methods=["GET", "POST"])
 def login():
     if request.method == "POST":
         email = request.form["email"]
@@ -79,7 +164,7 @@ def login():
             return redirect(url_for("login"))
     return render_template("login.html")
 
-@app.route('/register', methods=["GET", "POST"])
+@routes.route('/register', methods=["GET", "POST"])
 def register():
     if request.method == "POST":
         email = request.form["email"]
@@ -91,75 +176,648 @@ def register():
         return redirect(url_for("login"))
     return render_template("register.html")
 
-@app.route("/logout")
+@routes.route("/logout")
 @login_required
 def logout():
     logout_user()
+    user_cache.clear_claims()
     flash("Abgemeldet.")
     return redirect(url_for("login"))
 
 # -------------------------
 # Suche (nur Premium)
 # -------------------------
-@app.route("/search", methods=["GET", "POST"])
+def search_cache_key(query, pages=1, marketplaces=()):
+    return normalize_query(query, {"pages": pages, "marketplaces": ",".join(sorted(marketplaces))})
+
+def ingest_results(query, items, pages=1, marketplaces=()):
+    # jedes Live-Ergebnis: Listing-Index + Preisverlauf; Fehler hier dürfen die Suche nicht stören
+    page_cache.invalidate_query(query)
+    try:
+        listing_index.ingest(query, items, pages, marketplaces)
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Listing-Index: Ingest fehlgeschlagen")
+    try:
+        full = price_store.record([(i.get("id") or i.get("url"), listing_index.parse_price(i.get("price")))
+                                   for i in items])
+        # weit überfällige Logs (Job-Worker läuft nicht/hängt hinterher) gleich hier kompaktieren
+        done = price_store.compact_overdue(full)
+        full = [shard for shard in full if shard not in done]
+        if full and not Job.query.filter_by(kind="price_history_compact", status="queued").first():
+            jobs.enqueue("price_history_compact", {"shards": full}, priority=-5)
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Preisverlauf: Aufzeichnung fehlgeschlagen")
+
+def price_overview(results):
+    # Preis-Check ist Beiwerk: Fehler im Preisverlauf dürfen die Ergebnisseite nicht kippen
+    if not results:
+        return None, {}
+    try:
+        stats = price_history.summarize(price_store.load([r.get("id") or r.get("url") for r in results]))
+    except Exception:
+        current_app.logger.exception("Preisverlauf: Laden fehlgeschlagen")
+        return None, {}
+    labels = {r.get("id") or r.get("url"): price_history.price_label(listing_index.parse_price(r.get("price")), stats)
+              for r in results}
+    return stats, labels
+
+def cached_or_stale(cache_key):
+    # frischer Cache-Eintrag; wird das eBay-Tagesbudget knapp, auch ein abgelaufener
+    results = search_cache.get(cache_key)
+    if results is None and rate_limit.low():
+        results = search_cache.get_stale(cache_key)
+        if results is not None:
+            rate_limit.upstream_budget.inc(decision="stale")
+    return results
+
+def cached_search(query, pages=1, marketplaces=()):
+    # Cache -> Single-Flight -> Upstream; wird auch von Jobs und Saved Searches genutzt
+    cache_key = search_cache_key(query, pages, marketplaces)
+    results = cached_or_stale(cache_key)
+    if results is not None:
+        return results
+
+    def fetch():
+        fetched = result_pipeline.process(query, ebay_api.search(query, pages=pages, marketplaces=marketplaces or None))
+        search_cache.set(cache_key, fetched)
+        ingest_results(query, fetched, pages, marketplaces)
+        return fetched
+
+    return search_flight.do(cache_key, fetch, lookup=lambda: search_cache.peek(cache_key))
+
+# Ergebnisseite: Items pro Seite, Blockgröße beim Streamen (Karten pro Flush)
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "48"))
+SEARCH_MAX_PAGE_SIZE = 200
+SEARCH_STREAM_CHUNK = int(os.getenv("SEARCH_STREAM_CHUNK", "12"))
+SEARCH_STREAM_DEFAULT = os.getenv("SEARCH_STREAM", "0") == "1"
+FLUSH_MARK = "<!--flush-->"
+
+def search_params():
+    args = request.args if request.method == "GET" else request.form
+    # Power-User: mehrere Seiten / Marktplätze (?pages=4&marketplaces=EBAY_DE,EBAY_AT)
+    pages = max(1, min(args.get("pages", 1, type=int) or 1, ebay_api.EBAY_MAX_PAGES))
+    marketplaces = tuple(m for m in (args.get("marketplaces") or "").upper().replace(" ", "").split(",")
+                         if m in ebay_api.EBAY_MARKETPLACES)
+    # Verfeinerung (Preis, Sortierung)
+    min_price = args.get("min_price", type=float)
+    max_price = args.get("max_price", type=float)
+    sort = args.get("sort", "relevance")
+    if sort not in listing_index.SORTS:
+        sort = "relevance"
+    # Seite: ?cursor=<opak>&page_size=48; Format: html | json | ndjson (auch per Accept-Header)
+    fmt = args.get("format")
+    if fmt not in ("html", "json", "ndjson"):
+        fmt = "ndjson" if request.accept_mimetypes.best == "application/x-ndjson" else "html"
+    stream = args.get("stream", type=int)
+    return {
+        "query": args.get("query"),
+        "pages": pages,
+        "marketplaces": marketplaces,
+        "min_price": min_price,
+        "max_price": max_price,
+        "sort": sort,
+        "refined": min_price is not None or max_price is not None or sort != "relevance",
+        "offset": pagination.decode_cursor(args.get("cursor")),
+        "page_size": max(1, min(args.get("page_size", SEARCH_PAGE_SIZE, type=int) or SEARCH_PAGE_SIZE,
+                                SEARCH_MAX_PAGE_SIZE)),
+        "format": fmt,
+        "stream": SEARCH_STREAM_DEFAULT if stream is None else bool(stream),
+    }
+
+def search_guard(params):
+    # Redirect-Response, falls die Suche nicht erlaubt ist (sonst None)
+    if not current_user.is_authenticated:
+        return login_manager.unauthorized()
+    if not current_user.is_premium:
+        flash("Nur Premium-Nutzer dürfen diese Funktion nutzen.", "danger")
+        return redirect(url_for("dashboard"))
+    if not params["query"]:
+        flash("Bitte gib einen Suchbegriff ein.", "warning")
+        return redirect(url_for("dashboard"))
+    return None
+
+def local_limit(params):
+    # so viele Treffer, wie die Live-Suche in diesem Umfang liefern kann (Seiten × Seitengröße × Marktplätze)
+    return params["pages"] * ebay_api.EBAY_PAGE_SIZE * max(1, len(params["marketplaces"]))
+
+def local_results(params):
+    # Wiederholungen/Verfeinerungen lokal aus dem Listing-Index beantworten (None = live holen)
+    try:
+        if not listing_index.covered(params["query"], params["pages"], params["marketplaces"]):
+            return None
+        results = listing_index.search(params["query"], params["min_price"], params["max_price"], params["sort"],
+                                       limit=local_limit(params), max_age=listing_index.FRESHNESS_SECONDS)
+    except SQLAlchemyError:
+        # z. B. listing_fts fehlt (Setup ohne Migration/ensure_schema): Index ist nur Abkürzung -> live holen
+        db.session.rollback()
+        current_app.logger.exception("Listing-Index: lokale Suche fehlgeschlagen")
+        return None
+    if not results and not params["refined"]:
+        return None
+    return result_pipeline.process(params["query"], results, sort=params["sort"])
+
+def refine_results(params, results):
+    # Preisfilter/Sortierung auf schon verarbeiteten Treffern (kein zweiter Pipeline-Lauf: Dubletten und
+    # Relevanz stehen fest); "newest" braucht den Abrufzeitpunkt aus dem Listing-Index
+    if not params["refined"]:
+        return results
+    if params["sort"] == "newest":
+        try:
+            rows = listing_index.search(params["query"], params["min_price"], params["max_price"], params["sort"],
+                                        limit=local_limit(params))
+        except SQLAlchemyError:
+            db.session.rollback()
+            current_app.logger.exception("Listing-Index: Sortierung nach Abrufzeit fehlgeschlagen")
+        else:
+            # Rohzeilen aus dem Index -> einmal durch die Pipeline, Reihenfolge bleibt
+            return result_pipeline.process(params["query"], rows, sort="newest")
+    results = result_pipeline.filter_price(results, params["min_price"], params["max_price"])
+    return result_pipeline.sort_items(results, params["sort"])
+
+def page_url(cursor):
+    # gleiche Suche (inkl. POST-Formularfeldern), andere Seite
+    args = {k: v for k, v in request.values.items() if k not in ("cursor", "stream")}
+    if cursor:
+        args["cursor"] = cursor
+    return url_for("search", **args)
+
+def page_links(params, next_offset):
+    offset = params["offset"]
+    prev_url = page_url(pagination.encode_cursor(max(0, offset - params["page_size"]))) if offset else None
+    next_cursor = pagination.encode_cursor(next_offset) if next_offset else None
+    return prev_url, next_cursor, page_url(next_cursor) if next_cursor else None
+
+def ndjson_lines(params, pages, state):
+    # eine JSON-Zeile pro Item, sobald es da ist; Abschlusszeile mit Cursor/Fehler
+    yield json.dumps({"type": "meta", "query": params["query"], "offset": params["offset"]}) + "\n"
+    for page in pages:
+        for item in page:
+            yield json.dumps({"type": "item", **item}, ensure_ascii=False) + "\n"
+    next_offset = state.get("next_offset")
+    yield json.dumps({"type": "end", "total": state.get("total", 0), "error": state.get("error"),
+                      "next_cursor": pagination.encode_cursor(next_offset) if next_offset else None}) + "\n"
+
+def render_results(params, results, error=None):
+    # eine Seite aus der vollständigen Liste (html, json oder ndjson)
+    state = {"error": error}
+    page = list(pagination.window([results], params["offset"], params["page_size"], state))
+    page = page[0] if page else []
+    if params["format"] == "ndjson":
+        return Response(ndjson_lines(params, [page], state), mimetype="application/x-ndjson")
+    prev_url, next_cursor, next_url = page_links(params, state["next_offset"])
+    if params["format"] == "json":
+        # ETag aus dem Inhalt: Wiederholungen ohne Änderung -> 304 ohne Body
+        etag = page_cache.digest(params["query"], page, state["total"], next_cursor, error)
+        return page_cache.respond(etag, lambda: jsonify({"query": params["query"], "items": page,
+                                                         "total": state["total"], "next_cursor": next_cursor,
+                                                         "error": error}))
+
+    def grid():
+        price_stats, price_labels = price_overview(page)
+        return render_template("_results_grid.html", results=page, error=error, price_stats=price_stats,
+                               price_labels=price_labels, total=state["total"], offset=params["offset"],
+                               prev_url=prev_url, next_url=next_url)
+
+    # Fragment pro User/Query/Ergebnisversion: Karten + Preis-Check nur bei neuen Ergebnissen rendern
+    version = page_cache.digest(page, state["total"], params["offset"], prev_url, next_url, error)
+    etag, html = page_cache.fragment(page_cache.fragment_key(current_user.id, params["query"], version), grid)
+    return page_cache.respond(page_cache.digest(etag, params["query"]),
+                              lambda: render_template("ebay_results.html", query=params["query"], grid=Markup(html)))
+
+def stale_results(params):
+    return search_cache.get_stale(search_cache_key(params["query"], params["pages"], params["marketplaces"]))
+
+STALE_NOTICE = "Suchdienst derzeit nicht erreichbar – zeige zwischengespeicherte Ergebnisse."
+
+def render_upstream_error(params, e):
+    # Upstream down / Circuit offen: alte Ergebnisse zeigen statt Worker zu blockieren
+    stale = stale_results(params)
+    if stale is not None:
+        return render_results(params, stale, error=STALE_NOTICE)
+    return render_results(params, [], error=str(e))
+
+def search_batches(params, state):
+    # Ergebnislisten in Endreihenfolge; bei mehreren Seiten/Marktplätzen Stück für Stück vom Upstream
+    yielded = False
+    try:
+        results = local_results(params)
+        if results is None:
+            query, pages, marketplaces = params["query"], params["pages"], params["marketplaces"]
+            cache_key = search_cache_key(query, pages, marketplaces)
+            results = cached_or_stale(cache_key)
+            if results is None and not params["refined"] and (pages > 1 or len(marketplaces) > 1):
+                fetched = []
+                pipeline = result_pipeline.Pipeline(query)
+                for batch in ebay_api.iter_search(query, pages=pages, marketplaces=marketplaces or None):
+                    batch = pipeline.process(batch)
+                    if not batch:
+                        continue
+                    fetched.extend(batch)
+                    yielded = True
+                    yield batch
+                search_cache.set(cache_key, fetched)
+                ingest_results(query, fetched, pages, marketplaces)
+                return
+            if results is None:
+                results = cached_search(query, pages, marketplaces)
+            results = refine_results(params, results)
+        yield results
+    except (ebay_api.UpstreamError, RemoteFlightError) as e:
+        stale = None if yielded else stale_results(params)
+        state["error"] = STALE_NOTICE if stale is not None else str(e)
+        if stale is not None:
+            yield stale
+    except Exception as e:
+        current_app.logger.exception("Suche (Stream) fehlgeschlagen")
+        state["error"] = str(e)
+
+def flushed(fragments):
+    # Jinja liefert viele kleine Stücke -> sammeln und nur an den Flush-Marken senden
+    buffer = []
+    for fragment in fragments:
+        if fragment == FLUSH_MARK:
+            if buffer:
+                yield "".join(buffer)
+                buffer = []
+            continue
+        buffer.append(fragment)
+    if buffer:
+        yield "".join(buffer)
+
+def stream_results(params):
+    # Kopf sofort senden, Karten blockweise, während Upstream/Rendern noch laufen
+    state = {"error": None}
+    pages = pagination.window(search_batches(params, state), params["offset"], params["page_size"], state)
+    if params["format"] == "ndjson":
+        return Response(stream_with_context(ndjson_lines(params, pages, state)), mimetype="application/x-ndjson")
+
+    def chunks():
+        state["shown"] = 0
+        for chunk in pagination.rechunk(pages, SEARCH_STREAM_CHUNK):
+            state["shown"] += len(chunk)
+            yield chunk, price_overview(chunk)[1]
+        state["prev_url"], _, state["next_url"] = page_links(params, state["next_offset"])
+
+    return Response(flushed(stream_template("ebay_results.html", query=params["query"], stream=True,
+                                            chunks=chunks(), state=state, offset=params["offset"],
+                                            flush=Markup(FLUSH_MARK))),
+                    mimetype="text/html")
+
+@routes.route("/search", methods=["GET", "POST"])
 @login_required
 def search():
+    params = search_params()
+    denied = search_guard(params)
+    if denied is not None:
+        return denied
+    if params["format"] == "ndjson" or (params["stream"] and params["format"] == "html"):
+        return stream_results(params)
+
+    try:
+        results = local_results(params)
+        if results is None:
+            results = refine_results(params, cached_search(params["query"], params["pages"], params["marketplaces"]))
+    except (ebay_api.UpstreamError, RemoteFlightError) as e:
+        return render_upstream_error(params, e)
+    except Exception as e:
+        return render_results(params, [], error=str(e))
+
+    return render_results(params, results)
+
+@routes.get("/price-history")
+@login_required
+def price_history_query():
+    query = request.args.get("query", "")
+    if not query.strip():
+        return jsonify({"error": "query fehlt"}), 400
+    item_ids = [r["id"] for r in listing_index.search(query, limit=2000)]
+    data = price_store.load(item_ids)
+    return jsonify({"query": query, "stats": price_history.summarize(data)})
+
+@routes.get("/price-history/item/<path:item_id>")
+@login_required
+def price_history_item(item_id):
+    data = price_store.load([item_id])
+    return jsonify({"item_id": item_id, "stats": price_history.summarize(data),
+                    "series": price_history.item_series(data)})
+
+# -------------------------
+# Hintergrund-Jobs
+# -------------------------
+# Sync-Jobs: nur Premium (sonst Umweg um die /search-Sperre), Queries begrenzt, Priorität vom Server
+SYNC_MAX_QUERIES = int(os.getenv("SYNC_MAX_QUERIES", "10"))
+SYNC_PRIORITY = 10
+
+@jobs.handler("ebay_sync")
+def run_ebay_sync(payload, job):
+    # Suchen außerhalb des Request-Zyklus ausführen und den Such-Cache vorwärmen;
+    # ohne explizite Queries werden die gespeicherten Suchen des Nutzers sofort gepollt
+    owner = db.session.get(User, job.user_id) if job.user_id else None
+    if owner is None or not owner.is_premium:
+        # Premium inzwischen weg (oder Job ohne User): kein eBay-Budget verbrauchen
+        return {"synced": {}, "skipped": "kein Premium"}
+    synced = {}
+    for query in payload.get("queries", [])[:SYNC_MAX_QUERIES]:
+        results = result_pipeline.process(query, ebay_api.search(query))
+        search_cache.set(search_cache_key(query), results)
+        ingest_results(query, results)
+        synced[query] = len(results)
+    if not payload.get("queries") and job.user_id:
+        for saved in SavedSearch.query.filter_by(user_id=job.user_id).all():
+            synced[saved.search_query] = len(saved_searches.poll(saved, cached_search))
+    return {"synced": synced}
+
+@jobs.handler("price_history_compact")
+def run_price_history_compact(payload, job):
+    shards = payload.get("shards") or range(price_store.shards)
+    return {"compacted": sum(1 for shard in shards if price_store.compact(int(shard)))}
+
+def enqueue_stripe_events(delay=0):
+    # ein Job, der bis dahin fällig ist, reicht (Webhook-Bursts, Retries)
+    due = utcnow() + timedelta(seconds=delay)
+    if not Job.query.filter(Job.kind == "stripe_events", Job.status == "queued", Job.run_at <= due).first():
+        jobs.enqueue("stripe_events", priority=20, delay=delay)
+
+@jobs.handler("stripe_events")
+def run_stripe_events(payload, job):
+    processed = stripe_events.process_pending()
+    # zurückgestellte Events: eigener Job zum Backoff-Zeitpunkt, sonst blieben sie bis zum nächsten Webhook liegen
+    retry_in = stripe_events.next_retry_in()
+    if retry_in is not None:
+        enqueue_stripe_events(delay=retry_in)
+    return {"processed": processed, "retry_in": retry_in}
+
+@saved_searches.on_new_items
+def queue_alerts(saved, new_items):
+    # nur in die Outbox schreiben; Versand bündelt der Alert-Dispatcher (worker.py)
+    alerts.enqueue(saved, new_items)
+
+def sync_queries(queries):
+    # bereinigte Query-Liste oder ValueError mit Meldung
+    if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+        raise ValueError("queries muss eine Liste von Strings sein")
+    queries = [q.strip() for q in queries if q.strip()]
+    if len(queries) > SYNC_MAX_QUERIES:
+        raise ValueError(f"höchstens {SYNC_MAX_QUERIES} Queries pro Sync")
+    return queries
+
+@routes.get("/sync")
+@login_required
+def sync_get():
     if not current_user.is_premium:
         flash("Nur Premium-Nutzer dürfen diese Funktion nutzen.", "danger")
         return redirect(url_for("dashboard"))
+    try:
+        queries = sync_queries(request.args.getlist("q"))
+    except ValueError as e:
+        flash(str(e), "warning")
+        return redirect(url_for("dashboard"))
+    job = jobs.enqueue("ebay_sync", {"queries": queries}, user_id=current_user.id, priority=SYNC_PRIORITY)
+    flash(f"Sync eingeplant (Job #{job.id}).", "info")
+    return redirect(url_for("dashboard"))
 
-    query = request.args.get("query") if request.method == "GET" else request.form.get("query")
+@routes.post("/jobs")
+@login_required
+def job_enqueue():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "erwartet ein JSON-Objekt"}), 400
+    if data.get("kind") not in ("ebay_sync",):
+        return jsonify({"error": "unbekannter Job-Typ"}), 400
+    if not current_user.is_premium:
+        return jsonify({"error": "Nur Premium-Nutzer dürfen Jobs anlegen."}), 403
+    payload = data.get("payload") or {}
+    if not isinstance(payload, dict):
+        return jsonify({"error": "payload muss ein Objekt sein"}), 400
+    try:
+        queries = sync_queries(payload.get("queries", []))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    job = jobs.enqueue("ebay_sync", {"queries": queries}, user_id=current_user.id, priority=SYNC_PRIORITY)
+    return jsonify(job.to_dict()), 202
+
+@routes.get("/jobs/<int:job_id>")
+@login_required
+def job_status(job_id):
+    job = db.session.get(Job, job_id)
+    if job is None or job.user_id != current_user.id:
+        return jsonify({"error": "not found"}), 404
+    return jsonify(job.to_dict())
+
+# -------------------------
+# Gespeicherte Suchen (nur Premium)
+# -------------------------
+def _int_field(data, name, default, low, high):
+    value = data.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} muss eine ganze Zahl sein") from None
+    if not low <= value <= high:
+        raise ValueError(f"{name} muss zwischen {low} und {high} liegen")
+    return value
+
+def saved_search_params(data):
+    # (params, interval_seconds) oder ValueError mit Meldung
+    params = {}
+    pages = _int_field(data, "pages", None, 1, ebay_api.EBAY_MAX_PAGES)
+    if pages is not None:
+        params["pages"] = pages
+    if data.get("marketplaces"):
+        marketplaces = data["marketplaces"]
+        if isinstance(marketplaces, str):
+            marketplaces = marketplaces.split(",")
+        if not isinstance(marketplaces, list) or not all(isinstance(m, str) for m in marketplaces):
+            raise ValueError("marketplaces muss eine Liste oder kommagetrennt sein")
+        params["marketplaces"] = sorted(m.strip().upper() for m in marketplaces
+                                        if m.strip().upper() in ebay_api.EBAY_MARKETPLACES)
+    interval = _int_field(data, "interval_seconds", saved_searches.DEFAULT_INTERVAL,
+                          saved_searches.MIN_INTERVAL, saved_searches.MAX_INTERVAL)
+    return params, interval
+
+@routes.get("/saved-searches")
+@login_required
+def saved_search_list():
+    items = current_user.saved_searches.order_by(SavedSearch.created_at.desc()).all()
+    return jsonify([s.to_dict() for s in items])
+
+@routes.post("/saved-searches")
+@login_required
+def saved_search_create():
+    if not current_user.is_premium:
+        return jsonify({"error": "Nur Premium-Nutzer dürfen Suchen speichern."}), 403
+    data = request.get_json(silent=True) if request.is_json else request.form
+    if not isinstance(data, dict):
+        return jsonify({"error": "erwartet ein JSON-Objekt"}), 400
+    query = data.get("query")
+    if query is not None and not isinstance(query, str):
+        return jsonify({"error": "query muss ein Text sein"}), 400
+    query = (query or "").strip()
     if not query:
-        flash("Bitte gib einen Suchbegriff ein.", "warning")
-        return redirect(url_for("dashboard"))
+        return jsonify({"error": "query fehlt"}), 400
+    try:
+        params, interval = saved_search_params(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    saved = saved_searches.create(current_user, query, params, interval_seconds=interval)
+    return jsonify(saved.to_dict()), 201
 
+@routes.get("/saved-searches/<int:search_id>/new")
+@login_required
+def saved_search_new_items(search_id):
+    # neue Treffer seit dem letzten Abruf; ?ack=1 markiert sie als gelesen
+    saved = db.session.get(SavedSearch, search_id)
+    if saved is None or saved.user_id != current_user.id:
+        return jsonify({"error": "not found"}), 404
+    items = saved.last_new_items or []
+    if request.args.get("ack"):
+        saved.last_new_items = []
+        saved.new_count = 0
+        db.session.commit()
+    return jsonify({"id": saved.id, "query": saved.search_query, "new_items": items})
+
+@routes.delete("/saved-searches/<int:search_id>")
+@login_required
+def saved_search_delete(search_id):
+    saved = db.session.get(SavedSearch, search_id)
+    if saved is None or saved.user_id != current_user.id:
+        return jsonify({"error": "not found"}), 404
+    db.session.delete(saved)
+    db.session.commit()
+    return "", 204
+
+# -------------------------
+# API für Skript-Clients (Bearer-Token, nur Premium)
+# -------------------------
+def api_guard():
+    if not current_user.is_authenticated:
+        return jsonify({"error": "Authorization: Bearer <token> fehlt oder ungültig"}), 401
+    if not current_user.is_premium:
+        return jsonify({"error": "Nur Premium-Nutzer dürfen die API nutzen."}), 403
+    return None
+
+@routes.post("/api/token")
+@login_required
+def api_token_issue():
+    # neues Token (ersetzt das alte); wird nur dieses eine Mal angezeigt
+    denied = api_guard()
+    if denied is not None:
+        return denied
+    token = api_tokens.issue(db.session.get(User, current_user.id))
+    return jsonify({"token": token}), 201
+
+@routes.delete("/api/token")
+@login_required
+def api_token_revoke():
+    api_tokens.revoke(db.session.get(User, current_user.id))
+    return "", 204
+
+def batch_query(params):
+    # eine Batch-Query wie /search, nur ohne Rendern: (Items, Gesamtzahl, Fehler)
+    error = None
     try:
-        api_url = "https://ebay-agent-cockpit.onrender.com/search"
-        response = requests.get(api_url, params={"q": query}, timeout=10)
-        response.raise_for_status()
-        results = response.json()
-    except Exception as e:
-        return render_template("ebay_results.html", results=[], query=query, error=str(e))
+        results = local_results(params)
+        if results is None:
+            results = refine_results(params, cached_search(params["query"], params["pages"], params["marketplaces"]))
+    except (ebay_api.UpstreamError, RemoteFlightError) as e:
+        results = stale_results(params)
+        error = STALE_NOTICE if results is not None else str(e)
+        results = results or []
+    return results[:params["page_size"]], len(results), error
+
+@routes.post("/api/search/batch")
+def api_search_batch():
+    # {"queries": ["iphone", {"query": "ps5", "max_price": 400, "sort": "price_asc", "limit": 20}]}
+    # -> NDJSON, eine Zeile pro Query sobald fertig, zum Schluss {"type": "end", ...}
+    denied = api_guard()
+    if denied is not None:
+        return denied
+    try:
+        specs = batch_search.parse_batch(request.get_json(silent=True))
+    except batch_search.BatchError as e:
+        return jsonify({"error": str(e)}), 400
+    user_id = current_user.id
+    if not batch_search.acquire(user_id):
+        return jsonify({"error": "Es läuft bereits ein Batch."}), 429
+    granted, remaining = batch_search.reserve(user_id, len(specs))
+    if not granted:
+        batch_search.release(user_id)
+        return jsonify({"error": "Kontingent erschöpft", "reset_at": batch_search.reset_at()}), 429, \
+            {"Retry-After": str(max(1, batch_search.reset_at() - int(time.time())))}
 
-    return render_template("ebay_results.html", results=results, query=query)
+    def lines():
+        done = 0
+        try:
+            for result in batch_search.run(current_app._get_current_object(), specs[:granted], batch_query):
+                done += 1
+                yield json.dumps({"type": "result", **result}, ensure_ascii=False) + "\n"
+            for index, params in enumerate(specs[granted:], start=granted):
+                yield json.dumps({"type": "result", "index": index, "query": params["query"], "items": [],
+                                  "total": 0, "error": "Kontingent erschöpft"}, ensure_ascii=False) + "\n"
+            yield json.dumps({"type": "end", "queries": len(specs), "executed": done,
+                              "quota_remaining": remaining, "quota_reset_at": batch_search.reset_at()}) + "\n"
+        finally:
+            batch_search.refund(user_id, granted - done)
+            batch_search.release(user_id)
+
+    return Response(stream_with_context(lines()), mimetype="application/x-ndjson",
+                    headers={"X-Quota-Remaining": str(remaining)})
 
 # -------------------------
 # Premium / Stripe Checkout
 # -------------------------
-@app.route('/premium')
+@routes.route('/premium')
 @login_required
+@page_cache.page(public=False, version=stripe_catalog.version)
 def premium():
-    premium_price = os.getenv("PREMIUM_PRICE", "5.00")
-    return render_template('premium.html', price=premium_price)
+    pro = pro_price()
+    return render_template('premium.html', price=pro["amount"] if pro else os.getenv("PREMIUM_PRICE", "5.00"),
+                           currency=pro["currency"] if pro else "€")
+
+def checkout_params():
+    # Parameter für stripe.checkout.Session.create (auch vom ASGI-Pfad genutzt)
+    email = (request.form.get("email") or "").strip()
+    return dict(
+        mode="subscription",
+        line_items=[{"price": os.getenv("STRIPE_PRICE_PRO"), "quantity": 1}],
+        customer_email=email,
+        success_url=os.getenv("STRIPE_SUCCESS_URL", url_for("checkout_success", _external=True)),
+        cancel_url=os.getenv("STRIPE_CANCEL_URL", url_for("public_pricing", _external=True)),
+        allow_promotion_codes=True,
+    )
 
-@app.route("/checkout", methods=["GET","POST"])
+def checkout_failed(e):
+    flash(str(e) if isinstance(e, stripe_client.CheckoutBusy) else f"Stripe-Fehler: {e}", "danger")
+    return redirect(url_for("public_checkout"))
+
+@routes.route("/checkout", methods=["GET","POST"])
 def public_checkout():
     if request.method == "POST":
-        email = (request.form.get("email") or "").strip()
         try:
-            session = stripe.checkout.Session.create(
-                mode="subscription",
-                line_items=[{"price": os.getenv("STRIPE_PRICE_PRO"), "quantity": 1}],
-                customer_email=email,
-                success_url=os.getenv("STRIPE_SUCCESS_URL", url_for("checkout_success", _external=True)),
-                cancel_url=os.getenv("STRIPE_CANCEL_URL", url_for("public_pricing", _external=True)),
-                allow_promotion_codes=True,
-            )
+            with metrics.timed("stripe"):
+                session = stripe_client.create_checkout(**checkout_params())
             return redirect(session.url, code=303)
         except Exception as e:
-            flash(f"Stripe-Fehler: {e}", "danger")
-            return redirect(url_for("public_checkout"))
-    return render_template("public_checkout.html")
+            return checkout_failed(e)
+    return render_template("public_checkout.html", pro=pro_price())
 
-@app.get("/checkout/success")
+@routes.get("/checkout/success")
 def checkout_success():
     return render_template("checkout_success.html")
 
 # -------------------------
 # Debug-Route für Stripe
 # -------------------------
-@app.get("/_debug/stripe")
+@routes.get("/_debug/stripe")
 def debug_stripe():
+    # aus dem Katalog-Cache; ?refresh=1 (nur angemeldet) stößt einen Neuladen im Hintergrund an
+    refresh = bool(request.args.get("refresh"))
+    if refresh and not current_user.is_authenticated:
+        return login_manager.unauthorized()
     price_id = os.getenv("STRIPE_PRICE_PRO")
     result = {
         "STRIPE_SECRET_KEY_set": bool(os.getenv("STRIPE_SECRET_KEY")),
@@ -170,78 +828,193 @@ def debug_stripe():
         "error": None
     }
     try:
-        stripe.Price.list(limit=1)
-        result["can_list_prices"] = True
-        if price_id:
-            try:
-                stripe.Price.retrieve(price_id)
-                result["price_exists"] = True
-            except Exception as e:
-                result["error"] = str(e)
+        if refresh:
+            result["refresh_started"] = stripe_catalog.request_refresh()
+        catalog = stripe_catalog.get()
+        result["can_list_prices"] = catalog["fetched_at"] > 0
+        result["price_exists"] = bool(price_id) and price_id in catalog["prices"]
+        result["catalog_version"] = stripe_catalog.version()
+        result["catalog_age_s"] = round(time.time() - catalog["fetched_at"]) if catalog["fetched_at"] else None
+        result["error"] = stripe_catalog.last_error
     except Exception as e:
         result["error"] = str(e)
     return result
 
+@metrics.registry.collector
+def cache_metrics():
+    values = {"search": search_cache.stats(), "users": user_cache.stats()}
+    return [
+        ("cache_hits_total", "Cache-Treffer", "counter",
+         {(("cache", n), ("backend", st["backend"])): st["hits"] for n, st in values.items()}),
+        ("cache_misses_total", "Cache-Fehlgriffe", "counter",
+         {(("cache", n), ("backend", st["backend"])): st["misses"] for n, st in values.items()}),
+        ("cache_hit_ratio", "Trefferquote", "gauge",
+         {(("cache", n), ("backend", st["backend"])): st["hit_ratio"] for n, st in values.items()}),
+        ("jobs_queued", "Wartende Jobs", "gauge", {(): jobs.queue_depth()}),
+    ]
+
+def internal_address(addr):
+    try:
+        ip = ipaddress.ip_address(addr or "")
+    except ValueError:
+        return False
+    return ip.is_loopback or ip.is_private
+
+def internal_guard():
+    # Betriebsdaten: mit METRICS_TOKEN nur per "Authorization: Bearer <token>", sonst nur aus internen Netzen
+    # (remote_addr ist hinter dem Proxy dank PROXY_FIX_HOPS die echte Client-IP)
+    token = current_app.config.get("METRICS_TOKEN")
+    if token:
+        scheme, _, supplied = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(supplied.strip().encode(), token.encode()):
+            return None
+    elif internal_address(request.remote_addr):
+        return None
+    return jsonify({"error": "Nur intern erreichbar"}), 403
+
+@routes.get("/metrics")
+def metrics_endpoint():
+    denied = internal_guard()
+    if denied is not None:
+        return denied
+    return metrics.registry.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+@routes.get("/_debug/cache")
+def debug_cache():
+    denied = internal_guard()
+    if denied is not None:
+        return denied
+    return {"search": search_cache.stats(), "users": user_cache.stats(), "thumbs": thumbnails.cache.stats(),
+            "pages": page_cache.stats(), "upstream_budget": rate_limit.status()}
+
 # -------------------------
 # Einstellungen
 # -------------------------
-@app.route("/settings", methods=["GET", "POST"])
+@routes.route("/settings", methods=["GET", "POST"])
 @login_required
 def settings():
     message = ""
     if request.method == "POST":
+        user = db.session.get(User, current_user.id)
         if "email" in request.form:
-            current_user.email = request.form["email"]
+            user.email = request.form["email"]
             db.session.commit()
+            user_cache.invalidate(user.id)
             message = "E-Mail wurde aktualisiert."
         elif "password" in request.form:
-            current_user.password = generate_password_hash(request.form["password"])
+            user.password = generate_password_hash(request.form["password"])
             db.session.commit()
+            user_cache.invalidate(user.id)
             message = "Passwort wurde aktualisiert."
+        return render_template("settings.html", user=user, message=message)
     return render_template("settings.html", user=current_user, message=message)
 
 # -------------------------
 # Stripe Webhook
 # -------------------------
-@app.route("/webhook", methods=["POST"])
+@routes.route("/webhook", methods=["POST"])
 def stripe_webhook():
     payload = request.data
     sig_header = request.headers.get("Stripe-Signature", "")
+    stripe = stripe_client.get()
     try:
-        event = stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
+        event = stripe.Webhook.construct_event(payload, sig_header, current_app.config["STRIPE_WEBHOOK_SECRET"])
     except stripe.error.SignatureVerificationError as e:
         return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
-    if event["type"] == "checkout.session.completed":
-        session_obj = event["data"]["object"]
-        email = session_obj.get("customer_email")
-        user = User.query.filter_by(email=email).first()
-        if user:
-            user.is_premium = True
-            db.session.commit()
+    # Preis/Produkt geändert: Katalog (und damit Preisseite/Premium) neu laden, sonst nichts zu tun
+    if event["type"].startswith(("price.", "product.")):
+        stripe_catalog.invalidate()
+        return jsonify({"status": "success"}), 200
+
+    # nur speichern und sofort 200 – angewendet wird im Worker (Job "stripe_events");
+    # von Stripe wiederholte Zustellungen landen per Event-ID nur einmal in der Tabelle
+    if stripe_events.store(event):
+        enqueue_stripe_events()
 
     return jsonify({"status": "success"}), 200
 
 # -------------------------
 # Error Handler
 # -------------------------
-@app.errorhandler(404)
+@routes.errorhandler(404)
 def page_not_found(e):
     return render_template("404.html"), 404
 
-@app.get("/debug")
-def debug_simple():
-    return {"alive": True}
-
-@app.get("/routes")
+@routes.get("/routes")
 def list_routes():
     # zeig mir, was Flask tatsächlich registriert hat
-    return {"routes": [rule.rule for rule in app.url_map.iter_rules()]}
+    return {"routes": [rule.rule for rule in current_app.url_map.iter_rules()]}
+
+# -------------------------
+# App-Factory
+# -------------------------
+def proxy_fix(wsgi_app, hops):
+    # X-Forwarded-For/-Proto der letzten `hops` Proxies übernehmen (remote_addr, https in url_for)
+    from werkzeug.middleware.proxy_fix import ProxyFix
+
+    return ProxyFix(wsgi_app, x_for=hops, x_proto=hops)
+
+def create_app(profile=None, **overrides):
+    # baut nur Objekte – keine DB-/Netzverbindungen, keine Threads (sicher vor einem fork mit --preload)
+    app = Flask(__name__)
+    app.config.update(config.load(profile))
+    app.config.update(overrides)
+    # Pool-/Pragma-Profil (DB_POOL_*, SQLITE_*)
+    db_profile.init_app(app)
+    db.init_app(app)
+    if app.config["MIGRATIONS"]:
+        from flask_migrate import Migrate
+
+        Migrate(app, db)
+    if app.config["PROXY_FIX_HOPS"] > 0:
+        app.wsgi_app = proxy_fix(app.wsgi_app, app.config["PROXY_FIX_HOPS"])
+    metrics.init_app(app)
+    # 429 pro User/Route über alle Worker (RATE_LIMITS)
+    rate_limit.init_app(app)
+    # gehashte, vorkomprimierte Static-Dateien (python assets.py)
+    assets.init_app(app)
+    # verkleinerte Ergebnisbilder über /img/<sig>
+    thumbnails.init_app(app)
+    login_manager.init_app(app)
+    routes.init_app(app)
+
+    if app.config["JOBS_INPROCESS_WORKERS"] > 0:
+        # optional Worker-Threads im Web-Prozess (sonst worker.py separat); erst beim ersten Request,
+        # damit sie im Worker-Prozess nach dem fork laufen
+        started = threading.Lock()
+
+        @app.before_request
+        def start_inprocess_workers():
+            if started.acquire(blocking=False):
+                jobs.Worker(app, concurrency=app.config["JOBS_INPROCESS_WORKERS"]).start()
+
+    return app
+
+_default_app = None
+_default_lock = threading.Lock()
+
+def __getattr__(name):
+    # "gunicorn app:app", "from app import app", "flask --app app": Standard-App beim ersten Zugriff
+    global _default_app
+    if name != "app":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if _default_app is None:
+        with _default_lock:
+            if _default_app is None:
+                _default_app = create_app()
+    return _default_app
 
 # -------------------------
 # Start
 # -------------------------
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 10000)))
+    port = int(os.environ.get('PORT', 10000))
+    if os.getenv("SERVER_MODE", "wsgi") == "asgi":
+        # Async-Modus: /search und Checkout auf dem Event-Loop, Rest über WSGI-Bridge (asgi.py)
+        import uvicorn
+        uvicorn.run("asgi:app", host='0.0.0.0', port=port, workers=int(os.getenv("WEB_CONCURRENCY", "1")))
+    else:
+        create_app().run(host='0.0.0.0', port=port)
@@ -0,0 +1,254 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import session
+from werkzeug.test import EnvironBuilder
+from werkzeug.utils import redirect
+
+import app as web
+import ebay_api
+import metrics
+import rate_limit
+import result_pipeline
+import stripe_client
+from singleflight import RemoteFlightError
+
+# Async-Modus: uvicorn asgi:app (oder SERVER_MODE=asgi python app.py).
+# /search und POST /checkout laufen hier auf dem Event-Loop: der langsame Teil (Upstream, Stripe)
+# blockiert keinen Thread. Nur kurze DB-/Template-Abschnitte laufen im Thread-Pool.
+# Alle anderen Routen (login, register, …) gehen unverändert über die WSGI-Bridge (_wsgi) an Flask.
+SYNC_THREADS = int(os.getenv("ASGI_SYNC_THREADS", "32"))
+
+flask_app = web.app
+_END = object()
+_executor = None
+_inflight = {}
+# ProxyFix aus create_app auch für die hier direkt bedienten Routen (die Bridge _wsgi läuft ohnehin durch sie)
+_forwarded = (web.proxy_fix(lambda environ, start_response: environ, flask_app.config["PROXY_FIX_HOPS"])
+              if flask_app.config["PROXY_FIX_HOPS"] > 0 else None)
+
+
+class _Pending:
+    # Marker: Request-Phase liefert Parameter statt Antwort (async weiter)
+    def __init__(self, value):
+        self.value = value
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(SYNC_THREADS, thread_name_prefix="asgi-sync")
+    return _executor
+
+
+def _environ(scope, body):
+    headers = [(k.decode("latin-1"), v.decode("latin-1")) for k, v in scope.get("headers", [])]
+    host = next((v for k, v in headers if k.lower() == "host"), None)
+    if host is None and scope.get("server"):
+        host = "%s:%s" % scope["server"]
+    builder = EnvironBuilder(
+        path=scope["path"],
+        base_url=f"{scope.get('scheme', 'http')}://{host or 'localhost'}{scope.get('root_path', '')}",
+        method=scope["method"],
+        query_string=scope.get("query_string", b"").decode("latin-1"),
+        headers=headers,
+        data=body,
+        environ_overrides={"REMOTE_ADDR": (scope.get("client") or ("", 0))[0]},
+    )
+    try:
+        return builder.get_environ()
+    finally:
+        builder.close()
+
+
+def _in_request(scope, body, fn):
+    # fn im Flask-Request-Kontext ausführen; Antworten inkl. Session-Cookie (Flash, Claims) fertig machen
+    environ = _environ(scope, body)
+    if _forwarded is not None:
+        environ = _forwarded(environ, None)
+    with flask_app.request_context(environ):
+        rv = fn()
+        if isinstance(rv, _Pending):
+            return rv
+        response = flask_app.make_response(rv)
+        if not flask_app.session_interface.is_null_session(session):
+            flask_app.session_interface.save_session(flask_app, session, response)
+        return response
+
+
+async def _sync(scope, body, fn):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), _in_request, scope, body, fn)
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _send_response(send, response):
+    headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in response.headers.items()]
+    await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+    for chunk in response.iter_encoded():
+        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+    response.close()
+
+
+def _store(query, pages, marketplaces, cache_key, fetched):
+    # aufbereiten (CPU) + Cache/Index schreiben, beides im Thread-Pool
+    results = result_pipeline.process(query, fetched)
+    with flask_app.app_context():
+        web.search_cache.set(cache_key, results)
+        web.ingest_results(query, results, pages, marketplaces)
+    return results
+
+
+async def _fetch_coalesced(params):
+    # Single-Flight auf dem Loop: gleiche Suchen teilen sich einen Upstream-Aufruf
+    query, pages, marketplaces = params["query"], params["pages"], params["marketplaces"]
+    cache_key = web.search_cache_key(query, pages, marketplaces)
+    future = _inflight.get(cache_key)
+    if future is None:
+        async def run():
+            try:
+                fetched = await ebay_api.async_search(query, pages=pages, marketplaces=marketplaces or None)
+                return await asyncio.get_running_loop().run_in_executor(_get_executor(), _store, query, pages,
+                                                                        marketplaces, cache_key, fetched)
+            finally:
+                _inflight.pop(cache_key, None)
+
+        future = _inflight[cache_key] = asyncio.ensure_future(run())
+    return await asyncio.shield(future)
+
+
+async def _wsgi(scope, receive, send):
+    # WSGI-Bridge: Flask im Thread-Pool, Body-Chunks einzeln zurück auf den Loop
+    body = await _read_body(receive)
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = headers
+
+    def begin():
+        result = flask_app(_environ(scope, body), start_response)
+        it = iter(result)
+        return result, it, next(it, _END)
+
+    result, it, chunk = await loop.run_in_executor(executor, begin)
+    try:
+        await send({"type": "http.response.start", "status": started["status"],
+                    "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in started["headers"]]})
+        while chunk is not _END:
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            chunk = await loop.run_in_executor(executor, next, it, _END)
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        if hasattr(result, "close"):
+            await loop.run_in_executor(executor, result.close)
+
+
+# -------------------------
+# Routen
+# -------------------------
+def _search_prepare():
+    # kein before_request auf diesem Pfad: Rate-Limit hier prüfen
+    limited = rate_limit.check_request()
+    if limited is not None:
+        return limited
+    params = web.search_params()
+    denied = web.search_guard(params)
+    if denied is not None:
+        return denied
+    results = web.local_results(params)
+    if results is None:
+        cached = web.cached_or_stale(web.search_cache_key(params["query"], params["pages"], params["marketplaces"]))
+        if cached is None:
+            return _Pending(params)
+        results = web.refine_results(params, cached)
+    return web.render_results(params, results)
+
+
+async def search(scope, receive, send):
+    body = await _read_body(receive)
+    prepared = await _sync(scope, body, _search_prepare)
+    if not isinstance(prepared, _Pending):
+        return prepared
+    params = prepared.value
+    try:
+        results = await _fetch_coalesced(params)
+    except (ebay_api.UpstreamError, RemoteFlightError) as e:
+        return await _sync(scope, body, lambda e=e: web.render_upstream_error(params, e))
+    except Exception as e:
+        return await _sync(scope, body, lambda e=e: web.render_results(params, [], error=str(e)))
+    return await _sync(scope, body, lambda: web.render_results(params, web.refine_results(params, results)))
+
+
+def _checkout_prepare():
+    limited = rate_limit.check_request()
+    if limited is not None:
+        return limited
+    return _Pending(web.checkout_params())
+
+
+async def checkout(scope, receive, send):
+    body = await _read_body(receive)
+    prepared = await _sync(scope, body, _checkout_prepare)
+    if not isinstance(prepared, _Pending):
+        return prepared
+    try:
+        with metrics.timed("stripe"):
+            checkout_session = await stripe_client.create_checkout_async(**prepared.value)
+    except Exception as e:
+        return await _sync(scope, body, lambda e=e: web.checkout_failed(e))
+    return redirect(checkout_session.url, code=303)
+
+
+ROUTES = {
+    ("GET", "/search"): ("search", search),
+    ("POST", "/search"): ("search", search),
+    ("POST", "/checkout"): ("public_checkout", checkout),
+}
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await ebay_api.get_async_client().aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    route = ROUTES.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+    if route is None:
+        return await _wsgi(scope, receive, send)
+
+    endpoint, handler = route
+    start = time.perf_counter()
+    metrics.http_in_flight.inc()
+    status = 500
+    try:
+        response = await handler(scope, receive, send)
+        status = response.status_code
+        await _send_response(send, response)
+    except Exception:
+        flask_app.logger.exception("ASGI: Fehler in %s", endpoint)
+        await send({"type": "http.response.start", "status": 500,
+                    "headers": [(b"content-type", b"text/plain; charset=utf-8")]})
+        await send({"type": "http.response.body", "body": b"Internal Server Error"})
+    finally:
+        metrics.http_in_flight.dec()
+        metrics.http_latency.observe(time.perf_counter() - start, endpoint=endpoint)
+        metrics.http_requests.inc(endpoint=endpoint, method=scope["method"], status=status)
@@ -0,0 +1,147 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import sys
+
+from flask import current_app, request, send_from_directory, url_for
+
+# Static-Pipeline: python assets.py (Build-Schritt vor dem Deploy)
+#   static/style.css -> static/dist/style.<hash>.css (+ .gz / .br) und static/dist/manifest.json
+# Templates nutzen asset_url('style.css'); ohne Build fällt es auf url_for('static', ...) zurück.
+DIST_DIR = "dist"
+MANIFEST = "manifest.json"
+HASH_LENGTH = 10
+COMPRESSIBLE = (".css", ".js", ".svg", ".ico", ".json", ".txt", ".map")
+# kleinere Dateien lohnen keine Kompression (Header-Overhead)
+MIN_COMPRESS_BYTES = int(os.getenv("ASSETS_MIN_COMPRESS_BYTES", "256"))
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+_manifest = {"mtime": None, "files": {}}
+
+
+# -------------------------
+# Build
+# -------------------------
+def minify_css(text):
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\s*([{};,>])\s*", r"\1", text)
+    text = re.sub(r":\s+", ":", text)
+    text = text.replace(";}", "}")
+    return text.strip()
+
+
+def minify_svg(text):
+    text = re.sub(r"<!--.*?-->", "", text, flags=re.S)
+    return re.sub(r">\s+<", "><", text).strip()
+
+
+MINIFIERS = {".css": minify_css, ".svg": minify_svg}
+
+
+def hashed_name(rel_path, data):
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def _brotli():
+    # optional und nur für den Build nötig (Laufzeit liefert fertige .br aus) -> nicht beim App-Start laden
+    try:
+        import brotli
+    except ImportError:  # dann nur gzip
+        return None
+    return brotli
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def build(static_dir="static"):
+    dist = os.path.join(static_dir, DIST_DIR)
+    manifest = {}
+    brotli = _brotli()
+    for base, dirs, files in os.walk(static_dir):
+        if os.path.abspath(base).startswith(os.path.abspath(dist)):
+            continue
+        for name in sorted(files):
+            src = os.path.join(base, name)
+            rel = os.path.relpath(src, static_dir).replace(os.sep, "/")
+            ext = os.path.splitext(name)[1].lower()
+            with open(src, "rb") as f:
+                data = f.read()
+            if ext in MINIFIERS:
+                data = MINIFIERS[ext](data.decode("utf-8")).encode("utf-8")
+            target = hashed_name(rel, data)
+            out = os.path.join(dist, target)
+            _write(out, data)
+            if ext in COMPRESSIBLE and len(data) >= MIN_COMPRESS_BYTES:
+                # mtime=0 -> identische .gz bei identischem Inhalt
+                _write(out + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    _write(out + ".br", brotli.compress(data, quality=11))
+            manifest[rel] = target
+    with open(os.path.join(dist, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+# -------------------------
+# Laufzeit
+# -------------------------
+def load_manifest(static_dir):
+    path = os.path.join(static_dir, DIST_DIR, MANIFEST)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    if mtime != _manifest["mtime"]:
+        with open(path) as f:
+            _manifest["files"] = json.load(f)
+        _manifest["mtime"] = mtime
+    return _manifest["files"]
+
+
+def asset_url(filename):
+    files = load_manifest(current_app.static_folder)
+    if filename in files:
+        return url_for("static", filename=f"{DIST_DIR}/{files[filename]}")
+    return url_for("static", filename=filename)
+
+
+def send_static(filename):
+    static_dir = current_app.static_folder
+    if not filename.startswith(DIST_DIR + "/"):
+        return current_app.send_static_file(filename)
+
+    # gehashte Datei: Inhalt ändert sich nie -> immutable, vorkomprimierte Variante wenn erlaubt
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    encoding = None
+    for candidate, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if request.accept_encodings[candidate] and os.path.isfile(os.path.join(static_dir, filename + suffix)):
+            encoding = candidate
+            filename += suffix
+            break
+    response = send_from_directory(static_dir, filename, mimetype=mimetype, max_age=31536000)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Cache-Control"] = IMMUTABLE
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def init_app(app):
+    app.view_functions["static"] = send_static
+    app.jinja_env.globals["asset_url"] = asset_url
+
+
+if __name__ == '__main__':
+    static_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+    files = build(static_dir)
+    print(f"{len(files)} Assets gebaut ({'gzip + brotli' if _brotli() else 'gzip'}) -> {os.path.join(static_dir, DIST_DIR)}")
@@ -0,0 +1,181 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import ebay_api
+import listing_index
+import metrics
+import shared_store
+
+# Batch-Suche für Skript-Clients: viele Queries pro Request, begrenzt parallel,
+# Ergebnis als NDJSON-Zeile pro Query, sobald sie fertig ist.
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "100"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+# gemeinsamer Pool für alle Batches eines Prozesses
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "8"))
+BATCH_MAX_ACTIVE = int(os.getenv("BATCH_MAX_ACTIVE_PER_USER", "1"))
+BATCH_DEFAULT_LIMIT = 50
+BATCH_MAX_LIMIT = 200
+# Queries pro User und Zeitfenster (über alle Worker, shared_store)
+QUOTA_PER_WINDOW = int(os.getenv("BATCH_QUOTA", "1000"))
+QUOTA_WINDOW = int(os.getenv("BATCH_QUOTA_WINDOW", "3600"))
+
+batch_queries = metrics.registry.counter("batch_queries_total", "Batch-API-Queries nach Ergebnis", ("result",))
+
+_pool = None
+_pool_lock = threading.Lock()
+_active = {}
+_active_lock = threading.Lock()
+_store_ready = threading.Event()
+
+
+class BatchError(Exception):
+    # ungültige Anfrage -> 400 mit Meldung
+    pass
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch")
+    return _pool
+
+
+def parse_spec(spec):
+    # {"query": "...", "pages": 1, "marketplaces": [...], "min_price", "max_price", "sort", "limit"} oder nur "query"
+    if isinstance(spec, str):
+        spec = {"query": spec}
+    if not isinstance(spec, dict) or not str(spec.get("query") or "").strip():
+        raise BatchError("jede Query braucht ein Feld 'query'")
+    try:
+        pages = max(1, min(int(spec.get("pages") or 1), ebay_api.EBAY_MAX_PAGES))
+        marketplaces = spec.get("marketplaces") or ()
+        if isinstance(marketplaces, str):
+            marketplaces = marketplaces.split(",")
+        marketplaces = tuple(m.strip().upper() for m in marketplaces if m.strip().upper() in ebay_api.EBAY_MARKETPLACES)
+        min_price = float(spec["min_price"]) if spec.get("min_price") is not None else None
+        max_price = float(spec["max_price"]) if spec.get("max_price") is not None else None
+        limit = max(1, min(int(spec.get("limit") or BATCH_DEFAULT_LIMIT), BATCH_MAX_LIMIT))
+    except (TypeError, ValueError, AttributeError) as e:
+        raise BatchError(f"ungültige Query: {e}") from e
+    sort = spec.get("sort") or "relevance"
+    if sort not in listing_index.SORTS:
+        raise BatchError(f"sort muss eins von {', '.join(listing_index.SORTS)} sein")
+    return {
+        "query": str(spec["query"]).strip(),
+        "pages": pages,
+        "marketplaces": marketplaces,
+        "min_price": min_price,
+        "max_price": max_price,
+        "sort": sort,
+        "refined": min_price is not None or max_price is not None or sort != "relevance",
+        "offset": 0,
+        "page_size": limit,
+    }
+
+
+def parse_batch(body):
+    specs = body.get("queries") if isinstance(body, dict) else body
+    if not isinstance(specs, list) or not specs:
+        raise BatchError("erwartet {\"queries\": [...]}")
+    if len(specs) > BATCH_MAX_QUERIES:
+        raise BatchError(f"höchstens {BATCH_MAX_QUERIES} Queries pro Batch")
+    return [parse_spec(spec) for spec in specs]
+
+
+# -------------------------
+# Kontingent (festes Zeitfenster, shared_store)
+# -------------------------
+def _conn():
+    conn = shared_store.connect()
+    if not _store_ready.is_set():
+        conn.execute("CREATE TABLE IF NOT EXISTS api_quota (user_id INTEGER NOT NULL, bucket INTEGER NOT NULL, "
+                     "used INTEGER NOT NULL, PRIMARY KEY (user_id, bucket))")
+        _store_ready.set()
+    return conn
+
+
+def _bucket(now=None):
+    return int((now or time.time()) // QUOTA_WINDOW)
+
+
+def reserve(user_id, wanted):
+    # bis zu `wanted` Queries abbuchen; gibt (bewilligt, Rest im Fenster) zurück
+    conn = _conn()
+    bucket = _bucket()
+    with shared_store.transaction(conn):
+        row = conn.execute("SELECT used FROM api_quota WHERE user_id = ? AND bucket = ?", (user_id, bucket)).fetchone()
+        used = row[0] if row else 0
+        granted = max(0, min(wanted, QUOTA_PER_WINDOW - used))
+        if granted:
+            conn.execute("INSERT INTO api_quota (user_id, bucket, used) VALUES (?, ?, ?) "
+                         "ON CONFLICT(user_id, bucket) DO UPDATE SET used = used + excluded.used",
+                         (user_id, bucket, granted))
+        conn.execute("DELETE FROM api_quota WHERE bucket < ?", (bucket - 1,))
+    return granted, QUOTA_PER_WINDOW - used - granted
+
+
+def refund(user_id, count):
+    # nicht ausgeführte Queries (Client weg) zurückbuchen
+    if count > 0:
+        conn = _conn()
+        with shared_store.transaction(conn):
+            conn.execute("UPDATE api_quota SET used = MAX(0, used - ?) WHERE user_id = ? AND bucket = ?",
+                         (count, user_id, _bucket()))
+
+
+def reset_at():
+    return (_bucket() + 1) * QUOTA_WINDOW
+
+
+# -------------------------
+# Ausführung
+# -------------------------
+def acquire(user_id):
+    # parallele Batches pro User begrenzen (pro Prozess)
+    with _active_lock:
+        if _active.get(user_id, 0) >= BATCH_MAX_ACTIVE:
+            return False
+        _active[user_id] = _active.get(user_id, 0) + 1
+        return True
+
+
+def release(user_id):
+    with _active_lock:
+        _active[user_id] -= 1
+        if not _active[user_id]:
+            del _active[user_id]
+
+
+def run(app, specs, search_fn, concurrency=BATCH_CONCURRENCY):
+    # search_fn(params) -> (items, total, error); liefert Ergebnis-Dicts in Fertigstellungsreihenfolge.
+    # Höchstens `concurrency` Queries dieses Batches gleichzeitig im gemeinsamen Pool.
+    def task(index, params):
+        start = time.perf_counter()
+        with app.app_context():
+            try:
+                items, total, error = search_fn(params)
+            except Exception as e:
+                app.logger.exception("Batch-Query %r fehlgeschlagen", params["query"])
+                items, total, error = [], 0, str(e)
+        batch_queries.inc(result="error" if error and not items else "ok")
+        return {"index": index, "query": params["query"], "total": total, "items": items, "error": error,
+                "ms": round((time.perf_counter() - start) * 1000, 1)}
+
+    pool = get_pool()
+    queue = list(enumerate(specs))
+    running = set()
+    try:
+        while queue or running:
+            while queue and len(running) < concurrency:
+                running.add(pool.submit(task, *queue.pop(0)))
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        # Client hat abgebrochen: Offenes nicht mehr starten
+        for future in running:
+            future.cancel()
@@ -0,0 +1,80 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from bench.stubs import SMTPSink, fake_items
+
+# Burst-Test für die Alert-Zustellung: python -m bench.alerts --users 200 --matches 20000
+# Treffer landen wie aus saved_searches.poll in der Outbox, der Dispatcher liefert an eine lokale SMTP-Senke.
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--matches", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=0, help="Mails pro Minute (0 = ungedrosselt)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Anteil 451-Antworten der Senke")
+    parser.add_argument("--smtp-latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    sink = SMTPSink(fail_rate=args.fail_rate, latency=args.smtp_latency).start()
+    workdir = tempfile.mkdtemp(prefix="bench-alerts-")
+    os.chdir(workdir)
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.sqlite3')}",
+        "SENDER_EMAIL": "alerts@example.com",
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(sink.port),
+        "SMTP_STARTTLS": "0",
+        "ALERT_DIGEST_WINDOW": "0",
+        "ALERT_RATE_PER_MINUTE": str(args.rate),
+        "ALERT_BACKOFF_BASE": "0",
+    })
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import app
+    import alerts
+    from models import db, AlertOutbox, SavedSearch, User
+
+    with app.app_context():
+        db.create_all()
+        users = [User(email=f"user{i}@example.com", password="x", is_premium=True) for i in range(args.users)]
+        db.session.add_all(users)
+        db.session.commit()
+        searches = [SavedSearch(user_id=u.id, search_query=f"suche {u.id}", params={}) for u in users]
+        db.session.add_all(searches)
+        db.session.commit()
+
+        per_search = max(1, args.matches // len(searches))
+        start = time.perf_counter()
+        for saved in searches:
+            alerts.enqueue(saved, fake_items(saved.search_query, per_search))
+        enqueue_s = time.perf_counter() - start
+
+    dispatcher = alerts.Dispatcher(app)
+    start = time.perf_counter()
+    rounds = 0
+    while dispatcher.run_once():
+        rounds += 1
+    dispatch_s = time.perf_counter() - start
+    dispatcher.stop()
+    sink.stop()
+
+    with app.app_context():
+        status = dict(db.session.query(AlertOutbox.status, db.func.count()).group_by(AlertOutbox.status).all())
+    print(json.dumps({
+        "matches": per_search * len(searches),
+        "users": len(users),
+        "enqueue_s": round(enqueue_s, 3),
+        "dispatch_s": round(dispatch_s, 3),
+        "rounds": rounds,
+        "mails": sink.stats["messages"],
+        "smtp_connections": sink.stats["connections"],
+        "outbox": status,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from bench.stubs import fake_items
+
+# Kosten der Ergebnis-Aufbereitung pro Suche: python -m bench.pipeline --items 1000 --duplicates 0.5
+# Titel wie vom Such-Stub, ein Teil als leicht abgewandelte Neueinstellung (Dubletten-Pfad).
+
+
+def batch(count, duplicates, seed=1):
+    rnd = random.Random(seed)
+    items = fake_items("apple iphone 13 pro", count)
+    for i, item in enumerate(items):
+        if i and rnd.random() < duplicates:
+            original = items[rnd.randrange(i)]
+            item["title"] = f"{original['title']} {rnd.choice(['neu', 'OVP', 'top'])}"
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--duplicates", type=float, default=0.0, help="Anteil abgewandelter Dubletten")
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import result_pipeline
+
+    items = batch(args.items, args.duplicates)
+    # erster Lauf lädt numpy und die Permutationen
+    kept = len(result_pipeline.process("apple iphone 13 pro", items))
+    timings = []
+    for _ in range(args.rounds):
+        start = time.perf_counter()
+        result_pipeline.process("apple iphone 13 pro", items)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(json.dumps({
+        "items": args.items,
+        "kept": kept,
+        "best_ms": round(timings[0] * 1000, 2),
+        "median_ms": round(timings[len(timings) // 2] * 1000, 2),
+    }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench.stubs import SearchUpstreamHandler, StripeHandler, StubServer, signed_webhook
+
+# Lastprofil: Gewichte pro Route; /search-Queries Zipf-verteilt wie echte Nutzer ("iphone 13" ist häufig)
+ROUTES = {"search": 50, "dashboard": 20, "webhook": 15, "login": 10, "public": 5, "pricing": 5, "checkout": 3}
+VOCABULARY = ["iphone 13", "ps5", "nintendo switch", "airpods pro", "macbook air", "rtx 3080", "lego technic",
+              "dyson v11", "gopro hero", "kindle", "thinkpad x1", "canon eos", "rolex", "ipad mini", "xbox series x"]
+WEBHOOK_SECRET = "whsec_bench"
+BENCH_USER = "bench@example.com"
+BENCH_PASSWORD = "bench-password"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+def pick_query(rnd):
+    weights = [1 / (i + 1) for i in range(len(VOCABULARY))]
+    return rnd.choices(VOCABULARY, weights)[0]
+
+
+class LoadClient:
+    def __init__(self, base, rnd):
+        self.base = base
+        self.rnd = rnd
+        self.session = requests.Session()
+        self.login()
+
+    def login(self):
+        return self.session.post(f"{self.base}/login", data={"email": BENCH_USER, "password": BENCH_PASSWORD},
+                                 allow_redirects=False, timeout=30)
+
+    def call(self, route):
+        if route == "search":
+            return self.session.get(f"{self.base}/search", params={"query": pick_query(self.rnd)}, timeout=30)
+        if route == "dashboard":
+            return self.session.get(f"{self.base}/dashboard", timeout=30)
+        if route == "public":
+            return self.session.get(f"{self.base}/public", timeout=30)
+        if route == "pricing":
+            return self.session.get(f"{self.base}/pricing", timeout=30)
+        if route == "checkout":
+            # 303 auf die Stripe-Checkout-URL (Stub), nicht folgen
+            return self.session.post(f"{self.base}/checkout", data={"email": BENCH_USER}, allow_redirects=False,
+                                     timeout=30)
+        if route == "login":
+            return self.login()
+        if route == "webhook":
+            # ~30 % Wiederholungen wie bei Stripe-Retry-Stürmen
+            event_id = f"evt_bench_{self.rnd.randint(0, 2000)}" if self.rnd.random() < 0.3 else None
+            payload, headers = signed_webhook(WEBHOOK_SECRET, obj={"customer_email": BENCH_USER}, event_id=event_id)
+            return self.session.post(f"{self.base}/webhook", data=payload, headers=headers, timeout=30)
+        raise ValueError(route)
+
+
+def drive(base, duration, concurrency, routes, seed):
+    samples = {route: [] for route in routes}
+    errors = {route: 0 for route in routes}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+    names, weights = zip(*routes.items())
+
+    def worker(n):
+        rnd = random.Random(seed + n)
+        client = LoadClient(base, rnd)
+        while time.perf_counter() < stop_at:
+            route = rnd.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                ok = client.call(route).status_code < 500
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                samples[route].append(elapsed)
+                if not ok:
+                    errors[route] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    wall = time.perf_counter() - started
+
+    report = {}
+    for route in routes:
+        values = sorted(samples[route])
+        report[route] = {
+            "requests": len(values),
+            "errors": errors[route],
+            "rps": round(len(values) / wall, 2),
+            "mean_ms": round(1000 * sum(values) / len(values), 2) if values else None,
+            "p50_ms": _ms(percentile(values, 0.50)),
+            "p95_ms": _ms(percentile(values, 0.95)),
+            "p99_ms": _ms(percentile(values, 0.99)),
+        }
+    return report, wall
+
+
+def _ms(value):
+    return round(value * 1000, 2) if value is not None else None
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def wait_ready(base, proc, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("App-Prozess beendet sich beim Start")
+        try:
+            requests.get(f"{base}/debug", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError("App startet nicht")
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    lines = [f"{'route':<12}{'p50':>18}{'p95':>18}{'rps':>18}"]
+    for route, now in current["routes"].items():
+        before = baseline.get("routes", {}).get(route)
+        if not before:
+            continue
+        cells = []
+        for key in ("p50_ms", "p95_ms", "rps"):
+            a, b = before.get(key), now.get(key)
+            delta = f"{(b - a) / a * 100:+.1f}%" if a and b is not None else "n/a"
+            cells.append(f"{b} ({delta})".rjust(18))
+        lines.append(f"{route:<12}" + "".join(cells))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lasttest gegen lokale Upstream-/Stripe-Stubs")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--server", choices=("werkzeug", "gunicorn", "asgi"), default="werkzeug")
+    parser.add_argument("--upstream-latency", type=float, default=0.08)
+    parser.add_argument("--upstream-error-rate", type=float, default=0.01)
+    parser.add_argument("--stripe-latency", type=float, default=0.1)
+    parser.add_argument("--routes", default=",".join(ROUTES), help="Teilmenge, z. B. search,webhook")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="JSON-Report schreiben (sonst stdout)")
+    parser.add_argument("--compare", help="früheren JSON-Report zum Vergleich")
+    parser.add_argument("--env", action="append", default=[], help="zusätzliche App-Umgebung KEY=VALUE")
+    args = parser.parse_args(argv)
+
+    routes = {r: ROUTES[r] for r in args.routes.split(",") if r in ROUTES}
+    upstream = StubServer(SearchUpstreamHandler, latency=args.upstream_latency,
+                          error_rate=args.upstream_error_rate).start()
+    stripe_stub = StubServer(StripeHandler, latency=args.stripe_latency).start()
+    workdir = tempfile.mkdtemp(prefix="ebay-bench-")
+    port = free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.sqlite3')}",
+        SHARED_STORE_PATH=os.path.join(workdir, "shared.sqlite3"),
+        PRICE_HISTORY_PATH=os.path.join(workdir, "price_history"),
+        SEARCH_API_URL=f"{upstream.url}/search",
+        STRIPE_API_BASE=stripe_stub.url,
+        STRIPE_SECRET_KEY="sk_test_bench",
+        STRIPE_PRICE_PRO="price_stub",
+        STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET,
+        EBAY_APP_ID="",
+        EBAY_CERT_ID_PRD="",
+        BENCH_USER=BENCH_USER,
+        BENCH_PASSWORD=BENCH_PASSWORD,
+        # ein Bench-User mit vielen Requests: Limits/Budget aus (mit --env RATE_LIMITS_ENABLED=1 messen)
+        RATE_LIMITS_ENABLED="0",
+        EBAY_DAILY_CALL_BUDGET="0",
+    )
+    env.update(kv.split("=", 1) for kv in args.env)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.Popen([sys.executable, "-m", "bench.serve", str(port), args.server], cwd=root, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(base, proc)
+        report, wall = drive(base, args.duration, args.concurrency, routes, args.seed)
+    finally:
+        proc.terminate()
+        proc.wait(10)
+        upstream.stop()
+        stripe_stub.stop()
+
+    result = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": int(time.time()),
+            "server": args.server,
+            "duration_s": round(wall, 2),
+            "concurrency": args.concurrency,
+            "upstream_latency_s": args.upstream_latency,
+            "upstream_error_rate": args.upstream_error_rate,
+            "upstream_requests": upstream.stats["requests"],
+            "stripe_requests": stripe_stub.stats["requests"],
+            "stripe_connections": stripe_stub.stats["connections"],
+        },
+        "routes": report,
+    }
+    text = json.dumps(result, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        print(compare(result, args.compare), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
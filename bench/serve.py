@@ -0,0 +1,38 @@
+import os
+import sys
+
+# Startet die App für Benchmarks gegen eine frische DB: python -m bench.serve <port> [werkzeug|gunicorn|asgi]
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def setup():
+    from werkzeug.security import generate_password_hash
+
+    from app import app
+    import listing_index
+    from models import db, User
+
+    with app.app_context():
+        db.create_all()
+        listing_index.ensure_schema()
+        if not User.query.filter_by(email=os.environ["BENCH_USER"]).first():
+            db.session.add(User(email=os.environ["BENCH_USER"],
+                                password=generate_password_hash(os.environ["BENCH_PASSWORD"]),
+                                is_premium=True))
+            db.session.commit()
+    return app
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1])
+    server = sys.argv[2] if len(sys.argv) > 2 else "werkzeug"
+    app = setup()
+    if server == "gunicorn":
+        os.execvp("gunicorn", ["gunicorn", "-b", f"127.0.0.1:{port}", "-w", os.getenv("BENCH_WORKERS", "4"),
+                               "--threads", os.getenv("BENCH_THREADS", "4"), "app:app"])
+    if server == "asgi":
+        import uvicorn
+        uvicorn.run("asgi:app", host="127.0.0.1", port=port, log_level="warning",
+                    workers=int(os.getenv("BENCH_WORKERS", "1")))
+        sys.exit(0)
+    app.run(host="127.0.0.1", port=port, threaded=True, use_reloader=False)
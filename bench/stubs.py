@@ -0,0 +1,219 @@
+import hashlib
+import hmac
+import json
+import random
+import socketserver
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Lokale Stand-ins für den Such-Upstream, die Stripe-API und einen SMTP-Server, damit Benchmarks
+# reproduzierbar und ohne Netz laufen.
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        # neue TCP-Verbindung (zeigt, ob Clients Keep-Alive nutzen)
+        super().setup()
+        self.stats["connections"] += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def fake_items(query, count, offset=0):
+    rnd = random.Random(f"{query}:{offset}")
+    return [
+        {
+            "id": f"{abs(hash(query)) % 10**6}-{offset + i}",
+            "title": f"{query.title()} {rnd.choice(['neu', 'gebraucht', 'OVP', 'defekt'])} #{offset + i}",
+            "price": f"{rnd.uniform(5, 900):.2f}",
+            "image": None,
+            "url": f"https://www.ebay.de/itm/{offset + i}",
+        }
+        for i in range(count)
+    ]
+
+
+class StubServer:
+    def __init__(self, handler_cls, **config):
+        handler = type(handler_cls.__name__, (handler_cls,), {"config": config, "stats": {"requests": 0, "connections": 0}})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        self.stats = handler.stats
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class SearchUpstreamHandler(_Handler):
+    # GET /search?q=… wie der Proxy, plus Browse-API-Pfade für den nativen Client
+    def do_GET(self):
+        self.stats["requests"] += 1
+        latency = self.config.get("latency", 0.05)
+        jitter = self.config.get("jitter", 0.2)
+        time.sleep(max(0.0, random.gauss(latency, latency * jitter)))
+        if random.random() < self.config.get("error_rate", 0.0):
+            return self._send(503, {"error": "stub failure"})
+        parts = urlsplit(self.path)
+        params = parse_qs(parts.query)
+        count = self.config.get("items", 50)
+        if parts.path.endswith("/item_summary/search"):
+            offset = int(params.get("offset", ["0"])[0])
+            items = fake_items(params.get("q", [""])[0], count, offset)
+            return self._send(200, {"itemSummaries": [
+                {"itemId": i["id"], "title": i["title"], "price": {"value": i["price"], "currency": "EUR"},
+                 "itemWebUrl": i["url"]} for i in items
+            ]})
+        return self._send(200, fake_items(params.get("q", [""])[0], count))
+
+    def do_POST(self):
+        # OAuth-Token für den Browse-Client
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self._send(200, {"access_token": "stub-token", "expires_in": 7200})
+
+
+class StripeHandler(_Handler):
+    # minimale Stripe-API: Checkout-Session anlegen, Preise lesen
+    def do_POST(self):
+        self.stats["requests"] += 1
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        time.sleep(self.config.get("latency", 0.1))
+        if urlsplit(self.path).path == "/v1/checkout/sessions":
+            sid = f"cs_test_{uuid.uuid4().hex[:16]}"
+            return self._send(200, {"id": sid, "object": "checkout.session",
+                                    "url": f"https://checkout.stripe.test/{sid}"})
+        self._send(404, {"error": {"message": "unknown"}})
+
+    def do_GET(self):
+        self.stats["requests"] += 1
+        time.sleep(self.config.get("latency", 0.1))
+        path = urlsplit(self.path).path
+        if path == "/v1/prices":
+            return self._send(200, {"object": "list", "data": [_price("price_stub")], "has_more": False})
+        if path.startswith("/v1/prices/"):
+            return self._send(200, _price(path.rsplit("/", 1)[1]))
+        if path == "/v1/products":
+            return self._send(200, {"object": "list", "data": [
+                {"id": "prod_stub", "object": "product", "name": "Premium", "active": True}
+            ], "has_more": False})
+        self._send(404, {"error": {"message": "unknown"}})
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    # genug SMTP für smtplib: EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT (ohne TLS/AUTH)
+    def _reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        sink = self.server.sink
+        with sink.lock:
+            sink.stats["connections"] += 1
+        self._reply("220 sink ESMTP")
+        envelope = None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                self._reply("250-sink" if verb == "EHLO" else "250 sink")
+                if verb == "EHLO":
+                    self._reply("250 8BITMIME")
+            elif verb == "MAIL":
+                envelope = {"from": command[10:].strip(" <>"), "to": []}
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                if random.random() < sink.config.get("fail_rate", 0.0):
+                    self._reply("451 4.3.0 try again later")
+                    continue
+                envelope["to"].append(command[8:].strip(" <>"))
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for raw in self.rfile:
+                    if raw in (b".\r\n", b".\n"):
+                        break
+                    data.append(raw[1:] if raw.startswith(b"..") else raw)
+                time.sleep(sink.config.get("latency", 0.0))
+                with sink.lock:
+                    sink.messages.append({**envelope, "data": b"".join(data)})
+                    sink.stats["messages"] += 1
+                self._reply("250 OK queued")
+            elif verb in ("RSET", "NOOP"):
+                envelope = None if verb == "RSET" else envelope
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 bye")
+                return
+            else:
+                self._reply("502 not implemented")
+
+
+class SMTPSink:
+    # SMTP-Senke für alerts.py: SMTP_HOST=127.0.0.1 SMTP_PORT=<sink.port> SMTP_STARTTLS=0
+    def __init__(self, **config):
+        self.config = config
+        self.messages = []
+        self.stats = {"connections": 0, "messages": 0}
+        self.lock = threading.Lock()
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SMTPHandler)
+        self.server.daemon_threads = True
+        self.server.sink = self
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _price(price_id):
+    return {"id": price_id, "object": "price", "unit_amount": 500, "currency": "eur",
+            "recurring": {"interval": "month"}, "product": "prod_stub", "active": True}
+
+
+def signed_webhook(secret, event_type="checkout.session.completed", obj=None, event_id=None, created=None):
+    # Payload + Stripe-Signature-Header wie von Stripe erzeugt
+    event = {
+        "id": event_id or f"evt_{uuid.uuid4().hex}",
+        "object": "event",
+        "type": event_type,
+        "created": created or int(time.time()),
+        "data": {"object": obj or {}},
+    }
+    payload = json.dumps(event)
+    ts = int(time.time())
+    sig = hmac.new(secret.encode(), f"{ts}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return payload, {"Stripe-Signature": f"t={ts},v1={sig}", "Content-Type": "application/json"}
@@ -25,13 +25,48 @@ if os.path.exists(".env"):
 else:
     print("⚠️  .env-Datei NICHT gefunden!")
 
-# Versuche app.py zu importieren
+# Prüfe Konfigurationsprofil (ohne die App zu bauen)
+load_dotenv()
+import config
 try:
-    import app
-    print("✅ app.py konnte erfolgreich importiert werden.")
-except Exception as e:
+    settings = config.load()
+    print(f"✅ Profil: {settings['PROFILE']}")
+except ValueError as e:
+    print("❌", e)
+    sys.exit(1)
+if settings["PROFILE"] == "production" and settings["SECRET_KEY"] == "devkey":
+    print("⚠️  SECRET_KEY ist nicht gesetzt (Standardwert 'devkey')!")
+for name in ("STRIPE_SECRET_KEY", "STRIPE_WEBHOOK_SECRET", "DATABASE_URL"):
+    if not os.getenv(name):
+        print(f"⚠️  {name} ist nicht gesetzt.")
+
+# Startzeit: Import + create_app() in einem frischen Interpreter, gegen ein Budget
+import subprocess
+
+BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "500"))
+code = ("import time; t = time.perf_counter(); import app; app.create_app(); "
+        "print(round((time.perf_counter() - t) * 1000, 1))")
+run = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=120)
+if run.returncode != 0:
     print("❌ Fehler beim Importieren von app.py:")
-    print(e)
+    print(run.stderr.strip().splitlines()[-1] if run.stderr.strip() else run.returncode)
+    sys.exit(1)
+startup_ms = float(run.stdout.strip().splitlines()[-1])
+
+# teuerste direkte Importe von app.py (python -X importtime)
+trace = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"],
+                       capture_output=True, text=True, timeout=120).stderr
+heaviest = []
+for line in trace.splitlines():
+    parts = line.split("|")
+    if len(parts) == 3 and parts[1].strip().isdigit() and parts[2].startswith("   ") and not parts[2].startswith("    "):
+        heaviest.append((int(parts[1]), parts[2].strip()))
+for us, name in sorted(heaviest, reverse=True)[:5]:
+    print(f"   {us / 1000:7.1f} ms  {name}")
+
+if startup_ms > BUDGET_MS:
+    print(f"❌ Start dauert {startup_ms:.0f} ms (Budget {BUDGET_MS:.0f} ms, STARTUP_BUDGET_MS)")
     sys.exit(1)
+print(f"✅ app.py importiert + create_app() in {startup_ms:.0f} ms (Budget {BUDGET_MS:.0f} ms)")
 
-print("🎉 Alles sieht gut aus!")
\ No newline at end of file
+print("🎉 Alles sieht gut aus!")
@@ -0,0 +1,62 @@
+import os
+
+import db_profile
+
+# Konfigurationsprofile für create_app(): APP_ENV=production | development | testing
+# Reihenfolge: Profil -> ENV-Overrides hier -> Argumente von create_app(**overrides)
+DEFAULT_PROFILE = "production"
+
+
+def base():
+    return {
+        "SECRET_KEY": os.getenv("SECRET_KEY", "devkey"),
+        "SQLALCHEMY_DATABASE_URI": db_profile.database_uri(),
+        "STRIPE_WEBHOOK_SECRET": os.getenv("STRIPE_WEBHOOK_SECRET"),
+        # Flask-Migrate/Alembic (~100 ms Import) nur für "flask db …" bzw. init_db.py
+        "MIGRATIONS": os.getenv("FLASK_RUN_FROM_CLI") == "true",
+        # Job-Threads im Web-Prozess (Opt-in): Standard ist worker.py als eigener Prozess – nur dort laufen auch
+        # der Saved-Search-Scheduler und der Alert-Versand. >0 nur für Setups ohne Worker-Prozess
+        "JOBS_INPROCESS_WORKERS": int(os.getenv("JOBS_INPROCESS_WORKERS", "0")),
+        # vorgeschaltete Proxies (Render: 1), deren X-Forwarded-For/-Proto vertraut wird; 0 = direkt erreichbar.
+        # Ohne das teilen sich alle anonymen Besucher die IP des Proxys (ein Rate-Limit-Bucket)
+        "PROXY_FIX_HOPS": int(os.getenv("PROXY_FIX_HOPS", "1")),
+        # /metrics und /_debug/cache: Bearer-Token für externe Scraper; ohne Token nur aus internen Netzen
+        "METRICS_TOKEN": os.getenv("METRICS_TOKEN") or None,
+        # Token-Bucket pro User/Route (rate_limit.py)
+        "RATE_LIMITS_ENABLED": os.getenv("RATE_LIMITS_ENABLED", "1") == "1",
+        # gerenderte öffentliche Seiten + Ergebnis-Fragmente (page_cache.py)
+        "PAGE_CACHE_ENABLED": os.getenv("PAGE_CACHE_ENABLED", "1") == "1",
+    }
+
+
+PROFILES = {
+    "production": {
+        "DEBUG": False,
+        "TEMPLATES_AUTO_RELOAD": False,
+    },
+    "development": {
+        "DEBUG": True,
+        "TEMPLATES_AUTO_RELOAD": True,
+        # lokal ohne Proxy: X-Forwarded-For wäre frei fälschbar
+        "PROXY_FIX_HOPS": 0,
+        # Template-Änderungen sofort sehen
+        "PAGE_CACHE_ENABLED": False,
+    },
+    "testing": {
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite://",
+        "JOBS_INPROCESS_WORKERS": 0,
+        "RATE_LIMITS_ENABLED": False,
+        "PROXY_FIX_HOPS": 0,
+    },
+}
+
+
+def load(profile=None):
+    profile = profile or os.getenv("APP_ENV") or DEFAULT_PROFILE
+    if profile not in PROFILES:
+        raise ValueError(f"unbekanntes Profil {profile!r} (erlaubt: {', '.join(PROFILES)})")
+    settings = base()
+    settings.update(PROFILES[profile])
+    settings["PROFILE"] = profile
+    return settings
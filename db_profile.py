@@ -0,0 +1,84 @@
+import os
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# DB-Performance-Profil: Pool für Postgres, Pragmas für SQLite.
+# Alles per ENV einstellbar, Defaults für einen kleinen Web-Dyno + Worker.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Verbindungen vor Ablauf von Server-/Proxy-Timeouts (Render, PgBouncer) erneuern
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "wal")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "normal")
+# negativ = KiB (-20000 ≈ 20 MB Page-Cache pro Verbindung)
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-20000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "15000"))
+# immediate = Schreibsperre schon bei BEGIN (keine Lock-Upgrade-Fehler, dafür weniger parallele Leser)
+SQLITE_BEGIN = os.getenv("SQLITE_BEGIN", "deferred")
+
+
+def database_uri():
+    uri = os.getenv("DATABASE_URL") or "sqlite:///instance/db.sqlite3"
+    # Render/Heroku liefern noch "postgres://", SQLAlchemy kennt nur "postgresql://"
+    if uri.startswith("postgres://"):
+        uri = "postgresql://" + uri[len("postgres://"):]
+    return uri
+
+
+def engine_options(uri):
+    if uri.startswith("sqlite"):
+        # Sperren wartet SQLite selbst ab (busy_timeout), nicht der Treiber
+        options = {"connect_args": {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000, "check_same_thread": False}}
+        if ":memory:" not in uri and uri not in ("sqlite://", "sqlite:///"):
+            options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+        return options
+    options = dict(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    if DB_STATEMENT_TIMEOUT_MS and uri.startswith("postgresql"):
+        options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+def _sqlite_connect(dbapi_conn, record):
+    if not isinstance(dbapi_conn, sqlite3.Connection):
+        return
+    cur = dbapi_conn.cursor()
+    try:
+        cur.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cur.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cur.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cur.close()
+    if SQLITE_BEGIN == "immediate":
+        # Transaktionen selbst steuern (siehe _sqlite_begin)
+        dbapi_conn.isolation_level = None
+
+
+def _sqlite_begin(conn):
+    if SQLITE_BEGIN == "immediate" and conn.dialect.name == "sqlite":
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def init_app(app):
+    uri = app.config.setdefault("SQLALCHEMY_DATABASE_URI", database_uri())
+    options = engine_options(uri)
+    options.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+    if not event.contains(Engine, "connect", _sqlite_connect):
+        event.listen(Engine, "connect", _sqlite_connect)
+        event.listen(Engine, "begin", _sqlite_begin)
@@ -1,2 +1,651 @@
-def search_ebay_products(query):
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed, wait
+
+from urllib.parse import urlsplit
+
+import metrics
+import rate_limit
+import shared_store
+
+# Upstream-Suchdienst (Proxy) und Client-Einstellungen
+SEARCH_API_URL = os.getenv("SEARCH_API_URL", "https://ebay-agent-cockpit.onrender.com/search")
+CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "5"))
+MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))
+# Obergrenze für alle Versuche samt Backoff zusammen (0 = nur die Timeouts pro Versuch)
+TOTAL_TIMEOUT = float(os.getenv("UPSTREAM_TOTAL_TIMEOUT", "8"))
+BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.2"))
+BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "2"))
+POOL_HOSTS = int(os.getenv("UPSTREAM_POOL_HOSTS", "10"))
+POOL_PER_HOST = int(os.getenv("UPSTREAM_POOL_PER_HOST", "20"))
+BREAKER_THRESHOLD = int(os.getenv("UPSTREAM_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET = float(os.getenv("UPSTREAM_BREAKER_RESET", "30"))
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# eBay Browse API (nativ, ohne Proxy); EBAY_API_BASE lässt sich auf einen lokalen Stub zeigen
+EBAY_APP_ID = os.getenv("EBAY_APP_ID")
+EBAY_CERT_ID = os.getenv("EBAY_CERT_ID_PRD")
+EBAY_API_BASE = os.getenv("EBAY_API_BASE", "https://api.ebay.com").rstrip("/")
+EBAY_MARKETPLACE = os.getenv("EBAY_MARKETPLACE", "EBAY_DE")
+EBAY_SCOPE = "https://api.ebay.com/oauth/api_scope"
+EBAY_PAGE_SIZE = int(os.getenv("EBAY_PAGE_SIZE", "50"))
+TOKEN_REFRESH_MARGIN = 120
+EBAY_MARKETPLACES = ("EBAY_DE", "EBAY_AT", "EBAY_GB")
+EBAY_MAX_PAGES = int(os.getenv("EBAY_MAX_PAGES", "5"))
+FANOUT_WORKERS = int(os.getenv("EBAY_FANOUT_WORKERS", "8"))
+FANOUT_DEADLINE = float(os.getenv("EBAY_FANOUT_DEADLINE", "6"))
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamError(Exception):
+    pass
+
+
+class UpstreamStatusError(UpstreamError):
+    # Upstream antwortet, aber mit einem Status ohne Retry (z. B. 401/404)
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(UpstreamError):
+    pass
+
+
+class QuotaExceededError(UpstreamError):
+    # Tagesbudget (rate_limit.EBAY_DAILY_BUDGET) für jetzt aufgebraucht -> Cache statt Upstream
+    pass
+
+
+def spend_budget(calls=1):
+    if not rate_limit.spend(calls):
+        raise QuotaExceededError("Tageskontingent für eBay-Abfragen vorerst aufgebraucht – bitte später erneut versuchen.")
+
+
+class CircuitBreaker:
+    # closed -> open nach N Fehlern in Folge, nach reset_timeout ein Probe-Request (half-open)
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now):
+        if self.opened_at is None:
+            return "closed"
+        if now - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        # Aufruf abgebrochen (z. B. Task bei der Fan-out-Deadline gecancelt): weder Erfolg noch Fehler,
+        # aber den Probe-Slot freigeben, sonst bleibt der Circuit für immer half-open
+        with self._lock:
+            self._probing = False
+
+
+def _attempt_timeout(timeout, deadline, pause=0.0):
+    # (connect, read) für den nächsten Versuch, auf die Restzeit bis deadline gekürzt; None = keine Zeit mehr
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.monotonic() - pause
+    if remaining <= 0:
+        return None
+    connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    return min(connect, remaining), min(read, remaining)
+
+
+def _status_error(breaker, service, status_code):
+    # Antwort >= 400 ohne Retry; 4xx sind Fehler des Aufrufs, nicht des Upstreams -> weder Erfolg noch Fehler
+    metrics.upstream_errors.inc(service=service, reason=f"http_{status_code}")
+    if status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.release()
+    return UpstreamStatusError(f"Upstream antwortet mit HTTP {status_code}", status_code)
+
+
+class UpstreamClient:
+    # gemeinsame Session mit Keep-Alive-Pool pro Host, getrennte Timeouts, Retries mit Jitter
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, max_retries=MAX_RETRIES,
+                 backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX, pool_hosts=POOL_HOSTS,
+                 pool_per_host=POOL_PER_HOST, breaker=None, total_timeout=TOTAL_TIMEOUT):
+        self.timeout = (connect_timeout, read_timeout)
+        self.total_timeout = total_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_hosts = pool_hosts
+        self.pool_per_host = pool_per_host
+        self.breaker = breaker or CircuitBreaker(BREAKER_THRESHOLD, BREAKER_RESET)
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._build_session()
+        return self._session
+
+    def _build_session(self):
+        # requests (~35 ms Import) erst mit der ersten Upstream-Anfrage laden, nicht beim App-Start
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        # pool_block: mehr als pool_per_host gleichzeitige Verbindungen warten statt neue aufzubauen
+        adapter = HTTPAdapter(pool_connections=self.pool_hosts, pool_maxsize=self.pool_per_host,
+                              max_retries=0, pool_block=True)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def _backoff(self, attempt):
+        # "full jitter": zufällig zwischen 0 und exponentieller Obergrenze
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method, url, **kwargs):
+        import requests
+
+        service = urlsplit(url).netloc
+        if not self.breaker.allow():
+            metrics.upstream_errors.inc(service=service, reason="circuit_open")
+            raise CircuitOpenError(f"Upstream {url} vorübergehend deaktiviert (Circuit offen)")
+        timeout = kwargs.pop("timeout", self.timeout)
+        # Retries dürfen einen Web-Thread nicht länger als total_timeout halten
+        deadline = time.monotonic() + self.total_timeout if self.total_timeout else None
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            pause = self._backoff(attempt - 1) if attempt else 0.0
+            attempt_timeout = _attempt_timeout(timeout, deadline, pause)
+            if attempt_timeout is None:
+                break
+            if pause:
+                time.sleep(pause)
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=attempt_timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.upstream_errors.inc(service=service, reason=type(e).__name__)
+                last_error = e
+                continue
+            except requests.RequestException as e:
+                metrics.upstream_errors.inc(service=service, reason=type(e).__name__)
+                self.breaker.record_failure()
+                raise UpstreamError(str(e)) from e
+            finally:
+                metrics.upstream_latency.observe(time.perf_counter() - start, service=service)
+            if response.status_code in RETRY_STATUS:
+                metrics.upstream_errors.inc(service=service, reason=f"http_{response.status_code}")
+                last_error = UpstreamError(f"Upstream antwortet mit HTTP {response.status_code}")
+                response.close()
+                continue
+            if response.status_code >= 400:
+                response.close()
+                raise _status_error(self.breaker, service, response.status_code)
+            self.breaker.record_success()
+            return response
+        self.breaker.record_failure()
+        raise UpstreamError(str(last_error)) from last_error
+
+    def get_json(self, url, params=None, **kwargs):
+        return self.request("GET", url, params=params, **kwargs).json()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = UpstreamClient()
+    return _client
+
+
+def search_upstream(query):
+    spend_budget()
+    return get_client().get_json(SEARCH_API_URL, params={"q": query})
+
+
+class TokenCache:
+    # Application-Token (client_credentials) einmal holen und bis kurz vor Ablauf wiederverwenden.
+    # Prozesslokal + in shared_store, damit nicht jeder Worker eigene Tokens tauscht.
+    def __init__(self, app_id, cert_id, api_base=EBAY_API_BASE, client=None, store_path=None,
+                 refresh_margin=TOKEN_REFRESH_MARGIN):
+        self.app_id = app_id
+        self.cert_id = cert_id
+        self.api_base = api_base
+        self.client = client
+        self.store_path = store_path
+        self.refresh_margin = refresh_margin
+        self._token = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+        self._store_ready = False
+
+    def get(self):
+        if self._valid(self._expires_at):
+            return self._token
+        with self._lock:
+            if self._valid(self._expires_at):
+                return self._token
+            token, expires_at = self._load_shared()
+            if token is None or not self._valid(expires_at):
+                token, expires_at = self._fetch()
+                self._save_shared(token, expires_at)
+            self._token, self._expires_at = token, expires_at
+            return token
+
+    def invalidate(self):
+        with self._lock:
+            self._token, self._expires_at = None, 0
+            conn = self._conn()
+            conn.execute("DELETE FROM oauth_tokens WHERE name = ?", (self._name(),))
+
+    def _valid(self, expires_at):
+        return expires_at - self.refresh_margin > time.time()
+
+    def _fetch(self):
+        client = self.client or get_client()
+        response = client.request(
+            "POST", f"{self.api_base}/identity/v1/oauth2/token",
+            auth=(self.app_id, self.cert_id),
+            data={"grant_type": "client_credentials", "scope": EBAY_SCOPE},
+        )
+        payload = response.json()
+        return payload["access_token"], time.time() + int(payload.get("expires_in", 7200))
+
+    def _name(self):
+        return f"ebay:{self.api_base}:{self.app_id}"
+
+    def _conn(self):
+        conn = shared_store.connect(self.store_path)
+        if not self._store_ready:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS oauth_tokens ("
+                " name TEXT PRIMARY KEY, token TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._store_ready = True
+        return conn
+
+    def _load_shared(self):
+        row = self._conn().execute(
+            "SELECT token, expires_at FROM oauth_tokens WHERE name = ?", (self._name(),)
+        ).fetchone()
+        return (row[0], row[1]) if row else (None, 0)
+
+    def _save_shared(self, token, expires_at):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO oauth_tokens (name, token, expires_at) VALUES (?, ?, ?)",
+            (self._name(), token, expires_at),
+        )
+
+
+def map_item_summary(summary):
+    # Browse-API itemSummary -> Format von ebay_results.html
+    price = summary.get("price") or {}
+    image = (summary.get("image") or {}).get("imageUrl")
+    if not image and summary.get("thumbnailImages"):
+        image = summary["thumbnailImages"][0].get("imageUrl")
+    return {
+        "id": summary.get("itemId"),
+        "title": summary.get("title"),
+        "price": price.get("value"),
+        "currency": price.get("currency"),
+        "image": image,
+        "url": summary.get("itemWebUrl"),
+    }
+
+
+class BrowseClient:
+    def __init__(self, app_id, cert_id, api_base=EBAY_API_BASE, marketplace=EBAY_MARKETPLACE,
+                 client=None, token_cache=None):
+        self.api_base = api_base
+        self.marketplace = marketplace
+        self.client = client
+        self.tokens = token_cache or TokenCache(app_id, cert_id, api_base=api_base, client=client)
+
+    def search(self, query, limit=EBAY_PAGE_SIZE, offset=0, marketplace=None):
+        client = self.client or get_client()
+        url = f"{self.api_base}/buy/browse/v1/item_summary/search"
+        params = {"q": query, "limit": limit, "offset": offset}
+        for attempt in range(2):
+            headers = {
+                "Authorization": f"Bearer {self.tokens.get()}",
+                "X-EBAY-C-MARKETPLACE-ID": marketplace or self.marketplace,
+            }
+            spend_budget()
+            try:
+                payload = client.get_json(url, params=params, headers=headers)
+            except UpstreamStatusError as e:
+                # Token widerrufen/abgelaufen: einmal neu holen
+                if attempt == 0 and e.status_code == 401:
+                    self.tokens.invalidate()
+                    continue
+                raise
+            return [map_item_summary(s) for s in payload.get("itemSummaries", [])]
+        return []
+
+
+_browse = None
+
+
+def browse_enabled():
+    return bool(EBAY_APP_ID and EBAY_CERT_ID)
+
+
+def get_browse_client():
+    global _browse
+    if _browse is None:
+        with _client_lock:
+            if _browse is None:
+                _browse = BrowseClient(EBAY_APP_ID, EBAY_CERT_ID)
+    return _browse
+
+
+_pool = None
+
+
+def get_pool():
+    # gemeinsamer, begrenzter Pool für Fan-out (lazy, damit er erst nach fork entsteht)
+    global _pool
+    if _pool is None:
+        with _client_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="ebay-fanout")
+    return _pool
+
+
+def fan_out(tasks, deadline=FANOUT_DEADLINE, pool=None):
+    # tasks: Liste von Callables, die Item-Listen liefern. Gibt (Items, vollständig?) zurück;
+    # nach Ablauf der Deadline zählt, was bis dahin fertig ist.
+    pool = pool or get_pool()
+    futures = [pool.submit(task) for task in tasks]
+    _, pending = wait(futures, timeout=deadline or None)
+    for future in pending:
+        future.cancel()
+
+    seen = set()
+    items = []
+    errors = []
+    # Reihenfolge der Tasks beibehalten (Seite 1 vor Seite 2 …), Dubletten über die Item-ID
+    for future in futures:
+        if not future.done() or future.cancelled():
+            continue
+        if future.exception() is not None:
+            errors.append(future.exception())
+            continue
+        for item in future.result():
+            key = item.get("id") or item.get("url")
+            if key in seen:
+                continue
+            seen.add(key)
+            items.append(item)
+    if errors and not items:
+        raise errors[0]
+    complete = not pending and not errors
+    if not complete:
+        logger.warning("Fan-out unvollständig: %d offen, %d Fehler", len(pending), len(errors))
+    return items, complete
+
+
+def iter_fan_out(tasks, deadline=FANOUT_DEADLINE, pool=None):
+    # wie fan_out, liefert aber jede fertige Item-Liste sofort (Streaming); Reihenfolge = Fertigstellung
+    pool = pool or get_pool()
+    futures = [pool.submit(task) for task in tasks]
+    seen = set()
+    errors = []
+    yielded = False
+    try:
+        for future in as_completed(futures, timeout=deadline or None):
+            if future.exception() is not None:
+                errors.append(future.exception())
+                continue
+            batch = []
+            for item in future.result():
+                key = item.get("id") or item.get("url")
+                if key in seen:
+                    continue
+                seen.add(key)
+                batch.append(item)
+            if batch:
+                yielded = True
+                yield batch
+    except FuturesTimeout:
+        logger.warning("Fan-out (stream) unvollständig: Deadline nach %.1fs", deadline)
+        for future in futures:
+            future.cancel()
+    if errors and not yielded:
+        raise errors[0]
+
+
+def search_ebay_products(query, pages=1, marketplaces=None, deadline=FANOUT_DEADLINE):
+    if not browse_enabled():
+        return []
+    browse = get_browse_client()
+    pages = max(1, min(int(pages), EBAY_MAX_PAGES))
+    marketplaces = marketplaces or (browse.marketplace,)
+    if pages == 1 and len(marketplaces) == 1:
+        return browse.search(query, marketplace=marketplaces[0])
+    items, _ = fan_out(fanout_tasks(query, pages, marketplaces), deadline=deadline)
+    return items
+
+
+def search(query, pages=1, marketplaces=None):
+    # nativer Browse-Pfad wenn Zugangsdaten gesetzt sind, sonst der bisherige Proxy
+    if browse_enabled():
+        return search_ebay_products(query, pages=pages, marketplaces=marketplaces)
+    return search_upstream(query)
+
+
+def fanout_tasks(query, pages=1, marketplaces=None):
+    browse = get_browse_client()
+    pages = max(1, min(int(pages), EBAY_MAX_PAGES))
+    return [
+        (lambda page=page, mk=mk: browse.search(query, offset=page * EBAY_PAGE_SIZE, marketplace=mk))
+        for page in range(pages)
+        for mk in (marketplaces or (browse.marketplace,))
+    ]
+
+
+def iter_search(query, pages=1, marketplaces=None):
+    # Item-Listen, sobald sie da sind; lohnt nur bei mehreren Seiten/Marktplätzen
+    if browse_enabled() and (pages > 1 or len(marketplaces or ()) > 1):
+        yield from iter_fan_out(fanout_tasks(query, pages, marketplaces))
+        return
+    yield search(query, pages=pages, marketplaces=marketplaces)
+
+
+# -------------------------
+# Async-Variante (ASGI-Modus, siehe asgi.py) – httpx wird nur dort gebraucht
+# -------------------------
+class AsyncUpstreamClient:
+    # wie UpstreamClient, aber nicht-blockierend auf dem Event-Loop; eigener Circuit Breaker pro Prozess
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, max_retries=MAX_RETRIES,
+                 backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX, pool_per_host=POOL_PER_HOST,
+                 max_connections=200, breaker=None, total_timeout=TOTAL_TIMEOUT):
+        import httpx
+
+        self._httpx = httpx
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._timeouts = (connect_timeout, read_timeout)
+        self.total_timeout = total_timeout
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=pool_per_host)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker(BREAKER_THRESHOLD, BREAKER_RESET)
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(self, method, url, **kwargs):
+        httpx = self._httpx
+        service = urlsplit(url).netloc
+        if not self.breaker.allow():
+            metrics.upstream_errors.inc(service=service, reason="circuit_open")
+            raise CircuitOpenError(f"Upstream {url} vorübergehend deaktiviert (Circuit offen)")
+        deadline = time.monotonic() + self.total_timeout if self.total_timeout else None
+        last_error = None
+        settled = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                pause = (random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))))
+                         if attempt else 0.0)
+                attempt_timeout = _attempt_timeout(self._timeouts, deadline, pause)
+                if attempt_timeout is None:
+                    break
+                if pause:
+                    await asyncio.sleep(pause)
+                start = time.perf_counter()
+                try:
+                    response = await self.client.request(
+                        method, url, timeout=httpx.Timeout(attempt_timeout[1], connect=attempt_timeout[0]), **kwargs)
+                except (httpx.TransportError,) as e:
+                    metrics.upstream_errors.inc(service=service, reason=type(e).__name__)
+                    last_error = e
+                    continue
+                finally:
+                    metrics.upstream_latency.observe(time.perf_counter() - start, service=service)
+                if response.status_code in RETRY_STATUS:
+                    metrics.upstream_errors.inc(service=service, reason=f"http_{response.status_code}")
+                    last_error = UpstreamError(f"Upstream antwortet mit HTTP {response.status_code}")
+                    continue
+                settled = True
+                if response.status_code >= 400:
+                    raise _status_error(self.breaker, service, response.status_code)
+                self.breaker.record_success()
+                return response
+            settled = True
+            self.breaker.record_failure()
+            raise UpstreamError(str(last_error)) from last_error
+        finally:
+            # CancelledError & Co. mitten im Versuch
+            if not settled:
+                self.breaker.release()
+
+    async def get_json(self, url, params=None, **kwargs):
+        return (await self.request("GET", url, params=params, **kwargs)).json()
+
+
+_async_client = None
+
+
+def get_async_client():
+    # ein Client pro Prozess/Event-Loop (uvicorn-Worker)
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncUpstreamClient()
+    return _async_client
+
+
+async def async_browse_search(query, offset=0, marketplace=None):
+    client = get_async_client()
+    browse = get_browse_client()
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        # Token kommt fast immer aus dem Cache; ein Refresh läuft im Thread, nicht auf dem Loop
+        token = await loop.run_in_executor(None, browse.tokens.get)
+        headers = {"Authorization": f"Bearer {token}", "X-EBAY-C-MARKETPLACE-ID": marketplace or browse.marketplace}
+        await loop.run_in_executor(None, spend_budget)
+        try:
+            payload = await client.get_json(
+                f"{browse.api_base}/buy/browse/v1/item_summary/search",
+                params={"q": query, "limit": EBAY_PAGE_SIZE, "offset": offset}, headers=headers,
+            )
+        except UpstreamStatusError as e:
+            if attempt == 0 and e.status_code == 401:
+                await loop.run_in_executor(None, browse.tokens.invalidate)
+                continue
+            raise
+        return [map_item_summary(s) for s in payload.get("itemSummaries", [])]
     return []
+
+
+async def async_search(query, pages=1, marketplaces=None, deadline=FANOUT_DEADLINE):
+    if not browse_enabled():
+        await asyncio.get_running_loop().run_in_executor(None, spend_budget)
+        return await get_async_client().get_json(SEARCH_API_URL, params={"q": query})
+    pages = max(1, min(int(pages), EBAY_MAX_PAGES))
+    marketplaces = marketplaces or (get_browse_client().marketplace,)
+    tasks = [asyncio.ensure_future(async_browse_search(query, page * EBAY_PAGE_SIZE, mk))
+             for page in range(pages) for mk in marketplaces]
+    done, pending = await asyncio.wait(tasks, timeout=deadline or None)
+    for task in pending:
+        task.cancel()
+    seen = set()
+    items = []
+    errors = []
+    for task in tasks:
+        if task not in done:
+            continue
+        if task.exception() is not None:
+            errors.append(task.exception())
+            continue
+        for item in task.result():
+            key = item.get("id") or item.get("url")
+            if key not in seen:
+                seen.add(key)
+                items.append(item)
+    if errors and not items:
+        raise errors[0]
+    if pending or errors:
+        logger.warning("Fan-out unvollständig: %d offen, %d Fehler", len(pending), len(errors))
+    return items
@@ -0,0 +1,22 @@
+import os
+
+# gunicorn liest diese Datei automatisch (Start: gunicorn app:app)
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+# App einmal im Master bauen, Worker erben sie per fork (schnellere Restarts, geteilter Speicher).
+# create_app() öffnet keine Verbindungen; post_fork räumt trotzdem auf, falls doch etwas entstanden ist.
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+
+def post_fork(server, worker):
+    # shared_store erkennt den fork selbst (pid-Check) und öffnet neue Verbindungen
+    from app import app
+    from models import db
+
+    # geerbte Pool-Verbindungen nicht benutzen (close=False: gehören dem Master)
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -1,3 +1,17 @@
-from app import db
-db.create_all()
+from flask_migrate import stamp
+from sqlalchemy import text
+
+from app import create_app
+import listing_index
+from models import db
+
+app = create_app(MIGRATIONS=True)
+with app.app_context():
+    db.create_all()
+    listing_index.ensure_schema()
+    # Schema entspricht head -> spätere "flask db upgrade" legt nichts doppelt an
+    stamp()
+    if db.engine.dialect.name == "sqlite":
+        mode = db.session.execute(text("PRAGMA journal_mode")).scalar()
+        print(f"SQLite journal_mode={mode}")
 print("Datenbank erfolgreich erstellt.")
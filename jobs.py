@@ -0,0 +1,178 @@
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from sqlalchemy import and_, or_
+
+from models import db, Job, utcnow
+
+logger = logging.getLogger(__name__)
+
+VISIBILITY_TIMEOUT = int(os.getenv("JOBS_VISIBILITY_TIMEOUT", "300"))
+BACKOFF_BASE = float(os.getenv("JOBS_BACKOFF_BASE", "10"))
+BACKOFF_MAX = float(os.getenv("JOBS_BACKOFF_MAX", "3600"))
+POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", "1"))
+
+_handlers = {}
+
+
+def handler(kind):
+    # @jobs.handler("ebay_sync") registriert die Funktion für diesen Job-Typ
+    def decorator(fn):
+        _handlers[kind] = fn
+        return fn
+    return decorator
+
+
+def enqueue(kind, payload=None, user_id=None, priority=0, delay=0, max_attempts=5):
+    job = Job(kind=kind, payload=payload, user_id=user_id, priority=priority,
+              max_attempts=max_attempts, run_at=utcnow() + timedelta(seconds=delay))
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def get_status(job_id):
+    job = db.session.get(Job, job_id)
+    return job.to_dict() if job else None
+
+
+def queue_depth():
+    return Job.query.filter(Job.status.in_(("queued", "running"))).count()
+
+
+def _claimable(now):
+    # fällige Jobs oder laufende, deren Visibility-Timeout abgelaufen ist (Worker abgestürzt)
+    return or_(
+        and_(Job.status == "queued", Job.run_at <= now),
+        and_(Job.status == "running", Job.locked_until < now),
+    )
+
+
+def claim(worker_id, visibility_timeout=VISIBILITY_TIMEOUT):
+    now = utcnow()
+    candidates = (
+        db.session.query(Job.id)
+        .filter(_claimable(now))
+        .order_by(Job.priority.desc(), Job.run_at)
+        .limit(5)
+        .all()
+    )
+    for (job_id,) in candidates:
+        # optimistisches Claimen: nur einer gewinnt das UPDATE (SQLite und Postgres)
+        updated = (
+            Job.query.filter(Job.id == job_id, _claimable(now))
+            .update({
+                Job.status: "running",
+                Job.locked_by: worker_id,
+                Job.locked_until: now + timedelta(seconds=visibility_timeout),
+                Job.attempts: Job.attempts + 1,
+            }, synchronize_session=False)
+        )
+        db.session.commit()
+        if updated:
+            return db.session.get(Job, job_id)
+    return None
+
+
+def backoff(attempts):
+    return min(BACKOFF_MAX, BACKOFF_BASE * (2 ** (attempts - 1))) * random.uniform(0.5, 1.5)
+
+
+def _finish(job_id, worker_id, values):
+    # nur solange die Lease noch diesem Worker gehört; sonst hat ein anderer den Job nach Ablauf von
+    # locked_until übernommen und dessen Ergebnis gilt
+    updated = (
+        Job.query.filter(Job.id == job_id, Job.status == "running", Job.locked_by == worker_id)
+        .update({Job.locked_by: None, Job.locked_until: None, **values}, synchronize_session=False)
+    )
+    db.session.commit()
+    if not updated:
+        logger.warning("Job %s: Lease von %s abgelaufen und neu vergeben, Ergebnis verworfen", job_id, worker_id)
+    return bool(updated)
+
+
+def run_job(job):
+    job_id, worker_id = job.id, job.locked_by
+    fn = _handlers.get(job.kind)
+    try:
+        if fn is None:
+            raise LookupError(f"Kein Handler für Job-Typ '{job.kind}'")
+        result = fn(job.payload or {}, job)
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        error = "".join(traceback.format_exception_only(type(e), e)).strip()
+        if job.attempts >= job.max_attempts:
+            values = {Job.status: "failed", Job.finished_at: utcnow()}
+        else:
+            values = {Job.status: "queued", Job.run_at: utcnow() + timedelta(seconds=backoff(job.attempts))}
+        if _finish(job_id, worker_id, {Job.last_error: error, **values}):
+            logger.warning("Job %s (%s) fehlgeschlagen: %s", job_id, job.kind, error)
+        return False
+    return _finish(job_id, worker_id, {Job.status: "done", Job.result: result, Job.finished_at: utcnow()})
+
+
+def run_pending(worker_id="inline", limit=None):
+    # arbeitet fällige Jobs synchron ab (CLI, Tests)
+    count = 0
+    while limit is None or count < limit:
+        job = claim(worker_id)
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
+
+
+class Worker:
+    # Thread-Pool, der die Job-Tabelle pollt; läuft als eigener Prozess (worker.py)
+    # oder mit JOBS_INPROCESS_WORKERS im Web-Prozess
+    def __init__(self, app, concurrency=4, poll_interval=POLL_INTERVAL, visibility_timeout=VISIBILITY_TIMEOUT):
+        self.app = app
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self._stop = threading.Event()
+        self._threads = []
+        self._name = f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self):
+        for i in range(self.concurrency):
+            t = threading.Thread(target=self._loop, args=(f"{self._name}:{i}",), daemon=True,
+                                 name=f"jobs-worker-{i}")
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def run(self):
+        self.start()
+        try:
+            while not self._stop.wait(1):
+                pass
+        except KeyboardInterrupt:
+            self.stop()
+
+    def _loop(self, worker_id):
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    job = claim(worker_id, self.visibility_timeout)
+                    if job is not None:
+                        run_job(job)
+                        continue
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Job-Worker %s: Fehler beim Abarbeiten", worker_id)
+                finally:
+                    db.session.remove()
+            self._stop.wait(self.poll_interval * random.uniform(0.5, 1.5))
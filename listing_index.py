@@ -0,0 +1,182 @@
+import os
+import re
+from datetime import timedelta
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql, sqlite
+
+import result_pipeline
+from models import db, Listing, ListingQuery, utcnow
+
+# wie alt ein Live-Ergebnis sein darf, bevor wieder upstream gefragt wird
+FRESHNESS_SECONDS = int(os.getenv("LISTING_INDEX_FRESHNESS", "900"))
+PG_TS_CONFIG = re.sub(r"\W", "", os.getenv("LISTING_INDEX_TS_CONFIG", "german"))
+UPSERT_CHUNK = 500
+
+SORTS = result_pipeline.SORTS
+
+_token_re = re.compile(r"\w+", re.UNICODE)
+
+# gleiche DDL wie in der Migration; ensure_schema() für Setups ohne "flask db upgrade"
+SQLITE_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS listing_fts USING fts5("
+    "title, content='listing', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS listing_ai AFTER INSERT ON listing BEGIN"
+    " INSERT INTO listing_fts(rowid, title) VALUES (new.id, new.title); END",
+    "CREATE TRIGGER IF NOT EXISTS listing_ad AFTER DELETE ON listing BEGIN"
+    " INSERT INTO listing_fts(listing_fts, rowid, title) VALUES ('delete', old.id, old.title); END",
+    "CREATE TRIGGER IF NOT EXISTS listing_au AFTER UPDATE OF title ON listing BEGIN"
+    " INSERT INTO listing_fts(listing_fts, rowid, title) VALUES ('delete', old.id, old.title);"
+    " INSERT INTO listing_fts(rowid, title) VALUES (new.id, new.title); END",
+)
+
+
+def tokens(query):
+    return [t.lower() for t in _token_re.findall(query or "")]
+
+
+def query_key(query):
+    return " ".join(tokens(query))
+
+
+def _marketplaces_key(marketplaces):
+    return ",".join(sorted(marketplaces or ()))
+
+
+def _dialect():
+    return db.engine.dialect.name
+
+
+def ensure_schema():
+    if _dialect() == "sqlite":
+        for ddl in SQLITE_FTS_DDL:
+            db.session.execute(text(ddl))
+    elif _dialect() == "postgresql":
+        db.session.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_listing_title_fts ON listing "
+            f"USING gin (to_tsvector('{PG_TS_CONFIG}', title))"
+        ))
+    db.session.commit()
+
+
+def parse_price(value):
+    return result_pipeline.parse_price(value)[0]
+
+
+# --- Schreiben ---
+
+def upsert(items):
+    # Bulk-Upsert in einem Statement; FTS wird per Trigger (SQLite) bzw. Ausdrucksindex (Postgres) mitgeführt
+    now = utcnow()
+    rows = {}
+    for item in items:
+        item_id = item.get("id") or item.get("url")
+        if not item_id or not item.get("title"):
+            continue
+        rows[str(item_id)] = {
+            "item_id": str(item_id),
+            "title": item["title"][:255],
+            "price": parse_price(item.get("price")),
+            "currency": item.get("currency"),
+            "image": item.get("image"),
+            "url": item.get("url"),
+            "fetched_at": now,
+        }
+    if not rows:
+        return 0
+    insert = postgresql.insert if _dialect() == "postgresql" else sqlite.insert
+    values = list(rows.values())
+    for start in range(0, len(values), UPSERT_CHUNK):
+        stmt = insert(Listing.__table__).values(values[start:start + UPSERT_CHUNK])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["item_id"],
+            set_={c: stmt.excluded[c] for c in ("title", "price", "currency", "image", "url", "fetched_at")},
+        )
+        db.session.execute(stmt)
+    db.session.commit()
+    return len(rows)
+
+
+def record_query(query, items, pages=1, marketplaces=()):
+    key = query_key(query)
+    if not key:
+        return
+    scope = {"query_key": key, "marketplaces": _marketplaces_key(marketplaces), "pages": pages}
+    entry = ListingQuery.query.filter_by(**scope).first()
+    if entry is None:
+        entry = ListingQuery(**scope)
+        db.session.add(entry)
+    entry.fetched_at = utcnow()
+    entry.result_count = len(items)
+    db.session.commit()
+
+
+def ingest(query, items, pages=1, marketplaces=()):
+    upsert(items)
+    record_query(query, items, pages, marketplaces)
+
+
+# --- Lesen ---
+
+def covered(query, pages=1, marketplaces=(), max_age=FRESHNESS_SECONDS):
+    # lokal beantwortbar nur, wenn genau diese Suche (gleiche Begriffe und Marktplätze, mindestens so viele
+    # Seiten) innerhalb der Frische-Grenze live geholt wurde; "iphone" deckt "iphone 13 pro" nicht ab,
+    # dessen Treffer können hinter den geholten Seiten der allgemeinen Suche liegen
+    key = query_key(query)
+    if not key:
+        return False
+    cutoff = utcnow() - timedelta(seconds=max_age)
+    return db.session.query(ListingQuery.id).filter(
+        ListingQuery.query_key == key,
+        ListingQuery.marketplaces == _marketplaces_key(marketplaces),
+        ListingQuery.pages >= pages,
+        ListingQuery.fetched_at >= cutoff,
+    ).first() is not None
+
+
+def _fts_match(terms):
+    # jeder Begriff muss vorkommen; Präfixsuche für Tippfortschritt
+    return " ".join('"%s"*' % t.replace('"', '""') for t in terms)
+
+
+def search(query, min_price=None, max_price=None, sort="relevance", limit=200, max_age=None):
+    terms = tokens(query)
+    if not terms:
+        return []
+    params = {"limit": int(limit)}
+    where = []
+    if min_price is not None:
+        where.append("l.price >= :min_price")
+        params["min_price"] = float(min_price)
+    if max_price is not None:
+        where.append("l.price <= :max_price")
+        params["max_price"] = float(max_price)
+    if max_age is not None:
+        where.append("l.fetched_at >= :cutoff")
+        params["cutoff"] = utcnow() - timedelta(seconds=max_age)
+
+    if _dialect() == "postgresql":
+        # Konfiguration als Literal, sonst greift der Ausdrucksindex ix_listing_title_fts nicht
+        params["q"] = " ".join(terms)
+        tsv = f"to_tsvector('{PG_TS_CONFIG}', l.title)"
+        tsq = f"plainto_tsquery('{PG_TS_CONFIG}', :q)"
+        sql = f"SELECT l.* FROM listing l WHERE {tsv} @@ {tsq}"
+        rank = f"ts_rank({tsv}, {tsq}) DESC"
+    else:
+        params["q"] = _fts_match(terms)
+        sql = "SELECT l.* FROM listing_fts JOIN listing l ON l.id = listing_fts.rowid WHERE listing_fts MATCH :q"
+        rank = "bm25(listing_fts)"
+    if where:
+        sql += " AND " + " AND ".join(where)
+    order = {
+        "price_asc": "l.price IS NULL, l.price ASC",
+        "price_desc": "l.price IS NULL, l.price DESC",
+        "newest": "l.fetched_at DESC",
+    }.get(sort, rank)
+    sql += f" ORDER BY {order} LIMIT :limit"
+    rows = db.session.execute(text(sql), params).mappings().all()
+    return [
+        {"id": r["item_id"], "title": r["title"], "price": r["price"], "currency": r["currency"],
+         "image": r["image"], "url": r["url"]}
+        for r in rows
+    ]
@@ -0,0 +1,356 @@
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+import shared_store
+
+# Leichtgewichtige Prometheus-Metriken: Aufzeichnen ist ein Dict-Zugriff + Addition unter einem Lock.
+# Jeder Worker schreibt alle FLUSH_SECONDS einen Snapshot in den shared_store; /metrics summiert
+# die Snapshots aller lebenden Worker, damit der Scrape nicht nur einen zufälligen Worker sieht.
+# Snapshots toter Worker wandern in die Zeile pid 0 ("retired"), damit *_total-Zähler nie sinken.
+FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+STALE_SECONDS = 60
+RETIRED_PID = 0
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STARTED_AT = time.time()
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(l, "")) for l in self.labels)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return {json.dumps(k): v for k, v in self._values.items()}
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][idx] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {json.dumps(k): [list(v[0]), v[1], v[2]] for k, v in self._values.items()}
+
+
+class Registry:
+    def __init__(self, store_path=None):
+        self.metrics = {}
+        self.collectors = []
+        self.store_path = store_path
+        self._last_flush = 0
+        self._store_ready = False
+        # zuletzt geschriebener Stand / schon nach pid 0 verschobener Anteil dieses Prozesses
+        self._written = None
+        self._baseline = {}
+        self._merged = (0.0, None)
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def collector(self, fn):
+        # fn() -> [(name, help, kind, {labels: value})], wird erst beim Export aufgerufen (z. B. Cache-Quoten)
+        self.collectors.append(fn)
+        return fn
+
+    def snapshot(self):
+        return {name: m.snapshot() for name, m in self.metrics.items()}
+
+    # --- Worker-übergreifend ---
+
+    def _conn(self):
+        conn = shared_store.connect(self.store_path)
+        if not self._store_ready:
+            # started_at unterscheidet einen neuen Prozess mit wiederverwendeter pid vom alten
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS metrics_workers ("
+                " pid INTEGER PRIMARY KEY, started_at REAL NOT NULL, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._store_ready = True
+        return conn
+
+    def maybe_flush(self, force=False):
+        now = time.time()
+        if not force and now - self._last_flush < FLUSH_SECONDS:
+            return
+        self._last_flush = now
+        pid = os.getpid()
+        conn = self._conn()
+        with shared_store.transaction(conn):
+            found = conn.execute("SELECT started_at FROM metrics_workers WHERE pid = ?", (pid,)).fetchone()
+            if found is not None and found[0] != STARTED_AT:
+                # pid gehörte einem toten Prozess: dessen Stand erst wegsichern
+                self._retire(conn, "pid = ?", (pid,))
+            elif found is None and self._written:
+                # eigener Stand wurde (zu lange still) schon nach pid 0 verschoben -> ab jetzt nur der Zuwachs
+                self._add(self._baseline, self._written, skip_gauges=True)
+            data = self._add(self.snapshot(), self._baseline, sign=-1)
+            conn.execute("INSERT OR REPLACE INTO metrics_workers (pid, started_at, data, updated_at) "
+                         "VALUES (?, ?, ?, ?)", (pid, STARTED_AT, json.dumps(data), now))
+            # Aufräumen gehört zum ohnehin periodischen Schreiben, nicht zum Lesen
+            self._retire(conn, "updated_at < ?", (now - STALE_SECONDS,))
+        self._written = data
+
+    def _add(self, merged, data, skip_gauges=False, sign=1):
+        for name, values in data.items():
+            metric = self.metrics.get(name)
+            if metric is None or (skip_gauges and metric.kind == "gauge"):
+                continue
+            target = merged.setdefault(name, {})
+            for key, value in values.items():
+                if metric.kind == "histogram":
+                    entry = target.setdefault(key, [[0] * len(value[0]), 0.0, 0])
+                    entry[0] = [a + sign * b for a, b in zip(entry[0], value[0])]
+                    entry[1] += sign * value[1]
+                    entry[2] += sign * value[2]
+                else:
+                    target[key] = target.get(key, 0) + sign * value
+        return merged
+
+    def _retire(self, conn, where, params):
+        # Zähler/Histogramme der betroffenen Worker in pid 0 aufaddieren (Gauges sterben mit dem Prozess)
+        rows = conn.execute(f"SELECT data FROM metrics_workers WHERE pid != {RETIRED_PID} AND {where}",
+                            params).fetchall()
+        if not rows:
+            return
+        found = conn.execute("SELECT data FROM metrics_workers WHERE pid = ?", (RETIRED_PID,)).fetchone()
+        retired = json.loads(found[0]) if found else {}
+        for (data,) in rows:
+            self._add(retired, json.loads(data), skip_gauges=True)
+        conn.execute(f"DELETE FROM metrics_workers WHERE pid != {RETIRED_PID} AND {where}", params)
+        conn.execute("INSERT OR REPLACE INTO metrics_workers VALUES (?, 0, ?, ?)",
+                     (RETIRED_PID, json.dumps(retired), time.time()))
+
+    def merged(self, max_age=FLUSH_SECONDS):
+        # nur lesen: letzte Snapshots aller Worker (auch dieses Prozesses, höchstens FLUSH_SECONDS alt);
+        # Snapshots sind nie neuer als FLUSH_SECONDS, das Ergebnis wird so lange wiederverwendet
+        now = time.time()
+        if self._merged[1] is not None and now - self._merged[0] < max_age:
+            return self._merged[1]
+        rows = self._conn().execute("SELECT pid, data, updated_at FROM metrics_workers").fetchall()
+        merged = {}
+        for pid, data, updated_at in rows:
+            # noch nicht nach pid 0 verschobene tote Worker: Zähler zählen, Gauges nicht (wie _retire)
+            stale = pid != RETIRED_PID and updated_at < now - STALE_SECONDS
+            self._add(merged, json.loads(data), skip_gauges=stale)
+        self._merged = (now, merged)
+        return merged
+
+    def final_flush(self):
+        # beim Beenden (gunicorn-Worker-Neustart, worker.py): letzte Zählerstände nicht verlieren
+        try:
+            self.maybe_flush(force=True)
+        except Exception:
+            pass
+
+    # --- Export ---
+
+    def render(self):
+        data = self.merged()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key, value in sorted(data.get(name, {}).items()):
+                labels = dict(zip(metric.labels, json.loads(key)))
+                if metric.kind == "histogram":
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets + ("+Inf",), value[0]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(labels, le=bound)} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {value[1]:.6f}")
+                    lines.append(f"{name}_count{_labels(labels)} {value[2]}")
+                else:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+        for fn in self.collectors:
+            for name, help, kind, values in fn():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in values.items():
+                    lines.append(f"{name}{_labels(dict(labels))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels, **extra):
+    labels = dict(labels, **{k: v for k, v in extra.items()})
+    if not labels:
+        return ""
+    body = ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels.items())
+    return "{" + body + "}"
+
+
+def quantile(metric_data, buckets, q):
+    # Quantil aus Histogramm-Buckets schätzen (lineare Interpolation wie histogram_quantile)
+    counts = [0] * (len(buckets) + 1)
+    for value in metric_data.values():
+        counts = [a + b for a, b in zip(counts, value[0])]
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    lower = 0.0
+    for bound, count in zip(buckets, counts):
+        if cumulative + count >= rank:
+            return lower + (bound - lower) * ((rank - cumulative) / count if count else 0)
+        cumulative += count
+        lower = bound
+    return buckets[-1]
+
+
+registry = Registry()
+
+http_requests = registry.counter("http_requests_total", "HTTP-Requests nach Route und Status", ("endpoint", "method", "status"))
+http_latency = registry.histogram("http_request_duration_seconds", "Antwortzeit pro Route", ("endpoint",))
+http_in_flight = registry.gauge("http_requests_in_flight", "Gerade laufende Requests")
+db_queries = registry.histogram("db_queries_per_request", "DB-Queries pro Request", ("endpoint",),
+                                buckets=(0, 1, 2, 3, 5, 10, 20, 50))
+upstream_latency = registry.histogram("upstream_request_duration_seconds", "Dauer externer Aufrufe", ("service",))
+upstream_errors = registry.counter("upstream_errors_total", "Fehler externer Aufrufe", ("service", "reason"))
+
+
+class timed:
+    # with metrics.timed("stripe"): ... misst Dauer und zählt Fehler
+    def __init__(self, service):
+        self.service = service
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        upstream_latency.observe(time.perf_counter() - self.start, service=self.service)
+        if exc_type is not None:
+            upstream_errors.inc(service=self.service, reason=exc_type.__name__)
+        return False
+
+
+def uptime_seconds():
+    return time.time() - STARTED_AT
+
+
+def summary():
+    # Kennzahlen für die Dashboard-Kacheln (über alle Worker)
+    data = registry.merged()
+    latency = data.get(http_latency.name, {})
+    p50 = quantile(latency, http_latency.buckets, 0.5)
+    p95 = quantile(latency, http_latency.buckets, 0.95)
+    total = errors = 0
+    for key, value in data.get(http_requests.name, {}).items():
+        total += value
+        if json.loads(key)[2].startswith("5"):
+            errors += value
+    return {
+        "requests": total,
+        "latency_p50_ms": round(p50 * 1000) if p50 is not None else None,
+        "latency_p95_ms": round(p95 * 1000) if p95 is not None else None,
+        "availability": round(100.0 * (total - errors) / total, 2) if total else None,
+        "uptime_seconds": int(uptime_seconds()),
+    }
+
+
+def _count_query(*args):
+    from flask import g
+
+    try:
+        g._metrics_queries += 1
+    except (AttributeError, RuntimeError):
+        pass
+
+
+def init_app(app):
+    from flask import g, request
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    # global für alle Engines, auch bei mehreren create_app() nur einmal
+    if not event.contains(Engine, "before_cursor_execute", _count_query):
+        event.listen(Engine, "before_cursor_execute", _count_query)
+        atexit.register(registry.final_flush)
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_start = time.perf_counter()
+        g._metrics_queries = 0
+        http_in_flight.inc()
+
+    @app.after_request
+    def _metrics_record(response):
+        start = g.pop("_metrics_start", None)
+        if start is not None:
+            endpoint = request.endpoint or "unknown"
+            http_latency.observe(time.perf_counter() - start, endpoint=endpoint)
+            http_requests.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+            db_queries.observe(g.get("_metrics_queries", 0), endpoint=endpoint)
+            http_in_flight.dec()
+        return response
+
+    @app.teardown_request
+    def _metrics_teardown(exc):
+        # unbehandelte Exception: after_request lief nicht
+        start = g.pop("_metrics_start", None)
+        if start is not None:
+            endpoint = request.endpoint or "unknown"
+            http_latency.observe(time.perf_counter() - start, endpoint=endpoint)
+            http_requests.inc(endpoint=endpoint, method=request.method, status=500)
+            http_in_flight.dec()
+        try:
+            registry.maybe_flush()
+        except Exception:
+            app.logger.exception("Metriken: Flush fehlgeschlagen")
@@ -90,9 +90,18 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # FTS5-Tabellen des Listing-Index (listing_fts*) werden per Hand-DDL gepflegt,
+    # autogenerate soll sie nicht als "entfernt" erkennen
+    def include_name(name, type_, parent_names):
+        if type_ == "table" and name and name.startswith("listing_fts"):
+            return False
+        return True
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_name") is None:
+        conf_args["include_name"] = include_name
 
     connectable = get_engine()
 
@@ -0,0 +1,58 @@
+"""listing query scope
+
+Revision ID: 4914d9c32958
+Revises: 8cc62b74ded9
+Create Date: 2026-10-18 21:30:17.839573
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4914d9c32958'
+down_revision = '8cc62b74ded9'
+branch_labels = None
+depends_on = None
+
+
+def _create(scoped):
+    columns = [
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('query_key', sa.String(length=255), nullable=False),
+    ]
+    constraints = [sa.PrimaryKeyConstraint('id')]
+    if scoped:
+        columns += [
+            sa.Column('marketplaces', sa.String(length=255), nullable=False),
+            sa.Column('pages', sa.Integer(), nullable=False),
+        ]
+        constraints.append(sa.UniqueConstraint('query_key', 'marketplaces', 'pages', name='uq_listing_query_scope'))
+    else:
+        constraints.append(sa.UniqueConstraint('query_key'))
+    op.create_table('listing_query',
+    *columns,
+    sa.Column('fetched_at', sa.DateTime(), nullable=False),
+    sa.Column('result_count', sa.Integer(), nullable=False),
+    *constraints
+    )
+    with op.batch_alter_table('listing_query', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_listing_query_fetched_at'), ['fetched_at'], unique=False)
+
+
+def _drop():
+    with op.batch_alter_table('listing_query', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_listing_query_fetched_at'))
+    op.drop_table('listing_query')
+
+
+# listing_query ist nur ein Abdeckungs-Vermerk (wird bei der nächsten Live-Suche neu geschrieben):
+# neu anlegen statt den unbenannten Unique-Constraint auf query_key umzubauen
+def upgrade():
+    _drop()
+    _create(scoped=True)
+
+
+def downgrade():
+    _drop()
+    _create(scoped=False)
@@ -1,3 +1,5 @@
+from datetime import datetime, timezone
+
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 
@@ -8,6 +10,177 @@ class User(UserMixin, db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password = db.Column(db.String(128), nullable=False)
     is_premium = db.Column(db.Boolean, default=False)
+    stripe_customer_id = db.Column(db.String(64), nullable=True, index=True)
+    # "created" des zuletzt angewendeten Stripe-Events; ältere (verspätete) Events ändern nichts mehr
+    premium_event_at = db.Column(db.Integer, nullable=True)
+    # API-Token für Skripte (nur SHA-256 gespeichert), siehe api_tokens.py
+    api_token_hash = db.Column(db.String(64), nullable=True, unique=True, index=True)
 
     def __repr__(self):
-        return f'<User {self.email}>'
\ No newline at end of file
+        return f'<User {self.email}>'
+
+
+def utcnow():
+    # naive UTC, da SQLite keine Zeitzonen speichert
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.JSON, nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
+    status = db.Column(db.String(16), nullable=False, default='queued')  # queued | running | done | failed
+    priority = db.Column(db.Integer, nullable=False, default=0)  # höher = früher
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    locked_until = db.Column(db.DateTime, nullable=True)  # Visibility-Timeout laufender Jobs
+    locked_by = db.Column(db.String(64), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    result = db.Column(db.JSON, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_job_status_priority_run_at', 'status', 'priority', 'run_at'),
+        # "schon ein Job dieser Art in der Queue?" (Webhook, Compaction)
+        db.Index('ix_job_kind_status', 'kind', 'status'),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "priority": self.priority,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "run_at": self.run_at.isoformat() if self.run_at else None,
+            "last_error": self.last_error,
+            "result": self.result,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+
+class SavedSearch(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    search_query = db.Column(db.String(255), nullable=False)  # nicht "query", das ist Model.query
+    params = db.Column(db.JSON, nullable=True)  # pages, marketplaces
+    interval_seconds = db.Column(db.Integer, nullable=False, default=600)
+    next_poll_at = db.Column(db.DateTime, nullable=False, default=utcnow, index=True)
+    last_polled_at = db.Column(db.DateTime, nullable=True)
+    # bereits gesehene Item-IDs als gepackte 64-bit-Hashes (8 Byte pro Item), siehe saved_searches.py
+    seen_ids = db.Column(db.LargeBinary, nullable=True)
+    last_new_items = db.Column(db.JSON, nullable=True)
+    new_count = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+    user = db.relationship('User', backref=db.backref('saved_searches', lazy='dynamic'))
+
+    __table_args__ = (
+        # Liste pro User, neueste zuerst
+        db.Index('ix_saved_search_user_id_created_at', 'user_id', 'created_at'),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "query": self.search_query,
+            "params": self.params or {},
+            "interval_seconds": self.interval_seconds,
+            "next_poll_at": self.next_poll_at.isoformat() if self.next_poll_at else None,
+            "last_polled_at": self.last_polled_at.isoformat() if self.last_polled_at else None,
+            "seen": len(self.seen_ids or b"") // 8,
+            "new_count": self.new_count,
+            "last_error": self.last_error,
+        }
+
+    def __repr__(self):
+        return f'<SavedSearch {self.id} {self.search_query!r}>'
+
+
+class AlertOutbox(db.Model):
+    # ein Treffer einer gespeicherten Suche, der per Mail raus soll; alerts.py bündelt pro User zu Digests
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # kein Fremdschlüssel: Treffer bleiben zustellbar, auch wenn die Suche gelöscht wird
+    saved_search_id = db.Column(db.Integer, nullable=True)
+    search_query = db.Column(db.String(255), nullable=False)
+    item = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='pending')  # pending | sending | sent | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    locked_by = db.Column(db.String(64), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # fällige Digests finden / Zeilen eines Users claimen
+        db.Index('ix_alert_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+        db.Index('ix_alert_outbox_user_id_status', 'user_id', 'status'),
+    )
+
+
+class Listing(db.Model):
+    # lokal gespeicherte Angebote; Volltextsuche über listing_fts (SQLite FTS5) bzw. tsvector (Postgres)
+    id = db.Column(db.Integer, primary_key=True)
+    item_id = db.Column(db.String(100), unique=True, nullable=False)
+    title = db.Column(db.String(255), nullable=False)
+    price = db.Column(db.Float, nullable=True, index=True)
+    currency = db.Column(db.String(8), nullable=True)
+    image = db.Column(db.String(500), nullable=True)
+    url = db.Column(db.String(500), nullable=True)
+    fetched_at = db.Column(db.DateTime, nullable=False, default=utcnow, index=True)
+
+    def to_dict(self):
+        return {
+            "id": self.item_id,
+            "title": self.title,
+            "price": self.price,
+            "currency": self.currency,
+            "image": self.image,
+            "url": self.url,
+        }
+
+
+class ListingQuery(db.Model):
+    # wann eine Suche (Begriffe, Marktplätze, Seiten) zuletzt live geholt wurde -> reicht der lokale Index?
+    id = db.Column(db.Integer, primary_key=True)
+    query_key = db.Column(db.String(255), nullable=False)
+    marketplaces = db.Column(db.String(255), nullable=False, default='')  # sortiert, kommagetrennt; '' = Standard
+    pages = db.Column(db.Integer, nullable=False, default=1)
+    fetched_at = db.Column(db.DateTime, nullable=False, default=utcnow, index=True)
+    result_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('query_key', 'marketplaces', 'pages', name='uq_listing_query_scope'),
+    )
+
+
+class StripeEvent(db.Model):
+    # jede Stripe-Event-ID genau einmal; Webhook speichert nur, Worker wendet in Reihenfolge an
+    id = db.Column(db.String(255), primary_key=True)
+    type = db.Column(db.String(100), nullable=False)
+    created = db.Column(db.Integer, nullable=False, index=True)
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='pending')  # pending | processed | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    received_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
+    # nach einem Fehler erst ab hier wieder versuchen (Backoff)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # process_pending: status='pending' in created-Reihenfolge
+        db.Index('ix_stripe_event_status_created', 'status', 'created'),
+    )
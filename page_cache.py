@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from functools import wraps
+
+import metrics
+import shared_store
+from search_cache import MemoryCache, normalize_query
+
+# Antwort-Cache:
+# - öffentliche Seiten einmal pro Prozess rendern, danach nur noch Bytes + ETag (304 bei If-None-Match)
+# - Ergebnis-Fragment von ebay_results.html pro User, Query und Ergebnisversion
+PUBLIC_MAX_AGE = int(os.getenv("PAGE_CACHE_PUBLIC_MAX_AGE", "300"))
+# Fragmente enthalten auch den Preis-Check (Preisverlauf) -> nicht ewig halten
+FRAGMENT_TTL = int(os.getenv("PAGE_CACHE_FRAGMENT_TTL", "120"))
+FRAGMENT_SIZE = int(os.getenv("PAGE_CACHE_FRAGMENT_SIZE", "2000"))
+
+page_cache_requests = metrics.registry.counter("page_cache_total", "Seiten-/Fragment-Cache nach Ergebnis",
+                                               ("kind", "result"))
+
+_pages = {}
+_pages_lock = threading.Lock()
+fragments = MemoryCache(max_size=FRAGMENT_SIZE, ttl=FRAGMENT_TTL)
+# Generationen in shared_store ("q:<query>", "u:<user_id>"), damit Invalidierungen aus anderen Workern
+# (Job-Worker: Stripe-Events, Syncs) überall greifen; eine neue Generation macht alte Einträge unerreichbar
+_store_ready = threading.Event()
+_pruned_at = 0.0
+
+
+def _conn():
+    conn = shared_store.connect()
+    if not _store_ready.is_set():
+        conn.execute("CREATE TABLE IF NOT EXISTS page_generations (name TEXT PRIMARY KEY, generation INTEGER NOT NULL, "
+                     "updated_at REAL NOT NULL)")
+        _store_ready.set()
+    return conn
+
+
+def _generations(*names):
+    # 0 = nie invalidiert
+    rows = dict(_conn().execute(
+        "SELECT name, generation FROM page_generations WHERE name IN (%s)" % ",".join("?" * len(names)), names
+    ).fetchall())
+    return tuple(rows.get(name, 0) for name in names)
+
+
+def _bump(name):
+    # Generation = Zeitstempel (ns) statt Zähler: nach dem Aufräumen kommt nie eine alte Generation wieder
+    global _pruned_at
+    now = time.time()
+    conn = _conn()
+    conn.execute("INSERT INTO page_generations (name, generation, updated_at) VALUES (?, ?, ?) "
+                 "ON CONFLICT(name) DO UPDATE SET generation = MAX(generation + 1, excluded.generation), "
+                 "updated_at = excluded.updated_at", (name, time.time_ns(), now))
+    if now - _pruned_at > FRAGMENT_TTL:
+        # seit FRAGMENT_TTL unverändert: alle Fragmente dieser Generation sind abgelaufen
+        _pruned_at = now
+        conn.execute("DELETE FROM page_generations WHERE updated_at < ?", (now - FRAGMENT_TTL,))
+
+
+def enabled():
+    from flask import current_app
+
+    return current_app.config.get("PAGE_CACHE_ENABLED", True)
+
+
+def digest(*parts):
+    data = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False).encode()
+    return hashlib.blake2b(data, digest_size=12).hexdigest()
+
+
+def respond(etag, build, public=False, max_age=0):
+    # 304 ohne build(), wenn der Client die Version schon hat; sonst build() mit ETag/Cache-Control
+    from flask import Response, make_response, request
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = make_response(build())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag)
+    if public:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    else:
+        # hinter Login: nur der Browser, und der fragt jedes Mal mit If-None-Match nach
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    return response
+
+
+# -------------------------
+# Ganze Seiten
+# -------------------------
+def page(public=True, max_age=PUBLIC_MAX_AGE, version=None):
+    # die View darf nur von Konfiguration (und version(), z. B. Stripe-Katalog) abhängen, nicht von User,
+    # Session oder Query-Args (Marketing-Links mit ?utm_… landen deshalb alle auf demselben Eintrag).
+    # Templates/Konfiguration ändern sich nur mit einem Deploy, der die Prozesse (und damit _pages) neu startet
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import Response, make_response, request
+
+            if not enabled():
+                return view(*args, **kwargs)
+            key = (request.path, version() if version else None)
+            entry = _pages.get(key)
+            result = "hit"
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                body = response.get_data()
+                entry = (hashlib.blake2b(body, digest_size=12).hexdigest(), body, response.mimetype, time.time())
+                with _pages_lock:
+                    # ältere Versionen derselben Seite ersetzen
+                    for old in [k for k in _pages if k[0] == key[0]]:
+                        del _pages[old]
+                    _pages[key] = entry
+                result = "miss"
+            etag, body, mimetype, rendered_at = entry
+            response = respond(etag, lambda: Response(body, mimetype=mimetype), public=public, max_age=max_age)
+            response.last_modified = rendered_at
+            page_cache_requests.inc(kind="page", result="not_modified" if response.status_code == 304 else result)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+# -------------------------
+# Fragmente (Suchergebnisse)
+# -------------------------
+def fragment_key(user_id, query, version):
+    q = normalize_query(query)
+    return (user_id, q) + _generations("q:" + q, f"u:{user_id}") + (version,)
+
+
+def fragment(key, render):
+    # (etag, html): gecacht oder frisch gerendert
+    entry = fragments.get(key) if enabled() else None
+    if entry is None:
+        html = render()
+        entry = (digest(key, html), html)
+        if enabled():
+            fragments.set(key, entry)
+            page_cache_requests.inc(kind="fragment", result="miss")
+    else:
+        page_cache_requests.inc(kind="fragment", result="hit")
+    return entry
+
+
+def invalidate_query(query):
+    # neue Live-Ergebnisse für die Query -> alle Fragmente dieser Query (alle User, Seiten, Filter)
+    _bump("q:" + normalize_query(query))
+
+
+def invalidate_user(user_id):
+    _bump(f"u:{user_id}")
+
+
+def stats():
+    return {"pages": len(_pages), "fragments": fragments.stats()}
@@ -0,0 +1,43 @@
+import base64
+import json
+
+# Cursor-Pagination für Ergebnislisten. Der Cursor ist opak für Clients (base64-JSON),
+# damit wir später auf Keyset (z. B. letzter Preis + ID) umstellen können, ohne URLs zu brechen.
+
+
+def encode_cursor(offset):
+    if not offset:
+        return None
+    raw = json.dumps({"o": int(offset)}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    # kaputte/alte Cursor -> erste Seite statt Fehler
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return max(0, int(json.loads(raw)["o"]))
+    except (ValueError, KeyError, TypeError):
+        return 0
+
+
+def window(batches, offset, limit, state):
+    # Items [offset, offset+limit) aus nacheinander eintreffenden Listen; der Rest wird
+    # trotzdem verbraucht (Cache befüllen), danach stehen total/next_offset in state
+    seen = 0
+    for batch in batches:
+        part = batch[max(offset - seen, 0):max(offset + limit - seen, 0)]
+        seen += len(batch)
+        if part:
+            yield part
+    state["total"] = seen
+    state["next_offset"] = offset + limit if seen > offset + limit else None
+
+
+def rechunk(batches, size):
+    # große Listen in Blöcke zum Rendern/Flushen teilen
+    for batch in batches:
+        for start in range(0, len(batch), size):
+            yield batch[start:start + size]
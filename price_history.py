@@ -0,0 +1,408 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows (lokale Entwicklung): ohne Datei-Lock
+    fcntl = None
+
+# Preisbeobachtungen (item, zeit, preis) als spaltenweise numpy-Chunks statt einer ORM-Zeile pro Beobachtung.
+# Pro Shard: append-only Log (16 Byte/Beobachtung) + kompaktierte, nach (item, ts) sortierte Spaltendateien.
+# Spalten liegen versioniert in <shard>.v<N>/; <shard>.manifest zeigt auf die gültige Version (atomarer Wechsel).
+ROOT = os.getenv("PRICE_HISTORY_PATH") or os.path.join("instance", "price_history")
+SHARDS = int(os.getenv("PRICE_HISTORY_SHARDS", "64"))
+COMPACT_BYTES = int(os.getenv("PRICE_HISTORY_COMPACT_BYTES", str(4 * 1024 * 1024)))
+# ab dieser Loggröße wird direkt beim Schreiben kompaktiert (kein Job-Worker gelaufen)
+COMPACT_HARD_BYTES = int(os.getenv("PRICE_HISTORY_COMPACT_HARD_BYTES", str(4 * COMPACT_BYTES)))
+# gleiche Preise desselben Items werden höchstens so oft erneut gespeichert
+DEDUPE_SECONDS = int(os.getenv("PRICE_HISTORY_DEDUPE_SECONDS", "3600"))
+
+# numpy (~40 ms Import) erst beim ersten Zugriff laden, nicht beim App-Start; Felder als dtype-Spezifikation
+RECORD = [("item", "<u8"), ("ts", "<u4"), ("price", "<f4")]
+RECORD_SIZE = 16
+COLUMNS = ("item", "ts", "price")
+# Log-Zeilen, die ein Prozess unsortiert hält, bevor er sie in seine sortierte Kopie des Logs einsortiert
+LOG_TAIL_ROWS = 4096
+# gelesene Logs pro Prozess im Speicher (LRU); was herausfällt, wird beim nächsten Zugriff wieder ganz gelesen
+LOG_CACHE_BYTES = int(os.getenv("PRICE_HISTORY_LOG_CACHE_MB", "64")) * 1024 * 1024
+
+
+def item_hash(item_id):
+    return int.from_bytes(hashlib.blake2b(str(item_id).encode(), digest_size=8).digest(), "little")
+
+
+def _ranges(items, wanted):
+    # Indizes aller Zeilen der gesuchten Items in einem nach item sortierten Array
+    import numpy as np
+
+    lo = np.searchsorted(items, wanted, side="left")
+    counts = np.searchsorted(items, wanted, side="right") - lo
+    starts = np.cumsum(counts) - counts
+    return np.arange(counts.sum()) - np.repeat(starts - lo, counts)
+
+
+class _LogView:
+    # bereits gelesener Teil eines Logs: Datei-Offset, nach item sortierte Zeilen + kleiner unsortierter Rest.
+    # Unveränderlich, ein Nachlesen erzeugt eine neue View (parallele Leser-Threads).
+    __slots__ = ("ino", "offset", "rows", "tail")
+
+    def __init__(self, ino, offset, rows, tail):
+        self.ino = ino
+        self.offset = offset
+        self.rows = rows
+        self.tail = tail
+
+    def extended(self, fresh):
+        import numpy as np
+
+        tail = np.concatenate([self.tail, fresh])
+        rows = self.rows
+        if len(tail) >= LOG_TAIL_ROWS:
+            rows = np.concatenate([rows, tail])
+            rows = rows[np.argsort(rows["item"], kind="stable")]
+            tail = tail[:0]
+        return _LogView(self.ino, self.offset + len(fresh) * RECORD_SIZE, rows, tail)
+
+    @property
+    def nbytes(self):
+        return self.rows.nbytes + self.tail.nbytes
+
+    def select(self, wanted):
+        import numpy as np
+
+        return np.concatenate([self.rows[_ranges(self.rows["item"], wanted)],
+                               self.tail[np.isin(self.tail["item"], wanted)]])
+
+
+class _ShardLock:
+    def __init__(self, path, blocking=True):
+        self.path = path
+        self.blocking = blocking
+        self.fd = None
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_CREAT | os.O_RDWR)
+        if fcntl is not None:
+            flags = fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(self.fd, flags)
+            except BlockingIOError:
+                os.close(self.fd)
+                self.fd = None
+        return self.fd is not None
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            if fcntl is not None:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+
+
+class PriceHistory:
+    def __init__(self, root=ROOT, shards=SHARDS, dedupe_seconds=DEDUPE_SECONDS, dedupe_size=100000):
+        self.root = root
+        self.shards = shards
+        self.dedupe_seconds = dedupe_seconds
+        self.dedupe_size = dedupe_size
+        self._recent = OrderedDict()  # item_hash -> (preis, ts) der letzten Beobachtung in diesem Prozess
+        # Log-Pfad -> _LogView: pro Render nur die seit dem letzten Lesen angehängten Bytes lesen
+        self._logs = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    # --- Pfade ---
+
+    def _shard(self, h):
+        return int(h % self.shards)
+
+    def _path(self, shard, name):
+        return os.path.join(self.root, f"{shard:03d}.{name}")
+
+    # --- Schreiben ---
+
+    def record(self, observations, now=None):
+        # observations: (item_id, preis[, ts]); gibt Shards zurück, deren Log kompaktiert werden sollte
+        import numpy as np
+
+        now = int(now or time.time())
+        rows = {}
+        with self._lock:
+            for obs in observations:
+                price = obs[1]
+                if price is None:
+                    continue
+                ts = int(obs[2]) if len(obs) > 2 and obs[2] else now
+                h = item_hash(obs[0])
+                last = self._recent.get(h)
+                if last is not None and last[0] == price and ts - last[1] < self.dedupe_seconds:
+                    continue
+                self._recent[h] = (price, ts)
+                self._recent.move_to_end(h)
+                rows.setdefault(self._shard(h), []).append((h, ts, price))
+            while len(self._recent) > self.dedupe_size:
+                self._recent.popitem(last=False)
+        full = []
+        for shard, shard_rows in rows.items():
+            data = np.array(shard_rows, dtype=RECORD).tobytes()
+            # ein write() mit O_APPEND: Datensätze mehrerer Worker vermischen sich nicht
+            fd = os.open(self._path(shard, "log"), os.O_CREAT | os.O_WRONLY | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, data)
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+            if size >= COMPACT_BYTES:
+                full.append(shard)
+        return full
+
+    # --- Versionen ---
+
+    def _version(self, shard):
+        # 0 = noch keine versionierten Spalten (ggf. alte Spaltendateien direkt im Root)
+        try:
+            with open(self._path(shard, "manifest")) as f:
+                return int(json.load(f)["version"])
+        except (FileNotFoundError, ValueError, KeyError):
+            return 0
+
+    def _column_path(self, shard, version, col):
+        if version == 0:
+            return self._path(shard, f"{col}.npy")
+        return os.path.join(self._path(shard, f"v{version}"), f"{col}.npy")
+
+    def _pending_path(self, shard, version):
+        # Log, das gerade in Version `version` eingearbeitet wird
+        return self._path(shard, f"log.compacting.{version}")
+
+    def _drop_version(self, shard, version):
+        if version == 0:
+            for col in COLUMNS:
+                try:
+                    os.remove(self._column_path(shard, 0, col))
+                except OSError:
+                    pass
+        else:
+            # unter Windows scheitert das bei noch gemappten Dateien -> beim nächsten Mal
+            shutil.rmtree(self._path(shard, f"v{version}"), ignore_errors=True)
+
+    def compact(self, shard):
+        # Log in neue sortierte Spalten einarbeiten, dann per Manifest umschalten;
+        # Schreiber hängen währenddessen an ein neues Log an
+        import numpy as np
+
+        log = self._path(shard, "log")
+        with _ShardLock(self._path(shard, "lock"), blocking=False) as locked:
+            if not locked:
+                return False
+            current = self._version(shard)
+            new = current + 1
+            pending = self._pending_path(shard, new)
+            # Reste eines Abbruchs: schon eingearbeitetes Log weg, altes Namensschema übernehmen
+            if os.path.exists(self._pending_path(shard, current)):
+                os.remove(self._pending_path(shard, current))
+            legacy = self._path(shard, "log.compacting")
+            if os.path.exists(legacy) and not os.path.exists(pending):
+                os.replace(legacy, pending)
+            if not os.path.exists(pending):
+                if not os.path.exists(log):
+                    return False
+                os.replace(log, pending)
+            fresh = np.fromfile(pending, dtype=RECORD)
+            base = self._load_columns(shard, current)
+            merged = np.empty(len(base) + len(fresh), dtype=RECORD)
+            merged[:len(base)] = base
+            merged[len(base):] = fresh
+            merged = merged[np.lexsort((merged["ts"], merged["item"]))]
+            directory = self._path(shard, f"v{new}")
+            os.makedirs(directory, exist_ok=True)
+            for col in COLUMNS:
+                with open(self._column_path(shard, new, col), "wb") as f:
+                    np.save(f, np.ascontiguousarray(merged[col]))
+            tmp = self._path(shard, "manifest.tmp")
+            with open(tmp, "w") as f:
+                json.dump({"version": new}, f)
+            # ein rename: Leser sehen entweder alte Spalten + Pending-Log oder neue Spalten ohne es
+            os.replace(tmp, self._path(shard, "manifest"))
+            os.remove(pending)
+            # die direkt vorherige Version bleibt für Leser, die das alte Manifest schon gelesen haben
+            if current > 0:
+                self._drop_version(shard, current - 1)
+        return True
+
+    def compact_overdue(self, shards):
+        # Fallback ohne Job-Worker: sehr große Logs gleich hier einarbeiten (wartet nie auf den Lock)
+        done = []
+        for shard in shards:
+            try:
+                size = os.path.getsize(self._path(shard, "log"))
+            except OSError:
+                continue
+            if size >= COMPACT_HARD_BYTES and self.compact(shard):
+                done.append(shard)
+        return done
+
+    def compact_all(self):
+        return sum(1 for shard in range(self.shards) if self.compact(shard))
+
+    # --- Lesen ---
+
+    def _load_columns(self, shard, version):
+        import numpy as np
+
+        paths = [self._column_path(shard, version, col) for col in COLUMNS]
+        if not all(os.path.exists(p) for p in paths):
+            return np.empty(0, dtype=RECORD)
+        cols = [np.load(p, mmap_mode="r") for p in paths]
+        out = np.empty(len(cols[0]), dtype=RECORD)
+        for col, values in zip(COLUMNS, cols):
+            out[col] = values
+        return out
+
+    def _sorted_slices(self, shard, version, hashes):
+        # nur die Bereiche der gesuchten Items aus den memory-mapped, sortierten Spalten derselben Version lesen
+        import numpy as np
+
+        item_path = self._column_path(shard, version, "item")
+        if not os.path.exists(item_path):
+            return []
+        items = np.load(item_path, mmap_mode="r")
+        ts = np.load(self._column_path(shard, version, "ts"), mmap_mode="r")
+        price = np.load(self._column_path(shard, version, "price"), mmap_mode="r")
+        index = _ranges(items, hashes)
+        if not len(index):
+            return []
+        part = np.empty(len(index), dtype=RECORD)
+        part["item"], part["ts"], part["price"] = items[index], ts[index], price[index]
+        return [part]
+
+    def _read_log(self, path, wanted):
+        # Log ist append-only: nur neue Bytes seit dem letzten Lesen in diesem Prozess von der Platte holen.
+        # Neue Datei unter dem Pfad (Rotation bei der Kompaktierung) -> von vorn
+        import numpy as np
+
+        try:
+            with open(path, "rb") as f:
+                st = os.fstat(f.fileno())
+                view = self._logs.get(path)
+                if view is None or view.ino != st.st_ino or st.st_size < view.offset:
+                    view = _LogView(st.st_ino, 0, np.empty(0, dtype=RECORD), np.empty(0, dtype=RECORD))
+                # halb geschriebene Zeile am Ende erst beim nächsten Mal
+                count = (st.st_size - view.offset) // RECORD_SIZE
+                if count:
+                    f.seek(view.offset)
+                    view = view.extended(np.fromfile(f, dtype=RECORD, count=count))
+        except FileNotFoundError:
+            # gerade eingearbeitet/rotiert
+            with self._lock:
+                self._logs.pop(path, None)
+            return None
+        with self._lock:
+            self._logs[path] = view
+            self._logs.move_to_end(path)
+            size = sum(v.nbytes for v in self._logs.values())
+            while size > LOG_CACHE_BYTES and len(self._logs) > 1:
+                size -= self._logs.popitem(last=False)[1].nbytes
+        return view.select(wanted)
+
+    def _load_shard(self, shard, wanted):
+        # Manifest zuerst: Spalten der Version + nur das Log, das noch nicht darin steckt
+        for attempt in range(2):
+            version = self._version(shard)
+            try:
+                parts = self._sorted_slices(shard, version, wanted)
+                break
+            except FileNotFoundError:
+                # Version zwischen Manifest und Öffnen aufgeräumt: neues Manifest lesen
+                if attempt:
+                    raise
+        for path in (self._path(shard, "log.compacting"), self._pending_path(shard, version + 1),
+                     self._path(shard, "log")):
+            part = self._read_log(path, wanted) if os.path.exists(path) else None
+            if part is not None and len(part):
+                parts.append(part)
+        # eingearbeitete (gelöschte) Pending-Logs nicht im Speicher behalten
+        prefix, current = self._path(shard, "log.compacting."), self._pending_path(shard, version + 1)
+        with self._lock:
+            for path in [p for p in self._logs if p.startswith(prefix) and p != current]:
+                del self._logs[path]
+        return parts
+
+    def load(self, item_ids):
+        import numpy as np
+
+        hashes = np.unique(np.array([item_hash(i) for i in item_ids], dtype=np.uint64))
+        if not len(hashes):
+            return np.empty(0, dtype=RECORD)
+        parts = []
+        shard_of = hashes % np.uint64(self.shards)
+        for shard in np.unique(shard_of):
+            parts.extend(self._load_shard(int(shard), hashes[shard_of == shard]))
+        if not parts:
+            return np.empty(0, dtype=RECORD)
+        data = np.concatenate(parts)
+        return data[np.lexsort((data["ts"], data["item"]))]
+
+
+# --- Auswertung (vektorisiert) ---
+
+def moving_average(prices, window):
+    import numpy as np
+
+    if len(prices) < window or window < 1:
+        return np.array([], dtype=np.float64)
+    csum = np.cumsum(np.insert(prices.astype(np.float64), 0, 0.0))
+    return (csum[window:] - csum[:-window]) / window
+
+
+def summarize(data, drop_threshold=0.1, window=5):
+    import numpy as np
+
+    if not len(data):
+        return {"observations": 0, "items": 0}
+    prices = data["price"].astype(np.float64)
+    p10, p25, p50, p75, p90 = np.percentile(prices, [10, 25, 50, 75, 90])
+    # letzter Preis pro Item: Daten sind nach (item, ts) sortiert
+    last_idx = np.flatnonzero(np.r_[data["item"][1:] != data["item"][:-1], True])
+    first_idx = np.r_[0, last_idx[:-1] + 1]
+    latest = prices[last_idx]
+    # Preissturz: letzter Preis mindestens drop_threshold unter dem Höchstpreis des Items
+    peak = np.maximum.reduceat(prices, first_idx)
+    drops = latest <= peak * (1 - drop_threshold)
+    by_time = np.argsort(data["ts"], kind="stable")
+    return {
+        "observations": int(len(data)),
+        "items": int(len(last_idx)),
+        "min": float(prices.min()),
+        "max": float(prices.max()),
+        "mean": float(prices.mean()),
+        "median": float(p50),
+        "p10": float(p10),
+        "p25": float(p25),
+        "p75": float(p75),
+        "p90": float(p90),
+        "latest_median": float(np.median(latest)),
+        "moving_average": [round(float(v), 2) for v in moving_average(prices[by_time], window)[-50:]],
+        "price_drops": int(drops.sum()),
+        "first_seen": int(data["ts"].min()),
+        "last_seen": int(data["ts"].max()),
+    }
+
+
+def item_series(data):
+    return [{"ts": int(t), "price": round(float(p), 2)} for t, p in zip(data["ts"], data["price"])]
+
+
+def price_label(price, stats):
+    # für die Ergebnisseite: Einordnung gegen die Verteilung der Suche
+    if price is None or not stats.get("observations"):
+        return None
+    if price <= stats["p25"]:
+        return "günstig"
+    if price >= stats["p75"]:
+        return "teuer"
+    return "normal"
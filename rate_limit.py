@@ -0,0 +1,232 @@
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+import shared_store
+
+# Token-Bucket pro User (bzw. IP) und Route, Zustand in shared_store -> gilt über alle Worker.
+# RATE_LIMITS: endpoint=Anzahl/Sekunden, z. B. search=30/60 = 30 auf einmal, danach eine alle 2 s
+RATE_LIMITS = os.getenv(
+    "RATE_LIMITS",
+    "search=30/60,api_search_batch=10/60,sync_get=6/60,job_enqueue=6/60,"
+    "public_checkout=10/60,login=20/60,register=5/60",
+)
+# Formular-Routen: nur das Absenden zählt, das Anzeigen des Formulars (GET) nicht
+RATE_LIMITS_SUBMIT_ONLY = {e.strip() for e in os.getenv("RATE_LIMITS_SUBMIT_ONLY",
+                                                        "login,register,public_checkout").split(",") if e.strip()}
+# volle Buckets älter als das werden aufgeräumt (Sekunden)
+PRUNE_INTERVAL = 60
+
+# Upstream-Tagesbudget: eBay-Calls pro Tag über alle Worker (0 = unbegrenzt)
+EBAY_DAILY_BUDGET = int(os.getenv("EBAY_DAILY_CALL_BUDGET", "5000"))
+# Anteil, der sofort verfügbar ist; der Rest wird gleichmäßig über den Tag freigegeben
+EBAY_BUDGET_BURST = float(os.getenv("EBAY_BUDGET_BURST", "0.05"))
+# Restanteil, ab dem abgelaufene Cache-Einträge statt Upstream ausgeliefert werden
+EBAY_BUDGET_LOW = float(os.getenv("EBAY_BUDGET_LOW", "0.02"))
+# eBay setzt das Kontingent um Mitternacht Pacific Time zurück (Stunden gegen UTC, ohne Sommerzeit)
+EBAY_BUDGET_UTC_OFFSET = float(os.getenv("EBAY_BUDGET_UTC_OFFSET", "-8"))
+
+logger = logging.getLogger(__name__)
+
+rate_limited = metrics.registry.counter("rate_limited_total", "Abgewiesene Requests (429) nach Route", ("endpoint",))
+upstream_budget = metrics.registry.counter("upstream_budget_total", "Upstream-Budget: Entscheidungen",
+                                           ("decision",))
+
+_store_ready = threading.Event()
+_denied = {}
+_denied_lock = threading.Lock()
+_pruned_at = 0.0
+_status = (0.0, None)
+
+
+def parse_limits(spec):
+    # "search=30/60,login=20/60" -> {"search": (Kapazität, Tokens pro Sekunde)}
+    limits = {}
+    for part in spec.split(","):
+        endpoint, _, rule = part.partition("=")
+        if not rule:
+            continue
+        count, _, seconds = rule.partition("/")
+        count = float(count)
+        limits[endpoint.strip()] = (count, count / float(seconds or 1))
+    return limits
+
+
+LIMITS = parse_limits(RATE_LIMITS)
+
+
+def _conn():
+    conn = shared_store.connect()
+    if not _store_ready.is_set():
+        conn.execute("CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+                     "updated_at REAL NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS upstream_budget (day INTEGER PRIMARY KEY, used INTEGER NOT NULL)")
+        _store_ready.set()
+    return conn
+
+
+# -------------------------
+# Token-Bucket (pro User und Route)
+# -------------------------
+# ein Statement = eine Schreibtransaktion: auffüllen, abbuchen, nur wenn noch ein Token da ist
+_TAKE = ("INSERT INTO rate_buckets (key, tokens, updated_at) VALUES (?1, ?2 - 1, ?4) "
+         "ON CONFLICT(key) DO UPDATE SET tokens = MIN(?2, tokens + MAX(0, ?4 - updated_at) * ?3) - 1, "
+         "updated_at = ?4 WHERE MIN(?2, tokens + MAX(0, ?4 - updated_at) * ?3) >= 1 RETURNING tokens")
+
+
+def take(key, capacity, rate, now=None):
+    # ein Token abbuchen; gibt (erlaubt, Sekunden bis zum nächsten Token) zurück
+    now = now or time.time()
+    # schon abgewiesen: bis zum nächsten Token ohne shared_store ablehnen (andere Worker können nur abbuchen)
+    retry_at = _denied.get(key)
+    if retry_at is not None:
+        if now < retry_at:
+            return False, retry_at - now
+        with _denied_lock:
+            _denied.pop(key, None)
+    try:
+        conn = _conn()
+        if conn.execute(_TAKE, (key, capacity, rate, now)).fetchone() is not None:
+            _prune(conn, now)
+            return True, 0.0
+        row = conn.execute("SELECT tokens, updated_at FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+    except sqlite3.Error:
+        # Limiter darf die App nicht lahmlegen: lieber durchlassen
+        logger.exception("Rate-Limit: shared_store nicht verfügbar")
+        return True, 0.0
+    tokens = min(capacity, row[0] + max(0.0, now - row[1]) * rate) if row else 0.0
+    wait = (1 - tokens) / rate if rate > 0 else float(PRUNE_INTERVAL)
+    with _denied_lock:
+        _denied[key] = now + wait
+    return False, wait
+
+
+def _prune(conn, now):
+    # volle (= vergessene) Buckets ab und zu löschen, einmal pro Intervall und Prozess
+    global _pruned_at
+    if now - _pruned_at < PRUNE_INTERVAL:
+        return
+    _pruned_at = now
+    full_after = max((capacity / rate for capacity, rate in LIMITS.values() if rate > 0), default=0)
+    conn.execute("DELETE FROM rate_buckets WHERE updated_at < ?", (now - max(full_after, PRUNE_INTERVAL),))
+    with _denied_lock:
+        for key in [k for k, retry_at in _denied.items() if retry_at <= now]:
+            del _denied[key]
+
+
+def check_request():
+    # vor dem View (before_request bzw. asgi.py): 429-Antwort oder None
+    from flask import current_app, jsonify, render_template, request
+    from flask_login import current_user
+
+    limit = LIMITS.get(request.endpoint)
+    if limit is None or not current_app.config.get("RATE_LIMITS_ENABLED", True):
+        return None
+    if request.endpoint in RATE_LIMITS_SUBMIT_ONLY and request.method in ("GET", "HEAD"):
+        return None
+    # remote_addr: hinter Render & Co. erst mit ProxyFix (PROXY_FIX_HOPS) die echte Client-IP
+    who = f"u{current_user.id}" if current_user.is_authenticated else f"ip{request.remote_addr}"
+    allowed, wait = take(f"{request.endpoint}:{who}", *limit)
+    if allowed:
+        return None
+    rate_limited.inc(endpoint=request.endpoint)
+    retry_after = max(1, math.ceil(wait))
+    message = f"Zu viele Anfragen – bitte in {retry_after} s erneut versuchen."
+    headers = {"Retry-After": str(retry_after)}
+    if (request.path.startswith("/api/") or request.args.get("format") in ("json", "ndjson")
+            or request.accept_mimetypes.best in ("application/json", "application/x-ndjson")):
+        return jsonify({"error": message, "retry_after": retry_after}), 429, headers
+    return render_template("429.html", message=message), 429, headers
+
+
+def init_app(app):
+    app.before_request(check_request)
+
+
+# -------------------------
+# Upstream-Tagesbudget (eBay-Calls)
+# -------------------------
+def _day(now):
+    offset = EBAY_BUDGET_UTC_OFFSET * 3600
+    return int((now + offset) // 86400), (now + offset) % 86400 / 86400
+
+
+def allowance(now=None):
+    # bis jetzt freigegebene Calls: Burst + linear über den Tag, am Tagesende das volle Budget
+    _, elapsed = _day(now or time.time())
+    return min(EBAY_DAILY_BUDGET,
+               math.ceil(EBAY_DAILY_BUDGET * (EBAY_BUDGET_BURST + (1 - EBAY_BUDGET_BURST) * elapsed)))
+
+
+def spend(calls=1, now=None):
+    # Calls vor dem Upstream-Aufruf abbuchen; False = Budget für jetzt erschöpft
+    if EBAY_DAILY_BUDGET <= 0:
+        return True
+    global _status
+    now = now or time.time()
+    day, _ = _day(now)
+    limit = allowance(now)
+    try:
+        conn = _conn()
+        row = None
+        if calls <= limit:
+            row = conn.execute("INSERT INTO upstream_budget (day, used) VALUES (?, ?) "
+                               "ON CONFLICT(day) DO UPDATE SET used = used + excluded.used "
+                               "WHERE used + excluded.used <= ? RETURNING used", (day, calls, limit)).fetchone()
+            if row is not None and row[0] == calls:
+                # erster Call des Tages: alte Tage weg
+                conn.execute("DELETE FROM upstream_budget WHERE day < ?", (day,))
+    except sqlite3.Error:
+        logger.exception("Upstream-Budget: shared_store nicht verfügbar")
+        return True
+    if row is None:
+        upstream_budget.inc(decision="denied")
+        _status = (now, limit)
+        return False
+    upstream_budget.inc(calls, decision="granted")
+    _status = (now, row[0])
+    return True
+
+
+def used(now=None):
+    day, _ = _day(now or time.time())
+    row = _conn().execute("SELECT used FROM upstream_budget WHERE day = ?", (day,)).fetchone()
+    return row[0] if row else 0
+
+
+def low(now=None):
+    # wenig Spielraum bis zur aktuellen Freigabe -> Cache bevorzugen; Stand höchstens 1 s alt
+    if EBAY_DAILY_BUDGET <= 0:
+        return False
+    global _status
+    now = now or time.time()
+    checked_at, count = _status
+    if count is None or now - checked_at > 1:
+        try:
+            count = used(now)
+        except sqlite3.Error:
+            return False
+        _status = (now, count)
+    return allowance(now) - count < EBAY_DAILY_BUDGET * EBAY_BUDGET_LOW
+
+
+def status(now=None):
+    now = now or time.time()
+    count = used(now) if EBAY_DAILY_BUDGET > 0 else 0
+    return {"budget": EBAY_DAILY_BUDGET, "allowance": allowance(now) if EBAY_DAILY_BUDGET > 0 else None,
+            "used": count, "low": low(now)}
+
+
+@metrics.registry.collector
+def budget_metrics():
+    if EBAY_DAILY_BUDGET <= 0:
+        return []
+    now = time.time()
+    return [
+        ("upstream_budget_used", "eBay-Calls heute", "gauge", {(): used(now)}),
+        ("upstream_budget_allowance", "bis jetzt freigegebene eBay-Calls", "gauge", {(): allowance(now)}),
+    ]
@@ -0,0 +1,372 @@
+import itertools
+import os
+import re
+
+import metrics
+
+# Nachbearbeitung der Upstream-Ergebnisse, bevor sie gecacht/gerendert werden:
+#   Preise parsen (EUR) -> Preisfilter -> Dubletten (MinHash/LSH) -> Relevanz (numpy) -> Zubehör raus -> Sortierung
+# Alles linear in der Anzahl Items; pro Stream-Batch aufrufbar (Pipeline merkt sich, was schon da war).
+# Kosten: ~11-13 ms pro 1000 Items, gut ein Drittel davon Tokenisieren/Preise parsen (python -m bench.pipeline)
+# numpy (~40 ms Import) erst bei der ersten Suche laden, nicht beim App-Start
+MIN_RELEVANCE = float(os.getenv("RESULTS_MIN_RELEVANCE", "0.25"))
+DEDUPE_THRESHOLD = float(os.getenv("RESULTS_DEDUPE_THRESHOLD", "0.7"))
+# Umrechnung nach EUR (grob, reicht für Filter/Sortierung); unbekannte Währung -> Betrag bleibt unverändert
+FX_RATES = {
+    code.strip().upper(): float(rate)
+    for code, rate in (pair.split("=") for pair in
+                       os.getenv("RESULTS_FX_RATES", "EUR=1,GBP=1.17,CHF=1.06,USD=0.92,PLN=0.23").split(","))
+}
+SORTS = ("relevance", "price_asc", "price_desc", "newest")
+
+# MinHash: 32 Permutationen, 8 Bänder à 4 Zeilen -> Kandidat ab ~J 0.6, dann geprüft gegen DEDUPE_THRESHOLD
+NUM_PERM = 32
+BAND_ROWS = 4
+_perms = None
+_untitled = itertools.count()
+
+# Gewichte des Relevanzmodells (Score ~ 0..1)
+W_BASE, W_COVERAGE, W_POSITION, W_ACCESSORY, W_CHEAP = 0.3, 0.4, 0.2, 0.5, 0.2
+ACCESSORY_WORDS = frozenset((
+    "hülle", "huelle", "case", "cover", "schutzhülle", "tasche", "bumper", "skin", "folie", "schutzfolie",
+    "panzerglas", "displayschutz", "schutzglas", "ladekabel", "kabel", "ladegerät", "netzteil", "adapter",
+    "halterung", "ständer", "armband", "strap", "aufkleber", "sticker", "ersatzteil", "attrappe", "dummy",
+))
+CONTEXT_WORDS = frozenset(("für", "fuer", "for", "kompatibel", "compatible", "passend", "fits"))
+
+dropped = metrics.registry.counter("results_dropped_total", "Aussortierte Suchergebnisse nach Grund", ("reason",))
+
+_token_re = re.compile(r"\w+", re.UNICODE)
+_number_re = re.compile(r"\d[\d.,'\s]*")
+_CURRENCY_MARKS = (("€", "EUR"), ("EUR", "EUR"), ("£", "GBP"), ("GBP", "GBP"), ("$", "USD"), ("USD", "USD"),
+                   ("CHF", "CHF"), ("ZŁ", "PLN"), ("PLN", "PLN"))
+
+
+def _tokens(text):
+    return _token_re.findall(text.lower()) if text else []
+
+
+# -------------------------
+# Preise
+# -------------------------
+def _amount(text):
+    # "1.234,56" / "1,234.56" / "12,99" / "12,-" / "1 299" -> float; Bereich "12,99 - 15,99" -> untere Grenze
+    match = _number_re.search(text)
+    if not match:
+        return None
+    raw = "".join(match.group().split()).replace("'", "").rstrip(".,")
+    if "," in raw and "." in raw:
+        decimal = "," if raw.rfind(",") > raw.rfind(".") else "."
+    elif raw.count(",") == 1 or raw.count(".") == 1:
+        sep = "," if "," in raw else "."
+        # genau drei Ziffern danach = Tausender ("1.299"), sonst Dezimaltrenner
+        decimal = None if len(raw) - raw.find(sep) - 1 == 3 else sep
+    else:
+        decimal = None
+    thousands = {",": ".", ".": ",", None: ".,"}[decimal]
+    for sep in thousands:
+        raw = raw.replace(sep, "")
+    if decimal:
+        raw = raw.replace(decimal, ".")
+    try:
+        return float(raw)
+    except ValueError:
+        return None
+
+
+def parse_price(value, currency=None):
+    # -> (Betrag, Währung); akzeptiert Zahlen, Strings in gemischten Formaten und {"value", "currency"}
+    if isinstance(value, dict):
+        value, currency = value.get("value"), value.get("currency") or currency
+    if value is None or value == "" or isinstance(value, bool):
+        return None, currency
+    if isinstance(value, (int, float)):
+        return float(value), currency
+    text = str(value).strip()
+    # schneller Pfad für "12.99" / "1299" (häufigster Fall, Browse-API)
+    head, dot, tail = text.partition(".")
+    if head.isdigit() and (not dot or (tail.isdigit() and len(tail) != 3)):
+        return float(text), currency
+    if not currency:
+        upper = text.upper()
+        currency = next((code for mark, code in _CURRENCY_MARKS if mark in upper), None)
+    return _amount(text), currency
+
+
+def to_eur(amount, currency):
+    if amount is None:
+        return None
+    rate = FX_RATES.get((currency or "EUR").upper())
+    return None if rate is None else round(amount * rate, 2)
+
+
+def normalize_item(item):
+    # neue Dict-Kopie: price = Zahl (EUR wenn umrechenbar), Original bleibt in price_original
+    amount, currency = parse_price(item.get("price"), item.get("currency"))
+    eur = to_eur(amount, currency)
+    out = dict(item)
+    if eur is not None:
+        out["price"], out["currency"] = eur, "EUR"
+        if currency and currency.upper() != "EUR":
+            out["price_original"] = f"{amount:.2f} {currency.upper()}"
+    else:
+        out["price"] = amount
+    return out
+
+
+# -------------------------
+# Dubletten: MinHash über Wort-Shingles, LSH-Bänder statt paarweisem Vergleich
+# -------------------------
+def signatures(token_lists):
+    # (n, NUM_PERM) uint64 über Wort- und Wortpaar-Shingles, alle Items in einem numpy-Durchlauf
+    import numpy as np
+
+    # (Multiply-Shift-Hashing). Doppelte Wörter stören nicht: das Minimum bleibt gleich.
+    hashes, offsets = [], []
+    for words in token_lists:
+        offsets.append(len(hashes))
+        # ohne Titel: eindeutiges Shingle -> nie Dublette
+        hashes.extend(map(hash, words or (("", next(_untitled)),)))
+    if not token_lists:
+        return np.empty((0, NUM_PERM), dtype=np.uint64)
+    words = np.array(hashes, dtype=np.int64).view(np.uint64)
+    pairs = words * np.uint64(0x9E3779B97F4A7C15) + np.roll(words, -1)
+    # Paar über die Item-Grenze hinweg (letztes Wort eines Titels) -> neutral
+    starts = np.array(offsets)
+    last = np.append(starts[1:], len(hashes)) - 1
+    sig = np.minimum(_min_hash(words, starts), _min_hash(pairs, starts, mask=last))
+    return sig.T
+
+
+def _permutations():
+    # feste Seeds, aber die Shingles kommen aus dem pro Prozess gesalzenen hash() -> Signaturen nur innerhalb
+    # eines Prozesses vergleichbar (reicht: sie leben nur in einer Pipeline, nie im Cache)
+    global _perms
+    if _perms is None:
+        import numpy as np
+
+        rng = np.random.default_rng(20240601)
+        _perms = (rng.integers(1, 2**63, NUM_PERM, dtype=np.uint64) | np.uint64(1),
+                  rng.integers(0, 2**63, NUM_PERM, dtype=np.uint64))
+    return _perms
+
+
+def _min_hash(values, starts, mask=None):
+    # in-place, damit keine großen Zwischenarrays entstehen
+    import numpy as np
+
+    perm_a, perm_b = _permutations()
+    mixed = perm_a[:, None] * values[None, :]
+    mixed += perm_b[:, None]
+    mixed >>= np.uint64(32)
+    if mask is not None:
+        mixed[:, mask] = np.iinfo(np.uint64).max
+    return np.minimum.reduceat(mixed, starts, axis=1)
+
+
+class Pipeline:
+    # hält Zustand über Stream-Batches hinweg (gesehene IDs, Signaturen); process() = ein Batch
+    def __init__(self, query, min_price=None, max_price=None, sort="relevance", min_relevance=MIN_RELEVANCE):
+        import numpy as np
+
+        self.query = query
+        self.terms = _tokens(query)
+        # wer nach Zubehör sucht, bekommt Zubehör
+        self.wants_accessory = bool(ACCESSORY_WORDS.intersection(self.terms))
+        self.min_price = min_price
+        self.max_price = max_price
+        self.sort = sort if sort in SORTS else "relevance"
+        self.min_relevance = min_relevance
+        self.seen = set()
+        self.kept = []
+        self.keys = np.empty((0, NUM_PERM // BAND_ROWS), dtype=np.uint64)
+        self.sigs = np.empty((0, NUM_PERM), dtype=np.uint64)
+
+    def _price_ok(self, price):
+        return price_ok(price, self.min_price, self.max_price)
+
+    def _dedupe(self, items, token_lists):
+        # Kandidaten per LSH: gleicher Bandschlüssel wie ein früheres Item (np.unique je Band statt paarweisem
+        # Vergleich); nur Items mit Kandidat werden einzeln gegen DEDUPE_THRESHOLD geprüft.
+        # Zeilen: erst die behaltenen Items früherer Batches, dann der aktuelle Batch
+        import numpy as np
+
+        sigs = signatures(token_lists)
+        bands = sigs.reshape(len(items), -1, BAND_ROWS)
+        keys = bands[:, :, 0]
+        for row in range(1, BAND_ROWS):
+            keys = keys * np.uint64(0x9E3779B97F4A7C15) + bands[:, :, row]
+        offset = len(self.kept)
+        all_keys = np.vstack([self.keys, keys])
+        all_sigs = np.vstack([self.sigs, sigs])
+        first = np.empty(all_keys.shape, dtype=np.int64)
+        for band in range(all_keys.shape[1]):
+            _, index, inverse = np.unique(all_keys[:, band], return_index=True, return_inverse=True)
+            first[:, band] = index[inverse]
+        batch_first = first[offset:]
+        # Ähnlichkeit zu jedem Band-Kandidaten in einem Vergleich (n, Bänder, NUM_PERM) statt einzeln pro Zeile
+        matches = (all_sigs[batch_first] == sigs[:, None, :]).sum(axis=2).tolist()
+        batch_first = batch_first.tolist()
+        needed = DEDUPE_THRESHOLD * NUM_PERM
+
+        # root[row] = Zeile des behaltenen Items, für das diese Zeile steht
+        root = list(range(offset))
+        keep = []
+        duplicates = 0
+        for i, item in enumerate(items):
+            row = offset + i
+            twin, best = None, needed
+            checked = {}
+            for c, same in zip(batch_first[i], matches[i]):
+                if c >= row:
+                    continue
+                # Kandidat selbst schon Dublette -> gegen das behaltene Item prüfen (mehrere Bänder: einmal)
+                r = root[c]
+                if r != c:
+                    same = checked.get(r)
+                    if same is None:
+                        same = checked[r] = int(np.count_nonzero(all_sigs[r] == all_sigs[row]))
+                # ähnlichstes behaltenes Item, bei Gleichstand das frühere
+                if same > best or (same == best and (twin is None or r < twin)):
+                    twin, best = r, same
+            if twin is None:
+                root.append(row)
+                keep.append(i)
+                continue
+            root.append(twin)
+            duplicates += 1
+            self._merge(self.kept[twin] if twin < offset else items[twin - offset], item)
+        if duplicates:
+            dropped.inc(duplicates, reason="duplicate")
+
+        self.kept.extend(items[i] for i in keep)
+        self.keys = np.vstack([self.keys, keys[keep]])
+        self.sigs = np.vstack([self.sigs, sigs[keep]])
+        return [items[i] for i in keep], [token_lists[i] for i in keep]
+
+    @staticmethod
+    def _merge(kept, item):
+        # Dublette -> günstigeres Angebot behalten, an der Position des ersten Treffers;
+        # gleiches Dict-Objekt ändern, damit es auch in bereits gelieferten Listen stimmt
+        if item.get("price") is None or (kept.get("price") is not None and item["price"] >= kept["price"]):
+            return
+        relevance = kept.get("relevance")
+        kept.clear()
+        kept.update(item)
+        if relevance is not None:
+            kept["relevance"] = relevance
+
+    def _features(self, items, token_lists):
+        # Wörter einmal auf IDs abbilden, Term-Treffer/Zubehör pro Vokabel prüfen; Rest über alle Wörter
+        # aller Items auf einmal (reduceat je Item) statt Schleife über Items x Terme x Wörter
+        import numpy as np
+
+        n = len(items)
+        if not n:
+            return np.zeros(0), np.zeros(0), np.zeros(0), np.zeros(0)
+        prices = np.array([item.get("price") or np.nan for item in items], dtype=float)
+        vocab = {}
+        # leerer Titel -> ein Platzhalterwort, damit jedes Item mindestens eine Zeile hat
+        ids = [vocab.setdefault(w, len(vocab)) for words in token_lists for w in (words or ("",))]
+        lengths = np.array([len(words) or 1 for words in token_lists])
+        starts = np.zeros(n, dtype=np.int64)
+        np.cumsum(lengths[:-1], out=starts[1:])
+        ids = np.array(ids, dtype=np.int64)
+        positions = np.arange(len(ids)) - np.repeat(starts, lengths)
+        words = list(vocab)
+
+        terms = self.terms
+        missing = np.iinfo(np.int64).max
+        if terms:
+            # erste Position je Item und Term (missing = Term kommt nicht vor)
+            term_hit = np.array([[w.startswith(t) for t in terms] for w in words], dtype=bool)
+            at = np.where(term_hit[ids], positions[:, None], missing)
+            first_at = np.minimum.reduceat(at, starts, axis=0)
+            found = first_at != missing
+            coverage = found.sum(axis=1) / len(terms)
+            first = first_at.min(axis=1)
+        else:
+            coverage = np.zeros(n)
+            first = np.full(n, missing)
+        position = np.where(first != missing, 1.0 / (1 + np.minimum(first, len(ids))), 0.0)
+        accessory = np.zeros(n)
+        if not self.wants_accessory:
+            is_accessory = np.array([w in ACCESSORY_WORDS for w in words], dtype=bool)[ids]
+            # Kontextwort ("für …") vor dem ersten Suchbegriff
+            is_context = np.array([w in CONTEXT_WORDS for w in words], dtype=bool)[ids]
+            is_context &= positions < np.repeat(first, lengths)
+            accessory = np.logical_or.reduceat(is_accessory | is_context, starts).astype(float)
+        return coverage, position, accessory, prices
+
+    def score(self, items, token_lists=None):
+        # Zubehör ist meist ein Bruchteil des Medianpreises -> "zu billig" zählt gegen Relevanz
+        import numpy as np
+
+        if token_lists is None:
+            token_lists = [_tokens(item.get("title")) for item in items]
+        coverage, position, accessory, prices = self._features(items, token_lists)
+        cheap = np.zeros(len(items))
+        priced = ~np.isnan(prices)
+        if priced.sum() >= 3:
+            logs = np.log(prices[priced])
+            cheap[priced] = np.clip((np.median(logs) - logs) / np.log(4), 0, 1)
+        return W_BASE + W_COVERAGE * coverage + W_POSITION * position - W_ACCESSORY * accessory - W_CHEAP * cheap
+
+    def process(self, items):
+        batch = []
+        for item in items:
+            key = item.get("id") or item.get("url")
+            if key and key in self.seen:
+                continue
+            if key:
+                self.seen.add(key)
+            item = normalize_item(item)
+            if self._price_ok(item["price"]):
+                batch.append(item)
+            else:
+                dropped.inc(reason="filtered")
+        if not batch:
+            return []
+        batch, token_lists = self._dedupe(batch, [_tokens(item.get("title")) for item in batch])
+        scores = self.score(batch, token_lists)
+        keep = scores >= self.min_relevance
+        if not keep.all():
+            dropped.inc(int((~keep).sum()), reason="irrelevant")
+        for item, score in zip(batch, scores):
+            item["relevance"] = round(float(score), 3)
+        batch = [item for item, ok in zip(batch, keep) if ok]
+        return sort_items(batch, self.sort, scores[keep])
+
+
+def price_ok(price, min_price=None, max_price=None):
+    # ohne Preis nur, wenn kein Preisfilter gesetzt ist
+    if price is None:
+        return min_price is None and max_price is None
+    return (min_price is None or price >= min_price) and (max_price is None or price <= max_price)
+
+
+def filter_price(items, min_price=None, max_price=None):
+    # für schon verarbeitete Items (Dubletten/Relevanz stehen fest)
+    if min_price is None and max_price is None:
+        return items
+    return [item for item in items if price_ok(item.get("price"), min_price, max_price)]
+
+
+def sort_items(items, sort, scores=None):
+    # stabil, Items ohne Preis ans Ende; "newest" = Eingangsreihenfolge
+    import numpy as np
+
+    if sort == "relevance":
+        if scores is None:
+            scores = np.array([item.get("relevance") or 0.0 for item in items])
+        order = np.argsort(-np.asarray(scores), kind="stable")
+    elif sort in ("price_asc", "price_desc"):
+        prices = np.array([np.nan if item.get("price") is None else item["price"] for item in items], dtype=float)
+        order = np.argsort(-prices if sort == "price_desc" else prices, kind="stable")
+    else:
+        return items
+    return [items[i] for i in order]
+
+
+def process(query, items, min_price=None, max_price=None, sort="relevance"):
+    return Pipeline(query, min_price, max_price, sort).process(items or [])
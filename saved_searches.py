@@ -0,0 +1,194 @@
+import hashlib
+import logging
+import os
+import random
+import threading
+from array import array
+from datetime import timedelta
+
+from models import db, SavedSearch, User, utcnow
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv("SAVED_SEARCH_BATCH", "50"))
+TICK_SECONDS = float(os.getenv("SAVED_SEARCH_TICK", "5"))
+MIN_INTERVAL = int(os.getenv("SAVED_SEARCH_MIN_INTERVAL", "120"))
+DEFAULT_INTERVAL = 600
+MAX_INTERVAL = 7 * 86400
+LEASE_SECONDS = 120
+MAX_SEEN = 5000
+MAX_NEW_ITEMS = 50
+
+_alert_hooks = []
+
+
+def on_new_items(fn):
+    # Hook für Benachrichtigungen: fn(saved_search, new_items)
+    _alert_hooks.append(fn)
+    return fn
+
+
+# --- kompaktes Seen-Set: 64-bit-Hashes, älteste fallen nach MAX_SEEN heraus ---
+
+def item_hash(item_id):
+    return int.from_bytes(hashlib.blake2b(str(item_id).encode(), digest_size=8).digest(), "little")
+
+
+def unpack_seen(blob):
+    seen = array("Q")
+    if blob:
+        seen.frombytes(blob)
+    return seen
+
+
+def pack_seen(seen):
+    if len(seen) > MAX_SEEN:
+        seen = seen[-MAX_SEEN:]
+    return seen.tobytes()
+
+
+def diff_new(items, blob):
+    # liefert (neue Items, neues Seen-Blob)
+    seen = unpack_seen(blob)
+    known = set(seen)
+    new_items = []
+    for item in items:
+        key = item.get("id") or item.get("url")
+        if key is None:
+            continue
+        h = item_hash(key)
+        if h in known:
+            continue
+        known.add(h)
+        seen.append(h)
+        new_items.append(item)
+    return new_items, pack_seen(seen)
+
+
+# --- Anlegen / Verteilen ---
+
+def initial_offset(interval):
+    # neue Suchen gleichmäßig über ein Intervall streuen statt alle sofort
+    return timedelta(seconds=random.uniform(0, interval))
+
+
+def create(user, query, params=None, interval_seconds=DEFAULT_INTERVAL):
+    interval = max(MIN_INTERVAL, int(interval_seconds))
+    saved = SavedSearch(user_id=user.id, search_query=query.strip(), params=params or {},
+                        interval_seconds=interval, next_poll_at=utcnow() + initial_offset(interval))
+    db.session.add(saved)
+    db.session.commit()
+    return saved
+
+
+def next_poll(saved, now):
+    # ±10 % Jitter, damit sich Suchen mit gleichem Intervall nicht wieder bündeln
+    return now + timedelta(seconds=saved.interval_seconds * random.uniform(0.9, 1.1))
+
+
+# --- Polling ---
+
+def claim_due(batch_size=BATCH_SIZE):
+    # fällige Suchen leasen (next_poll_at vorschieben), damit mehrere Worker sich nicht doppeln;
+    # Suchen von Nutzern ohne Premium ruhen (bleiben fällig und laufen wieder, sobald Premium zurück ist)
+    now = utcnow()
+    ids = [row[0] for row in (
+        db.session.query(SavedSearch.id)
+        .join(User, User.id == SavedSearch.user_id)
+        .filter(SavedSearch.next_poll_at <= now, User.is_premium.is_(True))
+        .order_by(SavedSearch.next_poll_at)
+        .limit(batch_size)
+        .all()
+    )]
+    claimed = []
+    lease = now + timedelta(seconds=LEASE_SECONDS)
+    for search_id in ids:
+        updated = (
+            SavedSearch.query.filter(SavedSearch.id == search_id, SavedSearch.next_poll_at <= now)
+            .update({SavedSearch.next_poll_at: lease}, synchronize_session=False)
+        )
+        if updated:
+            claimed.append(search_id)
+    db.session.commit()
+    return claimed
+
+
+def poll(saved, fetch):
+    # fetch(query, pages=…, marketplaces=…) -> Item-Liste; gibt nur die neuen Items zurück
+    params = saved.params or {}
+    now = utcnow()
+    try:
+        items = fetch(saved.search_query, pages=params.get("pages", 1),
+                      marketplaces=tuple(params.get("marketplaces") or ()))
+    except Exception as e:
+        saved.last_error = str(e)
+        saved.next_poll_at = next_poll(saved, now)
+        db.session.commit()
+        raise
+    first_poll = saved.seen_ids is None
+    new_items, saved.seen_ids = diff_new(items, saved.seen_ids)
+    if first_poll:
+        # beim ersten Lauf ist alles "neu" – nur merken, nicht melden
+        new_items = []
+    saved.last_polled_at = now
+    saved.next_poll_at = next_poll(saved, now)
+    saved.last_error = None
+    if new_items:
+        saved.new_count = (saved.new_count or 0) + len(new_items)
+        saved.last_new_items = (new_items + (saved.last_new_items or []))[:MAX_NEW_ITEMS]
+    db.session.commit()
+    if new_items:
+        for hook in _alert_hooks:
+            try:
+                hook(saved, new_items)
+            except Exception:
+                logger.exception("Alert-Hook für SavedSearch %s fehlgeschlagen", saved.id)
+    return new_items
+
+
+def poll_due(fetch, batch_size=BATCH_SIZE):
+    polled = 0
+    for search_id in claim_due(batch_size):
+        saved = db.session.get(SavedSearch, search_id)
+        if saved is None:
+            continue
+        try:
+            poll(saved, fetch)
+        except Exception as e:
+            db.session.rollback()
+            logger.warning("SavedSearch %s: Poll fehlgeschlagen: %s", search_id, e)
+        polled += 1
+    return polled
+
+
+class Scheduler:
+    # pollt fällige Suchen in kleinen Batches pro Tick; max. BATCH_SIZE pro Tick und Prozess
+    def __init__(self, app, fetch, tick=TICK_SECONDS, batch_size=BATCH_SIZE):
+        self.app = app
+        self.fetch = fetch
+        self.tick = tick
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="saved-search-scheduler")
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    poll_due(self.fetch, self.batch_size)
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Saved-Search-Scheduler: Tick fehlgeschlagen")
+                finally:
+                    db.session.remove()
+            self._stop.wait(self.tick * random.uniform(0.8, 1.2))
@@ -0,0 +1,186 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+import shared_store
+
+# SQLiteCache: last_access (LRU) höchstens so oft pro Eintrag schreiben (Sekunden)
+TOUCH_INTERVAL = float(os.getenv("SEARCH_CACHE_TOUCH_INTERVAL", "30"))
+
+
+def normalize_query(query, params=None):
+    # "  iPhone   13 " und "iphone 13" sollen denselben Eintrag treffen
+    key = " ".join((query or "").lower().split())
+    items = sorted((str(k), str(v).strip().lower()) for k, v in (params or {}).items()
+                   if v is not None and str(v).strip() != "")
+    if items:
+        key += "?" + urlencode(items)
+    return key
+
+
+class MemoryCache:
+    # prozesslokaler Cache: TTL + LRU über OrderedDict
+    def __init__(self, max_size=1000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                # abgelaufene Einträge bleiben bis zur LRU-Verdrängung für get_stale liegen
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def peek(self, key):
+        # frischer Wert ohne Statistik/LRU-Update (z. B. für Single-Flight-Wartende)
+        with self._lock:
+            entry = self._data.get(key)
+        return entry[1] if entry is not None and entry[0] > time.time() else None
+
+    def get_stale(self, key):
+        # Notfall-Lesepfad (Upstream down): ignoriert TTL, zählt nicht in die Statistik
+        with self._lock:
+            entry = self._data.get(key)
+        return entry[1] if entry is not None else None
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._data)
+        return _stats("memory", self.hits, self.misses, size, self.max_size, self.ttl)
+
+
+class SQLiteCache:
+    # gemeinsamer Cache für alle Worker über shared_store; Lesen ohne Schreibtransaktion,
+    # Treffer/Fehlschläge zählt jeder Prozess selbst (wie MemoryCache)
+    def __init__(self, path=None, max_size=5000, ttl=300, touch_interval=TOUCH_INTERVAL):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+        # Schema erst beim ersten Zugriff: keine Verbindung vor dem fork (gunicorn --preload)
+        self._ready = threading.Event()
+
+    def _conn(self):
+        conn = shared_store.connect(self.path)
+        if not self._ready.is_set():
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_search_cache_last_access ON search_cache (last_access)")
+            self._ready.set()
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires_at, last_access FROM search_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] <= now:
+            with self._stats_lock:
+                self.misses += 1
+            return None
+        with self._stats_lock:
+            self.hits += 1
+        if now - row[2] > self.touch_interval:
+            # LRU-Zeitstempel nur grob pflegen: ein Statement, bei Schreibstau einfach auslassen
+            try:
+                conn.execute("UPDATE search_cache SET last_access = ? WHERE key = ? AND last_access < ?",
+                             (now, key, now - self.touch_interval))
+            except sqlite3.OperationalError:
+                pass
+        return json.loads(row[0])
+
+    def peek(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM search_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def get_stale(self, key):
+        row = self._conn().execute("SELECT value FROM search_cache WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        conn = self._conn()
+        with shared_store.transaction(conn):
+            conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now),
+            )
+            # LRU: alles jenseits max_size nach letztem Zugriff entfernen
+            conn.execute(
+                "DELETE FROM search_cache WHERE key IN ("
+                " SELECT key FROM search_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,),
+            )
+
+    def delete(self, key):
+        conn = self._conn()
+        with shared_store.transaction(conn):
+            conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        conn = self._conn()
+        with shared_store.transaction(conn):
+            conn.execute("DELETE FROM search_cache")
+
+    def stats(self):
+        size = self._conn().execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+        return _stats("sqlite", self.hits, self.misses, size, self.max_size, self.ttl)
+
+
+def _stats(backend, hits, misses, size, max_size, ttl):
+    total = hits + misses
+    return {
+        "backend": backend,
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else 0.0,
+        "size": size,
+        "max_size": max_size,
+        "ttl": ttl,
+    }
+
+
+def create_cache():
+    backend = os.getenv("SEARCH_CACHE_BACKEND", "memory").lower()
+    ttl = int(os.getenv("SEARCH_CACHE_TTL", "300"))
+    max_size = int(os.getenv("SEARCH_CACHE_SIZE", "1000"))
+    if backend == "sqlite":
+        return SQLiteCache(os.getenv("SEARCH_CACHE_PATH") or None, max_size=max_size, ttl=ttl)
+    return MemoryCache(max_size=max_size, ttl=ttl)
@@ -0,0 +1,53 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Gemeinsame SQLite-Datei für alle Gunicorn-Worker (Cache, Locks, Zähler …)
+DEFAULT_PATH = os.getenv("SHARED_STORE_PATH") or os.path.join("instance", "shared.sqlite3")
+
+_local = threading.local()
+
+
+def connect(path=None):
+    # eine Verbindung pro Thread und Datei, WAL damit Leser nicht blockieren
+    path = path or DEFAULT_PATH
+    conns = getattr(_local, "conns", None)
+    if conns is None or _local.pid != os.getpid():
+        # nach fork nie die Verbindung des Elternprozesses weiterverwenden
+        conns = _local.conns = {}
+        _local.pid = os.getpid()
+    conn = conns.get(path)
+    if conn is None:
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conns[path] = conn
+    return conn
+
+
+@contextmanager
+def transaction(conn, immediate=True):
+    # Autocommit-Verbindung: Transaktion explizit klammern
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+
+
+def close_all():
+    # z. B. nach fork aufrufen, Verbindungen dürfen nicht geteilt werden
+    conns = getattr(_local, "conns", None) or {}
+    for conn in conns.values():
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    conns.clear()
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+import uuid
+
+import shared_store
+
+
+class RemoteFlightError(Exception):
+    # Fehler des führenden Aufrufs in einem anderen Worker (nur die Meldung ist bekannt)
+    pass
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    # Gleichzeitige Aufrufe mit gleichem Key teilen sich einen einzigen fn()-Aufruf.
+    # shared=True koordiniert zusätzlich über eine Lock-Zeile im shared_store über Worker hinweg;
+    # Wartende anderer Worker lesen das Ergebnis dann über lookup() (z. B. aus dem Such-Cache).
+    def __init__(self, shared=False, store_path=None, lock_ttl=15, poll_interval=0.05, error_ttl=2):
+        self.shared = shared
+        self.store_path = store_path
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self.error_ttl = error_ttl
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._store_ready = False
+
+    def do(self, key, fn, lookup=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            if self.shared and lookup is not None:
+                call.result = self._do_shared(key, fn, lookup)
+            else:
+                call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    # --- über Worker hinweg ---
+
+    def _conn(self):
+        conn = shared_store.connect(self.store_path)
+        if not self._store_ready:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS flight_locks ("
+                " key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL, error TEXT)"
+            )
+            self._store_ready = True
+        return conn
+
+    def _acquire(self, conn, key, waited_for=None):
+        # -> (eigenes Flight-Token, None, None) oder (None, laufender Flight, dessen Fehler)
+        now = time.time()
+        with shared_store.transaction(conn):
+            row = conn.execute("SELECT owner, expires_at, error FROM flight_locks WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] > now and (row[2] is None or row[0] == waited_for):
+                return None, row[0], row[2]
+            # frei, abgelaufen oder Fehler eines Flights, auf den dieser Aufruf nicht gewartet hat
+            # (kein Negativ-Cache: Spätere holen selbst neu)
+            token = uuid.uuid4().hex
+            conn.execute(
+                "INSERT OR REPLACE INTO flight_locks (key, owner, expires_at, error) VALUES (?, ?, ?, NULL)",
+                (key, token, now + self.lock_ttl),
+            )
+            return token, None, None
+
+    def _release(self, conn, key, token, error=None):
+        if error is None:
+            conn.execute("DELETE FROM flight_locks WHERE key = ? AND owner = ?", (key, token))
+        else:
+            # Fehler kurz stehen lassen, damit die Wartenden dieses Flights ihn bekommen
+            conn.execute(
+                "UPDATE flight_locks SET expires_at = ?, error = ? WHERE key = ? AND owner = ?",
+                (time.time() + self.error_ttl, str(error) or type(error).__name__, key, token),
+            )
+
+    def _do_shared(self, key, fn, lookup):
+        conn = self._conn()
+        deadline = time.monotonic() + self.lock_ttl
+        waited_for = None
+        while True:
+            token, waited_for, error = self._acquire(conn, key, waited_for)
+            if token is not None:
+                break
+            if error is not None:
+                raise RemoteFlightError(error)
+            value = lookup()
+            if value is not None:
+                return value
+            if time.monotonic() >= deadline:
+                # Führender Worker hängt: selbst holen
+                return fn()
+            time.sleep(self.poll_interval)
+
+        # zwischen Cache-Miss und Lock könnte ein anderer Worker fertig geworden sein
+        value = lookup()
+        if value is not None:
+            self._release(conn, key, token)
+            return value
+        try:
+            value = fn()
+        except Exception as e:
+            self._release(conn, key, token, e)
+            raise
+        self._release(conn, key, token)
+        return value
+
+
+def create_flight(cache_backend=None):
+    mode = os.getenv("SEARCH_SINGLEFLIGHT") or None
+    if mode is None:
+        mode = "shared" if (cache_backend or os.getenv("SEARCH_CACHE_BACKEND", "memory")).lower() == "sqlite" else "local"
+    return SingleFlight(shared=mode.lower() == "shared")
@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+import shared_store
+import stripe_client
+
+# Preise/Produkte aus Stripe für die Anzeige (Premium, Preisseite, Checkout, /_debug/stripe).
+# Ein Stand in shared_store für alle Worker; nach Ablauf der TTL lädt genau ein Prozess im Hintergrund neu,
+# bis dahin gilt der alte Stand. price.*/product.*-Webhooks markieren den Katalog sofort als veraltet.
+CATALOG_TTL = int(os.getenv("STRIPE_CATALOG_TTL", "900"))
+# so oft schaut ein Prozess in shared_store nach einer neueren Version (Sekunden)
+CATALOG_CHECK_INTERVAL = float(os.getenv("STRIPE_CATALOG_CHECK", "5"))
+# so lange gehört ein laufender Refresh einem Prozess (danach darf ein anderer)
+REFRESH_LEASE = 60
+INTERVALS = {"day": "Tag", "week": "Woche", "month": "Monat", "year": "Jahr"}
+CURRENCY_SIGNS = {"EUR": "€", "USD": "$", "GBP": "£"}
+
+logger = logging.getLogger(__name__)
+
+catalog_refreshes = metrics.registry.counter("stripe_catalog_refresh_total", "Stripe-Katalog neu geladen",
+                                             ("result",))
+
+EMPTY = {"prices": {}, "products": {}, "fetched_at": 0}
+_state = {"checked_at": 0.0, "version": None, "data": EMPTY}
+_store_ready = threading.Event()
+last_error = None
+
+
+def enabled():
+    return bool(os.getenv("STRIPE_SECRET_KEY"))
+
+
+def _conn():
+    conn = shared_store.connect()
+    if not _store_ready.is_set():
+        conn.execute("CREATE TABLE IF NOT EXISTS stripe_catalog (id INTEGER PRIMARY KEY CHECK (id = 1), "
+                     "version INTEGER NOT NULL, fetched_at REAL NOT NULL, refresh_until REAL NOT NULL, "
+                     "payload TEXT NOT NULL)")
+        # Platzhalter: Version 0 = noch nie geladen
+        conn.execute("INSERT OR IGNORE INTO stripe_catalog VALUES (1, 0, 0, 0, ?)", (json.dumps(EMPTY),))
+        _store_ready.set()
+    return conn
+
+
+# -------------------------
+# Laden
+# -------------------------
+def _plain(obj):
+    return obj.to_dict() if hasattr(obj, "to_dict") else obj
+
+
+def map_price(price):
+    product = price.get("product")
+    recurring = price.get("recurring") or {}
+    return {
+        "id": price["id"],
+        "product": product.get("id") if isinstance(product, dict) else product,
+        "unit_amount": price.get("unit_amount"),
+        "currency": (price.get("currency") or "eur").upper(),
+        "interval": recurring.get("interval"),
+        "nickname": price.get("nickname"),
+        "lookup_key": price.get("lookup_key"),
+        "active": price.get("active", True),
+    }
+
+
+def map_product(product):
+    return {"id": product["id"], "name": product.get("name"), "description": product.get("description"),
+            "active": product.get("active", True)}
+
+
+def fetch():
+    # aktive Preise + Produkte, alle Seiten
+    stripe = stripe_client.get()
+    with metrics.timed("stripe"):
+        prices = [map_price(_plain(p)) for p in stripe.Price.list(active=True, limit=100).auto_paging_iter()]
+        products = [map_product(_plain(p)) for p in stripe.Product.list(active=True, limit=100).auto_paging_iter()]
+    return {"prices": {p["id"]: p for p in prices}, "products": {p["id"]: p for p in products},
+            "fetched_at": time.time()}
+
+
+def refresh():
+    # synchron laden und für alle Worker ablegen
+    global last_error
+    try:
+        data = fetch()
+    except Exception as e:
+        last_error = str(e)
+        catalog_refreshes.inc(result="error")
+        raise
+    last_error = None
+    conn = _conn()
+    with shared_store.transaction(conn):
+        conn.execute("UPDATE stripe_catalog SET version = version + 1, fetched_at = ?, refresh_until = 0, "
+                     "payload = ? WHERE id = 1", (data["fetched_at"], json.dumps(data)))
+        version = conn.execute("SELECT version FROM stripe_catalog WHERE id = 1").fetchone()[0]
+    _state.update(checked_at=time.time(), version=version, data=data)
+    catalog_refreshes.inc(result="ok")
+    return data
+
+
+def _refresh_in_background(now):
+    # Lease in shared_store: nur ein Prozess lädt, die anderen liefern weiter den alten Stand
+    claimed = _conn().execute("UPDATE stripe_catalog SET refresh_until = ? WHERE id = 1 AND refresh_until < ?",
+                              (now + REFRESH_LEASE, now)).rowcount
+    if not claimed:
+        return False
+
+    def run():
+        try:
+            refresh()
+        except Exception:
+            logger.exception("Stripe-Katalog: Aktualisierung fehlgeschlagen")
+
+    threading.Thread(target=run, name="stripe-catalog", daemon=True).start()
+    return True
+
+
+def get():
+    # {"prices": {id: {...}}, "products": {id: {...}}, "fetched_at": …}; blockiert nie auf Stripe
+    now = time.time()
+    if now - _state["checked_at"] < CATALOG_CHECK_INTERVAL or not enabled():
+        return _state["data"]
+    _state["checked_at"] = now
+    try:
+        conn = _conn()
+        version, fetched_at = conn.execute("SELECT version, fetched_at FROM stripe_catalog WHERE id = 1").fetchone()
+        if version != _state["version"]:
+            payload = conn.execute("SELECT payload FROM stripe_catalog WHERE id = 1").fetchone()[0]
+            _state.update(version=version, data=json.loads(payload))
+        if now - fetched_at > CATALOG_TTL:
+            _refresh_in_background(now)
+    except sqlite3.Error:
+        logger.exception("Stripe-Katalog: shared_store nicht verfügbar")
+    return _state["data"]
+
+
+def version():
+    get()
+    return _state["version"]
+
+
+def request_refresh(min_age=REFRESH_LEASE):
+    # manueller Anstoß (/_debug/stripe?refresh=1): über denselben Lease im Hintergrund, höchstens einmal pro min_age
+    now = time.time()
+    fetched_at = _conn().execute("SELECT fetched_at FROM stripe_catalog WHERE id = 1").fetchone()[0]
+    if now - fetched_at < min_age:
+        return False
+    return _refresh_in_background(now)
+
+
+def invalidate():
+    # Webhook price.*/product.*: beim nächsten Zugriff (irgendein Worker) im Hintergrund neu laden
+    _conn().execute("UPDATE stripe_catalog SET fetched_at = 0, refresh_until = 0 WHERE id = 1")
+    _state["checked_at"] = 0.0
+
+
+# -------------------------
+# Anzeige
+# -------------------------
+def display(price_id):
+    # {"amount": "19.00", "currency": "€", "interval": "Monat"} oder None, wenn der Preis (noch) unbekannt ist
+    price = get()["prices"].get(price_id) if price_id else None
+    if price is None or price.get("unit_amount") is None:
+        return None
+    return {
+        "amount": "%.2f" % (price["unit_amount"] / 100),
+        "currency": CURRENCY_SIGNS.get(price["currency"], price["currency"]),
+        "interval": INTERVALS.get(price.get("interval")),
+    }
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import threading
+
+# Stripe-SDK mit eigenem HTTP-Client: Keep-Alive-Pool, kurze Timeouts, wenige Retries (mit Idempotency-Key)
+STRIPE_CONNECT_TIMEOUT = float(os.getenv("STRIPE_CONNECT_TIMEOUT", "3.05"))
+STRIPE_READ_TIMEOUT = float(os.getenv("STRIPE_READ_TIMEOUT", "10"))
+STRIPE_POOL_SIZE = int(os.getenv("STRIPE_POOL_SIZE", "20"))
+STRIPE_MAX_RETRIES = int(os.getenv("STRIPE_MAX_RETRIES", "1"))
+# gleichzeitige Checkout-Erstellungen pro Prozess; wer länger als QUEUE_TIMEOUT wartet, bekommt CheckoutBusy
+CHECKOUT_CONCURRENCY = int(os.getenv("STRIPE_CHECKOUT_CONCURRENCY", "8"))
+CHECKOUT_QUEUE_TIMEOUT = float(os.getenv("STRIPE_CHECKOUT_QUEUE_TIMEOUT", "2"))
+
+# stripe ist ein großes Paket (~50 ms Import) -> erst beim ersten Checkout/Webhook laden und konfigurieren
+_stripe = None
+_lock = threading.Lock()
+_checkout_slots = threading.BoundedSemaphore(CHECKOUT_CONCURRENCY)
+_async_slots = None
+
+
+class CheckoutBusy(Exception):
+    pass
+
+
+def _http_client(stripe):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=STRIPE_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    try:
+        # *_async-Aufrufe (asgi.py) über einen eigenen httpx-Pool mit denselben Timeouts
+        import httpx
+
+        async_client = stripe.HTTPXClient(timeout=httpx.Timeout(STRIPE_READ_TIMEOUT, connect=STRIPE_CONNECT_TIMEOUT))
+    except ImportError:
+        async_client = None
+    return stripe.RequestsClient(session=session, timeout=(STRIPE_CONNECT_TIMEOUT, STRIPE_READ_TIMEOUT),
+                                 async_fallback_client=async_client)
+
+
+def get():
+    global _stripe
+    if _stripe is None:
+        with _lock:
+            if _stripe is None:
+                import stripe
+
+                stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+                if os.getenv("STRIPE_API_BASE"):
+                    # lokaler Stripe-Stub (bench/stubs.py)
+                    stripe.api_base = os.getenv("STRIPE_API_BASE")
+                stripe.max_network_retries = STRIPE_MAX_RETRIES
+                stripe.default_http_client = _http_client(stripe)
+                _stripe = stripe
+    return _stripe
+
+
+def create_checkout(**params):
+    # Checkout-Session mit Obergrenze für parallele Stripe-Calls (Stau -> schnell CheckoutBusy statt hängen)
+    if not _checkout_slots.acquire(timeout=CHECKOUT_QUEUE_TIMEOUT):
+        raise CheckoutBusy("Checkout gerade ausgelastet – bitte in ein paar Sekunden erneut versuchen.")
+    try:
+        return get().checkout.Session.create(**params)
+    finally:
+        _checkout_slots.release()
+
+
+async def create_checkout_async(**params):
+    global _async_slots
+    if _async_slots is None:
+        # ein Event-Loop pro Prozess (uvicorn-Worker)
+        _async_slots = asyncio.Semaphore(CHECKOUT_CONCURRENCY)
+    try:
+        await asyncio.wait_for(_async_slots.acquire(), CHECKOUT_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise CheckoutBusy("Checkout gerade ausgelastet – bitte in ein paar Sekunden erneut versuchen.") from None
+    try:
+        return await get().checkout.Session.create_async(**params)
+    finally:
+        _async_slots.release()
@@ -0,0 +1,155 @@
+import logging
+from datetime import timedelta
+
+from sqlalchemy import or_
+from sqlalchemy.dialects import postgresql, sqlite
+
+import jobs
+from models import db, StripeEvent, User, utcnow
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200
+MAX_ATTEMPTS = 5
+# Abo-Status, bei denen Premium entzogen wird (past_due behält Premium bis Stripe aufgibt)
+REVOKE_STATUSES = {"canceled", "unpaid", "incomplete_expired"}
+ACTIVE_STATUSES = {"active", "trialing"}
+
+_premium_hooks = []
+
+
+def on_premium_change(fn):
+    # fn(user) nach jeder Änderung von is_premium (z. B. Cache-Invalidierung)
+    _premium_hooks.append(fn)
+    return fn
+
+
+def store(event):
+    # schneller Pfad im Webhook: nur persistieren; True wenn das Event neu ist
+    if hasattr(event, "to_dict"):
+        event = event.to_dict()  # stripe.Event ist ab SDK 8 kein dict mehr
+    insert = postgresql.insert if db.engine.dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(StripeEvent.__table__).values(
+        id=event["id"],
+        type=event["type"],
+        created=int(event.get("created") or 0),
+        payload=event["data"]["object"],
+        status="pending",
+        attempts=0,
+        received_at=utcnow(),
+    ).on_conflict_do_nothing(index_elements=["id"])
+    result = db.session.execute(stmt)
+    db.session.commit()
+    return result.rowcount > 0
+
+
+def pending_count():
+    return StripeEvent.query.filter_by(status="pending").count()
+
+
+def _due(now):
+    return StripeEvent.query.filter(
+        StripeEvent.status == "pending",
+        or_(StripeEvent.next_attempt_at.is_(None), StripeEvent.next_attempt_at <= now),
+    )
+
+
+def next_retry_in():
+    # Sekunden bis zum nächsten zurückgestellten Event (None = keins offen)
+    retry_at = (
+        db.session.query(db.func.min(StripeEvent.next_attempt_at))
+        .filter(StripeEvent.status == "pending", StripeEvent.next_attempt_at.isnot(None))
+        .scalar()
+    )
+    if retry_at is None:
+        return None
+    return max(0.0, (retry_at - utcnow()).total_seconds())
+
+
+# --- Anwenden ---
+
+def _set_premium(user, value, event):
+    if user.premium_event_at is not None and event.created < user.premium_event_at:
+        return False
+    user.premium_event_at = event.created
+    if user.is_premium == value:
+        return False
+    user.is_premium = value
+    return True
+
+
+def _user_for(obj):
+    customer = obj.get("customer")
+    user = None
+    if customer:
+        user = User.query.filter_by(stripe_customer_id=customer).first()
+    if user is None:
+        email = obj.get("customer_email") or (obj.get("customer_details") or {}).get("email")
+        if email:
+            user = User.query.filter_by(email=email).first()
+            if user is not None and customer and not user.stripe_customer_id:
+                user.stripe_customer_id = customer
+    return user
+
+
+def apply(event):
+    # gibt den User zurück, dessen Premium-Status sich geändert hat (oder None)
+    obj = event.payload
+    user = _user_for(obj)
+    if user is None:
+        return None
+    changed = False
+    if event.type == "checkout.session.completed":
+        changed = _set_premium(user, True, event)
+    elif event.type == "customer.subscription.updated":
+        status = obj.get("status")
+        if status in ACTIVE_STATUSES:
+            changed = _set_premium(user, True, event)
+        elif status in REVOKE_STATUSES:
+            changed = _set_premium(user, False, event)
+    elif event.type == "customer.subscription.deleted":
+        changed = _set_premium(user, False, event)
+    return user if changed else None
+
+
+def process_pending(batch_size=BATCH_SIZE):
+    # fällige Events nach Stripe-Zeitstempel anwenden, ein Commit pro Batch;
+    # fehlgeschlagene warten mit Backoff (next_attempt_at) und fallen so aus den nächsten Batches
+    processed = 0
+    while True:
+        events = (
+            _due(utcnow())
+            .order_by(StripeEvent.created, StripeEvent.received_at)
+            .limit(batch_size)
+            .all()
+        )
+        if not events:
+            return processed
+        changed = []
+        for event in events:
+            try:
+                with db.session.begin_nested():
+                    user = apply(event)
+                event.status = "processed"
+                event.processed_at = utcnow()
+                event.next_attempt_at = None
+                if user is not None:
+                    changed.append(user)
+            except Exception as e:
+                event.attempts += 1
+                event.last_error = str(e)
+                if event.attempts >= MAX_ATTEMPTS:
+                    event.status = "failed"
+                else:
+                    event.next_attempt_at = utcnow() + timedelta(seconds=jobs.backoff(event.attempts))
+                logger.warning("Stripe-Event %s (%s) fehlgeschlagen: %s", event.id, event.type, e)
+        db.session.commit()
+        for user in changed:
+            for hook in _premium_hooks:
+                try:
+                    hook(user)
+                except Exception:
+                    logger.exception("Premium-Hook für User %s fehlgeschlagen", user.id)
+        processed += len(events)
+        if len(events) < batch_size:
+            return processed
@@ -0,0 +1,85 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Module liegen im Repo-Root und lesen Pfade/ENV beim Import -> vorher setzen
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+_tmp = tempfile.mkdtemp(prefix="ebay-tests-")
+os.environ["APP_ENV"] = "testing"
+os.environ["SHARED_STORE_PATH"] = os.path.join(_tmp, "shared.sqlite3")
+os.environ["PRICE_HISTORY_PATH"] = os.path.join(_tmp, "price_history")
+os.environ["THUMB_CACHE_PATH"] = os.path.join(_tmp, "thumbs")
+os.environ["SEARCH_CACHE_BACKEND"] = "memory"
+# nie echte eBay-/Stripe-Zugänge aus einer .env benutzen
+os.environ["EBAY_APP_ID"] = ""
+os.environ["EBAY_CERT_ID_PRD"] = ""
+os.environ["STRIPE_SECRET_KEY"] = ""
+
+WEBHOOK_SECRET = "whsec_test"
+
+
+@pytest.fixture
+def app_overrides():
+    # in einem Testmodul überschreiben, um z. B. Rate-Limits einzuschalten
+    return {}
+
+
+@pytest.fixture
+def app(app_overrides):
+    import app as web
+    from models import db
+
+    app = web.create_app("testing", **{"STRIPE_WEBHOOK_SECRET": WEBHOOK_SECRET, **app_overrides})
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    from werkzeug.security import generate_password_hash
+
+    from models import db, User
+
+    def make(email="user@example.com", password="secret", premium=False, **fields):
+        user = User(email=email, password=generate_password_hash(password), is_premium=premium, **fields)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def login(client):
+    def do(email="user@example.com", password="secret"):
+        response = client.post("/login", data={"email": email, "password": password})
+        assert response.status_code == 302
+        return response
+    return do
+
+
+@pytest.fixture
+def upstream():
+    # lokaler Such-Upstream aus bench/stubs.py (ohne künstliche Latenz)
+    from bench.stubs import SearchUpstreamHandler, StubServer
+
+    servers = []
+
+    def start(**config):
+        config.setdefault("latency", 0)
+        server = StubServer(SearchUpstreamHandler, **config).start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.stop()
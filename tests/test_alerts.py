@@ -0,0 +1,85 @@
+from email import message_from_bytes, policy
+
+import pytest
+
+import alerts
+from bench.stubs import SMTPSink
+from models import db, AlertOutbox, SavedSearch
+
+
+@pytest.fixture
+def app_overrides(tmp_path):
+    # Datei statt sqlite:// – die Dispatcher-Threads brauchen eigene Verbindungen (sonst eine geteilte Transaktion)
+    return {"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'alerts.sqlite3'}"}
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    monkeypatch.setattr(alerts, "SENDER_EMAIL", "alerts@example.com")
+    monkeypatch.setattr(alerts, "DIGEST_WINDOW", 0)
+    monkeypatch.setattr(alerts, "BACKOFF_BASE", 0)
+    server = SMTPSink().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def dispatcher(app, sink):
+    pool = alerts.SMTPPool(host="127.0.0.1", port=sink.port, user=None, password=None, starttls=False)
+    dispatcher = alerts.Dispatcher(app, pool=pool, limiter=alerts.RateLimiter(per_minute=0))
+    yield dispatcher
+    dispatcher.stop()
+
+
+def saved_search(user, query):
+    saved = SavedSearch(user_id=user.id, search_query=query, params={})
+    db.session.add(saved)
+    db.session.commit()
+    return saved
+
+
+def items(query, count):
+    return [{"id": f"{query}-{i}", "title": f"{query} #{i}", "price": 10.0 + i,
+             "url": f"https://www.ebay.de/itm/{i}"} for i in range(count)]
+
+
+def statuses():
+    return {row.status for row in AlertOutbox.query.all()}
+
+
+def test_one_digest_per_user_over_pooled_connection(make_user, sink, dispatcher):
+    users = [make_user(email=f"user{i}@example.com") for i in range(3)]
+    for user in users:
+        alerts.enqueue(saved_search(user, "lego"), items("lego", 2))
+    alerts.enqueue(saved_search(users[0], "duplo"), items("duplo", 1))
+
+    assert dispatcher.run_once() == 3
+    assert dispatcher.run_once() == 0
+    assert statuses() == {"sent"}
+    assert sink.stats["messages"] == 3 and sink.stats["connections"] <= 2
+    mails = {m["to"][0]: message_from_bytes(m["data"], policy=policy.default) for m in sink.messages}
+    digest = mails["user0@example.com"]
+    assert digest["From"] == "alerts@example.com"
+    assert "gespeicherten Suchen" in digest["Subject"]
+    body = digest.get_content()
+    assert "lego #1 – 11.00 €" in body and "duplo #0" in body
+
+
+def test_temporary_refusal_is_retried(make_user, sink, dispatcher):
+    sink.config["fail_rate"] = 1.0
+    alerts.enqueue(saved_search(make_user(), "lego"), items("lego", 2))
+    assert dispatcher.run_once() == 1
+    rows = AlertOutbox.query.all()
+    assert {(row.status, row.attempts) for row in rows} == {("pending", 1)}
+    assert "451" in rows[0].last_error and sink.stats["messages"] == 0
+
+    sink.config["fail_rate"] = 0.0
+    db.session.expire_all()
+    assert dispatcher.run_once() == 1
+    assert statuses() == {"sent"} and sink.stats["messages"] == 1
+
+
+def test_nothing_is_queued_without_sender(app, make_user, monkeypatch):
+    monkeypatch.setattr(alerts, "SENDER_EMAIL", None)
+    assert alerts.enqueue(saved_search(make_user(), "lego"), items("lego", 2)) == 0
+    assert AlertOutbox.query.count() == 0
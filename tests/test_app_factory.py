@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import app as web
+import config
+from conftest import ROOT
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError, match="unbekanntes Profil"):
+        config.load("staging")
+
+
+def test_profile_then_overrides(monkeypatch):
+    monkeypatch.setenv("APP_ENV", "development")
+    settings = config.load()
+    assert settings["PROFILE"] == "development" and settings["DEBUG"] and settings["PROXY_FIX_HOPS"] == 0
+    app = web.create_app("production", SECRET_KEY="s", PAGE_CACHE_ENABLED=False)
+    assert app.config["PROFILE"] == "production" and not app.config["DEBUG"]
+    assert app.config["SECRET_KEY"] == "s" and app.config["PAGE_CACHE_ENABLED"] is False
+
+
+def test_factory_builds_independent_apps():
+    first, second = web.create_app("testing"), web.create_app("testing", RATE_LIMITS_ENABLED=True)
+    assert first is not second and not first.config["RATE_LIMITS_ENABLED"]
+    assert {r.rule for r in first.url_map.iter_rules()} == {r.rule for r in second.url_map.iter_rules()}
+
+
+def test_factory_starts_no_threads_before_fork():
+    before = threading.active_count()
+    web.create_app("testing", JOBS_INPROCESS_WORKERS=2)
+    assert threading.active_count() == before
+
+
+def test_import_and_factory_skip_heavy_clients():
+    # frischer Interpreter: Stripe-/HTTP-Clients und Migrate erst bei Bedarf
+    code = ("import sys, app; app.create_app('testing'); "
+            "print(' '.join(m for m in ('stripe', 'requests', 'httpx', 'flask_migrate') if m in sys.modules))")
+    run = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT,
+                         env={**os.environ, "FLASK_RUN_FROM_CLI": ""}, timeout=120)
+    assert run.returncode == 0, run.stderr
+    assert run.stdout.strip() == ""
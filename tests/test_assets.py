@@ -0,0 +1,55 @@
+import gzip
+import json
+
+import pytest
+
+import assets
+
+CSS = "/* Kopf */\nbody {\n    color: red;\n}\n" + ".card { margin: 0 auto; }\n" * 20
+
+
+@pytest.fixture
+def static(tmp_path, monkeypatch):
+    monkeypatch.setattr(assets, "_manifest", {"mtime": None, "files": {}})
+    (tmp_path / "style.css").write_text(CSS)
+    (tmp_path / "tiny.css").write_text("a { color: blue; }")
+    (tmp_path / "img").mkdir()
+    (tmp_path / "img" / "logo.png").write_bytes(b"\x89PNG" + bytes(1000))
+    return tmp_path
+
+
+def test_build_hashes_minifies_and_precompresses(static):
+    manifest = assets.build(str(static))
+    assert set(manifest) == {"style.css", "tiny.css", "img/logo.png"}
+    dist = static / assets.DIST_DIR
+    css = (dist / manifest["style.css"]).read_text()
+    assert "Kopf" not in css and css.startswith("body{color:red}")
+    assert manifest["style.css"] == assets.hashed_name("style.css", css.encode())
+    assert gzip.decompress((dist / (manifest["style.css"] + ".gz")).read_bytes()).decode() == css
+    # zu klein bzw. schon komprimiert: keine .gz
+    assert not (dist / (manifest["tiny.css"] + ".gz")).exists()
+    assert not (dist / (manifest["img/logo.png"] + ".gz")).exists()
+    assert json.loads((dist / assets.MANIFEST).read_text()) == manifest
+
+
+def test_build_is_reproducible(static):
+    first = assets.build(str(static))
+    gz = (static / assets.DIST_DIR / (first["style.css"] + ".gz")).read_bytes()
+    assert assets.build(str(static)) == first
+    assert (static / assets.DIST_DIR / (first["style.css"] + ".gz")).read_bytes() == gz
+
+
+def test_hashed_asset_is_served_immutable_and_compressed(app, client, static):
+    manifest = assets.build(str(static))
+    app.static_folder = str(static)
+    with app.test_request_context():
+        url = assets.asset_url("style.css")
+        assert url == f"/static/dist/{manifest['style.css']}"
+        assert assets.asset_url("unbekannt.css") == "/static/unbekannt.css"
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Cache-Control"] == assets.IMMUTABLE
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert gzip.decompress(response.data).decode().startswith("body{color:red}")
+    plain = client.get(url)
+    assert "Content-Encoding" not in plain.headers and plain.data.decode().startswith("body{")
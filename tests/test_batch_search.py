@@ -0,0 +1,78 @@
+import json
+import time
+
+import pytest
+
+import batch_search
+import ebay_api
+import user_cache
+from models import db, User
+
+
+@pytest.fixture(autouse=True)
+def fresh_quota(app):
+    batch_search._conn().execute("DELETE FROM api_quota")
+
+
+@pytest.fixture
+def token(app, make_user, upstream, monkeypatch):
+    server = upstream(items=4)
+    monkeypatch.setattr(ebay_api, "SEARCH_API_URL", server.url + "/search")
+
+    def issue():
+        make_user(premium=True)
+        # Token per Login holen, die Batch-API dann ohne Session
+        browser = app.test_client()
+        browser.post("/login", data={"email": "user@example.com", "password": "secret"})
+        return browser.post("/api/token").get_json()["token"]
+    return issue
+
+
+def batch(client, token, body):
+    response = client.post("/api/search/batch", json=body, headers={"Authorization": f"Bearer {token}"})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    return response, lines
+
+
+def test_results_stream_per_query(client, token):
+    stamp = time.time_ns()
+    queries = [f"lego {stamp}", {"query": f"playmobil {stamp}", "limit": 2, "sort": "price_asc"}]
+    response, lines = batch(client, token(), {"queries": queries})
+    assert response.status_code == 200 and response.mimetype == "application/x-ndjson"
+    results = {line["index"]: line for line in lines if line["type"] == "result"}
+    # Anzahl nach der Dubletten-Erkennung der Pipeline (fake_items variiert nur wenige Wörter)
+    assert 0 < len(results[0]["items"]) == results[0]["total"] <= 4 and results[0]["error"] is None
+    prices = [item["price"] for item in results[1]["items"]]
+    assert len(prices) == min(2, results[1]["total"]) and prices == sorted(prices)
+    assert lines[-1]["type"] == "end" and lines[-1]["executed"] == 2
+
+
+def test_quota_limits_executed_queries(client, token, monkeypatch):
+    monkeypatch.setattr(batch_search, "QUOTA_PER_WINDOW", 1)
+    stamp = time.time_ns()
+    issued = token()
+    response, lines = batch(client, issued, [f"lego {stamp}", f"duplo {stamp}"])
+    assert response.headers["X-Quota-Remaining"] == "0"
+    assert [line.get("error") for line in lines[:2]] == [None, "Kontingent erschöpft"]
+    assert lines[-1]["executed"] == 1
+    response, _ = batch(client, issued, ["lego"])
+    assert response.status_code == 429 and int(response.headers["Retry-After"]) >= 1
+
+
+@pytest.mark.parametrize("body", [{}, {"queries": []}, {"queries": [{"pages": 2}]},
+                                  {"queries": [{"query": "x", "sort": "egal"}]}])
+def test_invalid_batch_is_rejected(client, token, body):
+    response, _ = batch(client, token(), body)
+    assert response.status_code == 400
+
+
+def test_token_is_required_and_premium_only(client, token):
+    assert client.post("/api/search/batch", json=["lego"]).status_code == 401
+    issued = token()
+    # Abo gekündigt: Token bleibt, die API nicht
+    user = User.query.one()
+    user.is_premium = False
+    db.session.commit()
+    user_cache.invalidate(user.id)
+    response, _ = batch(client, issued, ["lego"])
+    assert response.status_code == 403
@@ -0,0 +1,73 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import ebay_api
+from ebay_api import UpstreamError, fan_out, iter_fan_out
+
+
+@pytest.fixture
+def pool():
+    pool = ThreadPoolExecutor(max_workers=4)
+    yield pool
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def page(*ids, delay=0.0):
+    def task():
+        time.sleep(delay)
+        return [{"id": i, "title": f"Item {i}"} for i in ids]
+    return task
+
+
+def failing():
+    raise UpstreamError("Seite kaputt")
+
+
+def test_results_keep_task_order_and_drop_duplicates(pool):
+    items, complete = fan_out([page("1", "2", delay=0.05), page("2", "3")], pool=pool)
+    assert [i["id"] for i in items] == ["1", "2", "3"]
+    assert complete
+
+
+def test_pages_run_concurrently(pool):
+    start = time.monotonic()
+    fan_out([page(str(i), delay=0.2) for i in range(4)], pool=pool)
+    assert time.monotonic() - start < 0.6
+
+
+def test_deadline_returns_partial_results(pool):
+    release = threading.Event()
+    items, complete = fan_out([page("1"), lambda: release.wait(5) and []], deadline=0.1, pool=pool)
+    release.set()
+    assert [i["id"] for i in items] == ["1"] and not complete
+
+
+def test_failed_page_is_skipped_unless_all_fail(pool):
+    items, complete = fan_out([page("1"), failing], pool=pool)
+    assert [i["id"] for i in items] == ["1"] and not complete
+    with pytest.raises(UpstreamError):
+        fan_out([failing, failing], pool=pool)
+
+
+def test_stream_yields_new_items_per_page(pool):
+    batches = list(iter_fan_out([page("1", "2"), page("2", "3", delay=0.1)], pool=pool))
+    assert [[i["id"] for i in batch] for batch in batches] == [["1", "2"], ["3"]]
+
+
+def test_multi_page_search_uses_offsets(upstream, monkeypatch):
+    server = upstream(items=2)
+    monkeypatch.setattr(ebay_api, "spend_budget", lambda calls=1: None)
+    monkeypatch.setattr(ebay_api, "browse_enabled", lambda: True)
+    client = ebay_api.UpstreamClient(breaker=ebay_api.CircuitBreaker(1, 60))
+    tokens = ebay_api.TokenCache("app", "cert", api_base=server.url, client=client, store_path=":memory:")
+    monkeypatch.setattr(ebay_api, "_browse", ebay_api.BrowseClient("app", "cert", api_base=server.url,
+                                                                   client=client, token_cache=tokens))
+    monkeypatch.setattr(ebay_api, "EBAY_PAGE_SIZE", 2)
+    items = ebay_api.search_ebay_products("lego", pages=3, marketplaces=("EBAY_DE", "EBAY_AT"))
+    # pro Seite eigener Offset; gleiche Items auf beiden Marktplätzen zählen einmal
+    assert sorted(i["url"].rsplit("/", 1)[1] for i in items) == ["0", "1", "2", "3", "4", "5"]
+    assert server.stats["requests"] == 6
+    client.close()
@@ -0,0 +1,107 @@
+from datetime import timedelta
+
+import pytest
+
+import jobs
+from models import db, Job, utcnow
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    registry = {}
+    monkeypatch.setattr(jobs, "_handlers", registry)
+    return registry
+
+
+def test_claim_orders_by_priority_then_run_at(app):
+    low = jobs.enqueue("noop", priority=0)
+    high = jobs.enqueue("noop", priority=10)
+    later = jobs.enqueue("noop", priority=10, delay=60)
+    assert jobs.claim("w1").id == high.id
+    assert jobs.claim("w1").id == low.id
+    # noch nicht fällig
+    assert jobs.claim("w1") is None
+    assert db.session.get(Job, later.id).status == "queued"
+
+
+def test_claimed_job_is_invisible_to_other_workers(app):
+    job = jobs.enqueue("noop")
+    claimed = jobs.claim("w1", visibility_timeout=300)
+    assert claimed.id == job.id
+    assert claimed.status == "running" and claimed.locked_by == "w1" and claimed.attempts == 1
+    assert jobs.claim("w2") is None
+
+
+def test_expired_visibility_timeout_is_reclaimed(app):
+    job = jobs.enqueue("noop")
+    jobs.claim("w1", visibility_timeout=300)
+    # Worker w1 abgestürzt: Lock läuft ab
+    db.session.get(Job, job.id).locked_until = utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    reclaimed = jobs.claim("w2")
+    assert reclaimed.id == job.id
+    assert reclaimed.locked_by == "w2" and reclaimed.attempts == 2
+
+
+def test_run_job_stores_result(app, handlers):
+    handlers["noop"] = lambda payload, job: {"echo": payload["x"]}
+    job = jobs.enqueue("noop", {"x": 1})
+    assert jobs.run_pending() == 1
+    job = db.session.get(Job, job.id)
+    assert job.status == "done" and job.result == {"echo": 1} and job.locked_by is None
+
+
+def test_failing_job_backs_off_then_fails(app, handlers):
+    def boom(payload, job):
+        raise RuntimeError("kaputt")
+
+    handlers["boom"] = boom
+    job = jobs.enqueue("boom", max_attempts=2)
+    assert not jobs.run_job(jobs.claim("w1"))
+    job = db.session.get(Job, job.id)
+    assert job.status == "queued" and "kaputt" in job.last_error
+    assert job.run_at > utcnow()
+    assert jobs.claim("w1") is None
+
+    job.run_at = utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert not jobs.run_job(jobs.claim("w1"))
+    job = db.session.get(Job, job.id)
+    assert job.status == "failed" and job.attempts == 2 and job.finished_at is not None
+
+
+def test_unknown_kind_fails(app):
+    job = jobs.enqueue("does-not-exist", max_attempts=1)
+    jobs.run_pending()
+    job = db.session.get(Job, job.id)
+    assert job.status == "failed" and "does-not-exist" in job.last_error
+
+
+def test_result_after_lost_lease_is_discarded(app, handlers):
+    def slow(payload, job):
+        # während der Handler läuft, läuft die Lease ab und w2 übernimmt den Job
+        stale = db.session.get(Job, job.id)
+        stale.locked_until = utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        assert jobs.claim("w2").id == job.id
+        return {"from": "w1"}
+
+    handlers["slow"] = slow
+    job = jobs.enqueue("slow")
+    assert not jobs.run_job(jobs.claim("w1"))
+    job = db.session.get(Job, job.id)
+    assert job.status == "running" and job.locked_by == "w2" and job.result is None
+
+
+def test_failure_after_lost_lease_leaves_new_owner_alone(app, handlers):
+    def boom(payload, job):
+        db.session.get(Job, job.id).locked_until = utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        jobs.claim("w2")
+        raise RuntimeError("zu spät")
+
+    handlers["boom"] = boom
+    job = jobs.enqueue("boom")
+    assert not jobs.run_job(jobs.claim("w1"))
+    job = db.session.get(Job, job.id)
+    assert job.status == "running" and job.locked_by == "w2" and job.last_error is None
@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+import app as web
+import ebay_api
+import listing_index
+import result_pipeline
+
+
+@pytest.fixture
+def fts(app):
+    listing_index.ensure_schema()
+
+
+def params(query, pages=1, marketplaces=(), **refine):
+    values = {"query": query, "pages": pages, "marketplaces": marketplaces, "min_price": None, "max_price": None,
+              "sort": "relevance", "refined": False}
+    values.update(refine)
+    return values
+
+
+def items(count, prefix="Lego Technic"):
+    # eindeutige Titel, damit die Pipeline nichts als Dublette aussortiert
+    return [{"id": f"it{i}", "title": f"{prefix} {i:04x}{i * 7919:06d} Modell{i}", "price": f"{10 + i}.00",
+             "url": f"https://www.ebay.de/itm/{i}"} for i in range(count)]
+
+
+def test_covered_search_is_answered_locally(fts):
+    listing_index.ingest("lego technic", items(5), pages=1)
+    results = web.local_results(params("Lego  Technic"))
+    assert sorted(r["id"] for r in results) == [f"it{i}" for i in range(5)]
+    # spezifischere Suche, mehr Seiten oder andere Marktplätze -> live
+    assert web.local_results(params("lego technic 42100")) is None
+    assert web.local_results(params("lego technic", pages=2)) is None
+    assert web.local_results(params("lego technic", marketplaces=("EBAY_AT",))) is None
+
+
+def test_local_results_cover_the_whole_scope(fts):
+    scope = params("lego technic", pages=3, marketplaces=("EBAY_AT", "EBAY_DE"))
+    assert web.local_limit(scope) == 3 * ebay_api.EBAY_PAGE_SIZE * 2
+    listing_index.ingest("lego technic", items(280), pages=3, marketplaces=("EBAY_DE", "EBAY_AT"))
+    assert len(web.local_results(scope)) == 280
+
+
+def test_missing_fts_table_falls_back_to_live_search(client, make_user, login, upstream, monkeypatch):
+    server = upstream(items=3)
+    monkeypatch.setattr(ebay_api, "SEARCH_API_URL", server.url + "/search")
+    make_user(premium=True)
+    login()
+    query = f"lego {time.time_ns()}"
+    pages = []
+    for spelling in (query, f"  {query.upper()} "):
+        response = client.get("/search", query_string={"query": spelling, "format": "json"})
+        assert response.get_json()["error"] is None
+        pages.append([item["id"] for item in response.get_json()["items"]])
+    # Stub-Titel unterscheiden sich kaum -> die Pipeline darf Dubletten zusammenfassen
+    assert pages[0] and pages[0] == pages[1] and len(pages[0]) <= 3
+    assert server.stats["requests"] == 1
+
+
+def test_refine_filters_and_sorts_without_second_pipeline_run(app, monkeypatch):
+    processed = result_pipeline.process("lego technic", items(6))
+    relevance = {item["id"]: item["relevance"] for item in processed}
+
+    def no_rerun(self, batch):
+        raise AssertionError("verarbeitete Treffer nicht erneut durch die Pipeline")
+    monkeypatch.setattr(result_pipeline.Pipeline, "process", no_rerun)
+    refined = web.refine_results(params("lego technic", max_price=13.0, sort="price_desc", refined=True), processed)
+    assert [item["price"] for item in refined] == [13.0, 12.0, 11.0, 10.0]
+    assert all(item["relevance"] == relevance[item["id"]] for item in refined)
+
+
+def test_refine_newest_runs_index_rows_through_pipeline(fts):
+    listing_index.ingest("lego technic", items(3), pages=1)
+    listing_index.ingest("lego technic", items(5)[3:], pages=1)
+    refined = web.refine_results(params("lego technic", sort="newest", refined=True), [])
+    assert len(refined) == 5 and all("relevance" in item for item in refined)
+    assert {item["id"] for item in refined[:2]} == {"it3", "it4"}
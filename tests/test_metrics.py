@@ -0,0 +1,73 @@
+import json
+import time
+
+import pytest
+
+import metrics
+import shared_store
+from metrics import Registry
+
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = Registry(store_path=str(tmp_path / "metrics.sqlite3"))
+    registry.counter("jobs_total", "Jobs")
+    registry.gauge("busy", "Beschäftigt")
+    return registry
+
+
+def dead_worker(registry, pid, jobs, busy, age):
+    data = {"jobs_total": {json.dumps([]): jobs}, "busy": {json.dumps([]): busy}}
+    registry._conn().execute("INSERT INTO metrics_workers VALUES (?, 1.0, ?, ?)",
+                             (pid, json.dumps(data), time.time() - age))
+
+
+def test_merge_reads_snapshots_without_writing(registry, monkeypatch):
+    registry.metrics["jobs_total"].inc(3)
+    registry.metrics["busy"].set(2)
+    registry.maybe_flush(force=True)
+    dead_worker(registry, 99999, jobs=4, busy=5, age=metrics.STALE_SECONDS + 1)
+
+    def no_writes(*args, **kwargs):
+        raise AssertionError("merged() darf nicht schreiben")
+    monkeypatch.setattr(shared_store, "transaction", no_writes)
+    monkeypatch.setattr(registry, "maybe_flush", no_writes)
+    merged = registry.merged()
+    # Zähler toter Worker zählen weiter, ihre Gauges nicht
+    assert merged["jobs_total"][json.dumps([])] == 7
+    assert merged["busy"][json.dumps([])] == 2
+
+
+def test_merge_is_reused_until_next_flush(registry):
+    registry.metrics["jobs_total"].inc()
+    registry.maybe_flush(force=True)
+    first = registry.merged()
+    registry.metrics["jobs_total"].inc()
+    registry.maybe_flush(force=True)
+    assert registry.merged() is first
+    assert registry.merged(max_age=0)["jobs_total"][json.dumps([])] == 2
+
+
+def test_flush_retires_dead_workers(registry):
+    dead_worker(registry, 99999, jobs=4, busy=5, age=metrics.STALE_SECONDS + 1)
+    registry.maybe_flush(force=True)
+    pids = [pid for (pid,) in registry._conn().execute("SELECT pid FROM metrics_workers")]
+    assert 99999 not in pids and metrics.RETIRED_PID in pids
+    assert registry.merged()["jobs_total"][json.dumps([])] == 4
+
+
+@pytest.mark.parametrize("path", ["/metrics", "/_debug/cache"])
+def test_internal_addresses_only(client, path):
+    assert client.get(path).status_code == 200
+    assert client.get(path, environ_base={"REMOTE_ADDR": "10.1.2.3"}).status_code == 200
+    assert client.get(path, environ_base={"REMOTE_ADDR": "93.184.216.34"}).status_code == 403
+
+
+@pytest.mark.parametrize("app_overrides", [{"METRICS_TOKEN": "geheim"}])
+@pytest.mark.parametrize("path", ["/metrics", "/_debug/cache"])
+def test_token_is_required_when_configured(client, path):
+    assert client.get(path).status_code == 403
+    assert client.get(path, headers={"Authorization": "Bearer falsch"}).status_code == 403
+    response = client.get(path, headers={"Authorization": "Bearer geheim"},
+                          environ_base={"REMOTE_ADDR": "93.184.216.34"})
+    assert response.status_code == 200
@@ -0,0 +1,19 @@
+import page_cache
+
+
+def test_public_page_served_from_cache_with_etag(client):
+    first = client.get("/pricing")
+    assert first.status_code == 200 and first.headers["ETag"]
+    assert client.get("/pricing").get_data() == first.get_data()
+    again = client.get("/pricing", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304 and again.get_data() == b""
+
+
+def test_fragment_generation_bumps_on_invalidation(app):
+    key = page_cache.fragment_key(1, "Lego  Technic", "v1")
+    assert page_cache.fragment_key(1, "lego technic", "v1") == key
+    page_cache.invalidate_query("lego technic")
+    assert page_cache.fragment_key(1, "lego technic", "v1") != key
+    other = page_cache.fragment_key(2, "lego technic", "v1")
+    page_cache.invalidate_user(1)
+    assert page_cache.fragment_key(2, "lego technic", "v1") == other
@@ -0,0 +1,72 @@
+import json
+import time
+
+import pytest
+
+import ebay_api
+import pagination
+
+
+def test_cursor_round_trip():
+    assert pagination.encode_cursor(0) is None
+    assert pagination.decode_cursor(pagination.encode_cursor(96)) == 96
+
+
+@pytest.mark.parametrize("cursor", [None, "", "kaputt", "e30", pagination.encode_cursor(5)[:-2]])
+def test_broken_cursor_starts_at_first_page(cursor):
+    assert pagination.decode_cursor(cursor) == 0
+
+
+def test_window_spans_batches_and_counts_rest():
+    state = {}
+    pages = list(pagination.window([[1, 2, 3], [4, 5], [6, 7, 8]], offset=2, limit=3, state=state))
+    assert pages == [[3], [4, 5]]
+    assert state == {"total": 8, "next_offset": 5}
+    state = {}
+    assert list(pagination.window([[1, 2]], offset=0, limit=2, state=state)) == [[1, 2]]
+    assert state["next_offset"] is None
+
+
+def test_rechunk():
+    assert list(pagination.rechunk([[1, 2, 3], [4]], 2)) == [[1, 2], [3], [4]]
+
+
+@pytest.fixture
+def search(client, make_user, login, upstream, monkeypatch):
+    server = upstream(items=40)
+    monkeypatch.setattr(ebay_api, "SEARCH_API_URL", server.url + "/search")
+    make_user(premium=True)
+    login()
+    query = f"lego {time.time_ns()}"
+
+    def get(**args):
+        return client.get("/search", query_string={"query": query, **args})
+    return get
+
+
+def test_json_pages_follow_cursor(search):
+    page = search(format="json", page_size=4).get_json()
+    total = page["total"]
+    ids = []
+    while True:
+        assert len(page["items"]) == min(4, total - len(ids))
+        ids += [i["id"] for i in page["items"]]
+        if page["next_cursor"] is None:
+            break
+        page = search(format="json", page_size=4, cursor=page["next_cursor"]).get_json()
+    assert total > 8 and len(ids) == len(set(ids)) == total
+
+
+def test_ndjson_stream(search):
+    response = search(format="ndjson", page_size=3)
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line["type"] for line in lines] == ["meta", "item", "item", "item", "end"]
+    assert lines[-1]["total"] > 3 and pagination.decode_cursor(lines[-1]["next_cursor"]) == 3
+
+
+def test_streamed_html_contains_all_cards(search):
+    response = search(stream=1, page_size=4)
+    assert response.is_streamed
+    html = response.get_data(as_text=True)
+    assert html.count("🛒 Ansehen") == 4 and "<!--flush-->" not in html
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+import price_history
+from price_history import PriceHistory, item_hash
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PriceHistory(root=str(tmp_path), shards=2, dedupe_seconds=0)
+
+
+def series(data):
+    return [(int(h), int(t), round(float(p), 2)) for h, t, p in zip(data["item"], data["ts"], data["price"])]
+
+
+def expected(observations, item_ids):
+    wanted = {item_hash(i) for i in item_ids}
+    rows = [(item_hash(i), ts, float(p)) for i, p, ts in observations if item_hash(i) in wanted]
+    return sorted(rows)
+
+
+def test_load_merges_columns_and_log(store):
+    observations = [(f"item{i % 7}", 10.0 + i, 1000 + i) for i in range(40)]
+    store.record(observations[:25])
+    assert store.compact(0) and store.compact(1)
+    store.record(observations[25:])
+    ids = ["item1", "item4", "item6", "missing"]
+    assert series(store.load(ids)) == expected(observations, ids)
+
+
+def test_render_reads_only_appended_log_rows(store, monkeypatch):
+    reads = []
+    fromfile = np.fromfile
+
+    def counting(f, dtype=None, count=-1):
+        data = fromfile(f, dtype=dtype, count=count)
+        reads.append(len(data))
+        return data
+
+    monkeypatch.setattr(np, "fromfile", counting)
+    observations = [(f"item{i % 5}", float(i), 1000 + i) for i in range(30)]
+    ids = [f"item{i}" for i in range(5)]
+    store.record(observations[:20])
+    store.load(ids)
+    assert sum(reads) == 20
+    reads.clear()
+    store.load(ids[:2])
+    assert reads == []
+    store.record(observations[20:])
+    assert series(store.load(ids)) == expected(observations, ids)
+    assert sum(reads) == 10
+
+
+def test_rotated_log_is_read_from_start(store, monkeypatch):
+    monkeypatch.setattr(price_history, "LOG_TAIL_ROWS", 4)
+    observations = [(f"item{i % 3}", float(i), 1000 + i) for i in range(30)]
+    ids = ["item0", "item1", "item2"]
+    store.record(observations[:10])
+    store.load(ids)
+    store.compact(0)
+    store.compact(1)
+    store.record(observations[10:])
+    assert series(store.load(ids)) == expected(observations, ids)
+    store.record([("item0", 99.0, 5000)])
+    assert series(store.load(ids)) == expected(observations + [("item0", 99.0, 5000)], ids)
+
+
+def test_log_cache_is_bounded(store, monkeypatch):
+    monkeypatch.setattr(price_history, "LOG_CACHE_BYTES", 16 * 10)
+    store.record([(f"item{i}", float(i), 1000) for i in range(40)])
+    ids = [f"item{i}" for i in range(40)]
+    assert len(store.load(ids)) == 40
+    assert len(store._logs) == 1
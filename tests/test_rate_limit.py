@@ -0,0 +1,101 @@
+import uuid
+
+import pytest
+
+import rate_limit
+
+
+@pytest.fixture
+def key():
+    return f"test:{uuid.uuid4().hex}"
+
+
+def test_parse_limits():
+    assert rate_limit.parse_limits("search=30/60, login=20/60,broken") == {
+        "search": (30.0, 0.5),
+        "login": (20.0, 20 / 60),
+    }
+
+
+def test_bucket_allows_burst_then_denies(key):
+    now = 1000.0
+    assert rate_limit.take(key, 3, 1.0, now=now) == (True, 0.0)
+    assert rate_limit.take(key, 3, 1.0, now=now)[0]
+    assert rate_limit.take(key, 3, 1.0, now=now)[0]
+    allowed, wait = rate_limit.take(key, 3, 1.0, now=now)
+    assert not allowed
+    assert wait == pytest.approx(1.0)
+
+
+def test_bucket_refills_over_time(key):
+    now = 1000.0
+    for _ in range(2):
+        assert rate_limit.take(key, 2, 0.5, now=now)[0]
+    assert not rate_limit.take(key, 2, 0.5, now=now)[0]
+    # vor dem nächsten Token weiter abgelehnt (lokal, ohne shared_store)
+    assert not rate_limit.take(key, 2, 0.5, now=now + 1)[0]
+    assert rate_limit.take(key, 2, 0.5, now=now + 2)[0]
+    assert not rate_limit.take(key, 2, 0.5, now=now + 2)[0]
+
+
+def test_buckets_are_per_key(key):
+    now = 1000.0
+    assert rate_limit.take(key, 1, 0.1, now=now)[0]
+    assert not rate_limit.take(key, 1, 0.1, now=now)[0]
+    assert rate_limit.take(key + ":other", 1, 0.1, now=now)[0]
+
+
+def test_budget_denies_beyond_allowance(monkeypatch):
+    monkeypatch.setattr(rate_limit, "EBAY_DAILY_BUDGET", 100)
+    monkeypatch.setattr(rate_limit, "EBAY_BUDGET_BURST", 0.05)
+    # Tagesbeginn in Pacific Time: nur der Burst (5 Calls) ist frei; eigener Tag -> eigener Zähler
+    now = 20000 * 86400 - rate_limit.EBAY_BUDGET_UTC_OFFSET * 3600 + 1
+    assert rate_limit.allowance(now) == 6
+    assert all(rate_limit.spend(now=now) for _ in range(6))
+    assert not rate_limit.spend(now=now)
+    assert rate_limit.used(now) == 6
+
+
+@pytest.fixture
+def app_overrides():
+    return {"RATE_LIMITS_ENABLED": True, "PROXY_FIX_HOPS": 1}
+
+
+@pytest.fixture
+def tight_login(monkeypatch):
+    monkeypatch.setitem(rate_limit.LIMITS, "login", (2, 2 / 60))
+
+
+def login_attempt(client, ip, method="post"):
+    # Client-IP wie von Render: Proxy-Adresse als remote_addr, echte IP in X-Forwarded-For
+    kwargs = {"data": {"email": "x@example.com", "password": "falsch"}} if method == "post" else {}
+    return getattr(client, method)("/login", headers={"X-Forwarded-For": ip},
+                                   environ_base={"REMOTE_ADDR": "10.0.0.1"}, **kwargs)
+
+
+def test_form_views_are_not_limited(client, tight_login):
+    for _ in range(5):
+        assert login_attempt(client, "203.0.113.1", method="get").status_code == 200
+    assert login_attempt(client, "203.0.113.1").status_code == 302
+
+
+def test_submissions_are_limited(client, tight_login):
+    assert login_attempt(client, "203.0.113.2").status_code == 302
+    assert login_attempt(client, "203.0.113.2").status_code == 302
+    response = login_attempt(client, "203.0.113.2")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_anonymous_clients_behind_proxy_get_own_buckets(client, tight_login):
+    for _ in range(2):
+        login_attempt(client, "203.0.113.3")
+    assert login_attempt(client, "203.0.113.3").status_code == 429
+    assert login_attempt(client, "203.0.113.4").status_code == 302
+
+
+def test_only_trusted_hop_counts(client, tight_login):
+    # vom Client vorangestellte Adressen ändern den Bucket nicht
+    for spoofed in ("198.51.100.1", "198.51.100.2"):
+        login_attempt(client, f"{spoofed}, 203.0.113.5")
+    assert login_attempt(client, "198.51.100.3, 203.0.113.5").status_code == 429
@@ -0,0 +1,66 @@
+import pytest
+
+import result_pipeline
+from result_pipeline import Pipeline, parse_price
+
+
+def item(i, title, price="100.00"):
+    return {"id": str(i), "title": title, "price": price, "url": f"https://www.ebay.de/itm/{i}"}
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("12.99", (12.99, None)),
+    ("1.234,56 €", (1234.56, "EUR")),
+    ("GBP 12.50", (12.5, "GBP")),
+    ("$1,234.56", (1234.56, "USD")),
+    ("12,-", (12.0, None)),
+    ({"value": "5.00", "currency": "CHF"}, (5.0, "CHF")),
+    ("", (None, None)),
+])
+def test_parse_price(value, expected):
+    assert parse_price(value) == expected
+
+
+def test_features_match_terms_and_accessories():
+    pipeline = Pipeline("iphone 13")
+    titles = [["apple", "iphone", "13", "pro"], ["hülle", "für", "iphone", "13"], ["samsung", "galaxy"], [],
+              ["iphones", "13er", "ladekabel"]]
+    coverage, position, accessory, prices = pipeline._features([{"price": 1.0}] * 5, titles)
+    assert coverage.tolist() == [1.0, 1.0, 0.0, 0.0, 1.0]
+    assert position.tolist() == [0.5, 1 / 3, 0.0, 0.0, 1.0]
+    assert accessory.tolist() == [0.0, 1.0, 0.0, 0.0, 1.0]
+    assert prices.tolist() == [1.0] * 5
+
+
+def test_accessory_search_keeps_accessories():
+    items = [item(1, "Hülle für iPhone 13", "9.99"), item(2, "Schutzhülle iPhone 13 Pro", "12.00")]
+    assert len(result_pipeline.process("iphone 13 hülle", items)) == 2
+
+
+def test_relisting_keeps_cheaper_offer_in_first_slot():
+    # gleicher Titel (Jaccard 1) -> unabhängig von den MinHash-Permutationen eine Dublette
+    title = "Apple iPhone 13 Pro 128GB Sierrablau wie neu mit Rechnung"
+    items = [item(1, title, "700.00"), item(2, "Apple iPhone 13 Pro 256GB Graphit", "800.00"),
+             item(3, title.upper(), "650.00")]
+    results = result_pipeline.process("iphone 13 pro", items, sort="newest")
+    assert [r["id"] for r in results] == ["3", "2"]
+    assert results[0]["price"] == 650.0
+
+
+def test_batches_dedupe_against_earlier_batches():
+    pipeline = Pipeline("lego technic 42100")
+    title = "LEGO Technic 42100 Liebherr Bagger R 9800 komplett mit Anleitung"
+    assert len(pipeline.process([item(1, title)])) == 1
+    assert pipeline.process([item(2, title.lower()), item(1, title)]) == []
+
+
+def test_empty_titles_are_never_duplicates():
+    results = Pipeline("", min_relevance=0).process([item(1, ""), item(2, ""), item(3, None)])
+    assert len(results) == 3
+
+
+def test_filter_price_keeps_unpriced_items_only_without_bounds():
+    items = [{"price": 5.0}, {"price": None}, {"price": 20.0}]
+    assert result_pipeline.filter_price(items) is items
+    assert result_pipeline.filter_price(items, min_price=10) == [{"price": 20.0}]
+    assert result_pipeline.filter_price(items, max_price=5) == [{"price": 5.0}]
@@ -0,0 +1,56 @@
+import pytest
+
+from models import SavedSearch
+
+
+@pytest.fixture
+def premium(make_user, login):
+    user = make_user(premium=True)
+    login()
+    return user
+
+
+@pytest.mark.parametrize("body", [[1], "lego", 5, None])
+def test_non_object_json_is_rejected(client, premium, body):
+    response = client.post("/saved-searches", json=body)
+    assert response.status_code == 400
+    assert SavedSearch.query.count() == 0
+
+
+@pytest.mark.parametrize("query", [5, ["lego"], {"q": "lego"}, True])
+def test_non_string_query_is_rejected(client, premium, query):
+    response = client.post("/saved-searches", json={"query": query})
+    assert response.status_code == 400
+    assert "query" in response.get_json()["error"]
+
+
+@pytest.mark.parametrize("fields", [
+    {"query": "   "},
+    {"query": "lego", "pages": "viele"},
+    {"query": "lego", "pages": 99},
+    {"query": "lego", "interval_seconds": 1},
+    {"query": "lego", "marketplaces": [1, 2]},
+])
+def test_invalid_fields_are_rejected(client, premium, fields):
+    assert client.post("/saved-searches", json=fields).status_code == 400
+
+
+def test_create_from_json(client, premium):
+    response = client.post("/saved-searches", json={"query": " lego 42100 ", "pages": 2,
+                                                    "marketplaces": ["ebay_de", "EBAY_XX"]})
+    assert response.status_code == 201
+    saved = SavedSearch.query.one()
+    assert saved.search_query == "lego 42100"
+    assert saved.params == {"pages": 2, "marketplaces": ["EBAY_DE"]}
+
+
+def test_create_from_form(client, premium):
+    response = client.post("/saved-searches", data={"query": "lego", "marketplaces": "EBAY_DE,EBAY_AT"})
+    assert response.status_code == 201
+    assert SavedSearch.query.one().params == {"marketplaces": ["EBAY_AT", "EBAY_DE"]}
+
+
+def test_non_premium_is_forbidden(client, make_user, login):
+    make_user()
+    login()
+    assert client.post("/saved-searches", json={"query": "lego"}).status_code == 403
@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+from search_cache import MemoryCache, SQLiteCache, normalize_query
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteCache(str(tmp_path / "cache.sqlite3"), max_size=2, ttl=60, touch_interval=0)
+    return MemoryCache(max_size=2, ttl=60)
+
+
+def test_normalize_query():
+    assert normalize_query("  iPhone   13 ") == normalize_query("iphone 13") == "iphone 13"
+    assert normalize_query("lego", {"pages": 2, "empty": " ", "none": None}) == "lego?pages=2"
+
+
+def test_hit_and_miss_are_counted(cache):
+    assert cache.get("a") is None
+    cache.set("a", [{"id": "1"}])
+    assert cache.get("a") == [{"id": "1"}]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (1, 1, 0.5)
+
+
+def test_expired_entry_stays_available_as_stale(cache):
+    cache.set("a", ["alt"], ttl=-1)
+    assert cache.get("a") is None
+    assert cache.peek("a") is None
+    assert cache.get_stale("a") == ["alt"]
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    cache.set("a", 1)
+    time.sleep(0.01)
+    cache.set("b", 2)
+    time.sleep(0.01)
+    # Zugriff auf "a" macht "b" zum ältesten Eintrag
+    assert cache.get("a") == 1
+    time.sleep(0.01)
+    cache.set("c", 3)
+    assert cache.get_stale("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["size"] == 2
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    SQLiteCache(path).set("lego", ["42100"])
+    assert SQLiteCache(path).get("lego") == ["42100"]
+
@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import RemoteFlightError, SingleFlight
+
+
+def run(target, *args):
+    result = {}
+
+    def wrapper():
+        try:
+            result["value"] = target(*args)
+        except Exception as e:
+            result["error"] = e
+    thread = threading.Thread(target=wrapper)
+    thread.start()
+    return thread, result
+
+
+def slow(started, release, value=None, error=None):
+    def fn():
+        started.set()
+        release.wait(5)
+        if error is not None:
+            raise error
+        return value
+    return fn
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = []
+    started, release = threading.Event(), threading.Event()
+
+    def fn():
+        calls.append(1)
+        return slow(started, release, value=["lego"])()
+    leader, first = run(flight.do, "lego", fn)
+    started.wait(5)
+    follower, second = run(flight.do, "lego", fn)
+    time.sleep(0.05)
+    release.set()
+    leader.join()
+    follower.join()
+    assert first["value"] == second["value"] == ["lego"]
+    assert len(calls) == 1 and flight.in_flight() == 0
+
+
+def test_local_error_is_not_cached():
+    def boom():
+        raise ValueError("kaputt")
+
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do("lego", boom)
+    assert flight.do("lego", lambda: ["ok"]) == ["ok"]
+
+
+@pytest.fixture
+def workers(tmp_path):
+    # zwei Worker-Prozesse, simuliert über zwei Instanzen auf demselben shared_store
+    path = str(tmp_path / "shared.sqlite3")
+    return [SingleFlight(shared=True, store_path=path, poll_interval=0.01) for _ in range(2)]
+
+
+def test_follower_in_other_worker_reads_result_via_lookup(workers):
+    cache = {}
+    started, release = threading.Event(), threading.Event()
+
+    def fetch():
+        value = slow(started, release, value=["lego"])()
+        cache["lego"] = value
+        return value
+    leader, first = run(workers[0].do, "lego", fetch, lambda: cache.get("lego"))
+    started.wait(5)
+    follower, second = run(workers[1].do, "lego", lambda: pytest.fail("doppelter Abruf"), lambda: cache.get("lego"))
+    release.set()
+    leader.join()
+    follower.join()
+    assert first["value"] == second["value"] == ["lego"]
+
+
+def test_error_reaches_waiting_followers_only(workers):
+    started, release = threading.Event(), threading.Event()
+    fetch = slow(started, release, error=ValueError("Upstream down"))
+    leader, first = run(workers[0].do, "lego", fetch, lambda: None)
+    started.wait(5)
+    follower, second = run(workers[1].do, "lego", lambda: ["zu früh"], lambda: None)
+    time.sleep(0.05)
+    release.set()
+    leader.join()
+    follower.join()
+    assert isinstance(first["error"], ValueError)
+    assert isinstance(second["error"], RemoteFlightError) and "Upstream down" in str(second["error"])
+    # später Ankommende starten einen neuen Flight statt den Fehler zu übernehmen
+    assert workers[1].do("lego", lambda: ["neu"], lambda: None) == ["neu"]
@@ -0,0 +1,85 @@
+import json
+import threading
+import time
+
+import pytest
+
+import stripe_catalog
+import stripe_client
+from bench.stubs import StripeHandler, StubServer
+
+
+@pytest.fixture
+def stripe_api(monkeypatch):
+    server = StubServer(StripeHandler, latency=0).start()
+    monkeypatch.setenv("STRIPE_SECRET_KEY", "sk_test_stub")
+    monkeypatch.setenv("STRIPE_API_BASE", server.url)
+    # SDK beim nächsten get() gegen den Stub neu konfigurieren, danach wieder frisch
+    monkeypatch.setattr(stripe_client, "_stripe", None)
+    monkeypatch.setattr(stripe_catalog, "_state", {"checked_at": 0.0, "version": None, "data": stripe_catalog.EMPTY})
+    stripe_catalog._conn().execute("UPDATE stripe_catalog SET version = 0, fetched_at = 0, refresh_until = 0, "
+                                   "payload = ? WHERE id = 1", (json.dumps(stripe_catalog.EMPTY),))
+    yield server
+    server.stop()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_refresh_loads_prices_and_products(stripe_api):
+    data = stripe_catalog.refresh()
+    assert data["prices"]["price_stub"]["currency"] == "EUR"
+    assert data["products"]["prod_stub"]["name"] == "Premium"
+    assert stripe_catalog.display("price_stub") == {"amount": "5.00", "currency": "€", "interval": "Monat"}
+    assert stripe_catalog.display("price_unbekannt") is None
+    # Preise + Produkte über eine Keep-Alive-Verbindung
+    assert stripe_api.stats["requests"] == 2 and stripe_api.stats["connections"] == 1
+
+
+def test_get_serves_snapshot_without_calling_stripe(stripe_api, monkeypatch):
+    stripe_catalog.refresh()
+    calls = stripe_api.stats["requests"]
+    # anderer Worker: liest nur den Stand aus shared_store
+    monkeypatch.setattr(stripe_catalog, "_state", {"checked_at": 0.0, "version": None, "data": stripe_catalog.EMPTY})
+    for _ in range(20):
+        assert "price_stub" in stripe_catalog.get()["prices"]
+    assert stripe_api.stats["requests"] == calls
+
+
+def test_invalidate_reloads_in_background(stripe_api):
+    stripe_catalog.refresh()
+    version = stripe_catalog.version()
+    stripe_catalog.invalidate()
+    # alter Stand sofort, neuer nach dem Hintergrund-Refresh
+    assert "price_stub" in stripe_catalog.get()["prices"]
+    wait_for(lambda: stripe_catalog._state["version"] == version + 1)
+    # Lease: nur ein Prozess lädt
+    now = time.time()
+    stripe_catalog._conn().execute("UPDATE stripe_catalog SET refresh_until = ? WHERE id = 1", (now + 60,))
+    assert not stripe_catalog._refresh_in_background(now)
+
+
+def test_catalog_disabled_without_key(stripe_api, monkeypatch):
+    monkeypatch.setenv("STRIPE_SECRET_KEY", "")
+    assert stripe_catalog.get() is stripe_catalog.EMPTY
+    assert stripe_api.stats["requests"] == 0
+
+
+def test_checkout_reuses_pooled_connection(stripe_api):
+    sessions = [stripe_client.create_checkout(mode="subscription", success_url="https://x.test/ok")
+                for _ in range(3)]
+    assert all(session.id.startswith("cs_test_") for session in sessions)
+    assert stripe_api.stats["requests"] == 3 and stripe_api.stats["connections"] == 1
+
+
+def test_checkout_fails_fast_when_busy(stripe_api, monkeypatch):
+    monkeypatch.setattr(stripe_client, "_checkout_slots", threading.BoundedSemaphore(1))
+    monkeypatch.setattr(stripe_client, "CHECKOUT_QUEUE_TIMEOUT", 0.05)
+    stripe_client._checkout_slots.acquire()
+    with pytest.raises(stripe_client.CheckoutBusy):
+        stripe_client.create_checkout(mode="subscription")
+    assert stripe_api.stats["requests"] == 0
@@ -0,0 +1,68 @@
+import config
+import jobs
+import stripe_events
+from bench.stubs import signed_webhook
+from conftest import WEBHOOK_SECRET
+from models import db, Job, StripeEvent, User
+
+
+def post_event(client, **kwargs):
+    payload, headers = signed_webhook(WEBHOOK_SECRET, **kwargs)
+    return client.post("/webhook", data=payload, headers=headers)
+
+
+def test_invalid_signature_is_rejected(client):
+    payload, headers = signed_webhook("whsec_wrong")
+    assert client.post("/webhook", data=payload, headers=headers).status_code == 400
+    assert StripeEvent.query.count() == 0
+
+
+def test_redelivered_event_is_stored_once(client, make_user):
+    make_user(email="kunde@example.com")
+    obj = {"customer": "cus_1", "customer_email": "kunde@example.com"}
+    for _ in range(3):
+        assert post_event(client, event_id="evt_1", obj=obj).status_code == 200
+    assert StripeEvent.query.count() == 1
+    assert Job.query.filter_by(kind="stripe_events").count() == 1
+
+
+def test_pending_events_grant_premium(client, make_user):
+    user = make_user(email="kunde@example.com")
+    post_event(client, event_id="evt_1", obj={"customer": "cus_1", "customer_email": "kunde@example.com"})
+    assert not db.session.get(User, user.id).is_premium
+    jobs.run_pending()
+    user = db.session.get(User, user.id)
+    assert user.is_premium and user.stripe_customer_id == "cus_1"
+    assert db.session.get(StripeEvent, "evt_1").status == "processed"
+
+
+def test_stale_event_does_not_override_newer_one(client, make_user):
+    user = make_user(email="kunde@example.com", stripe_customer_id="cus_1")
+    post_event(client, event_id="evt_new", event_type="customer.subscription.deleted",
+               obj={"customer": "cus_1"}, created=2000)
+    # verspätet zugestellt, aber älter als die Kündigung
+    post_event(client, event_id="evt_old", event_type="checkout.session.completed",
+               obj={"customer": "cus_1"}, created=1000)
+    jobs.run_pending()
+    assert not db.session.get(User, user.id).is_premium
+    assert stripe_events.pending_count() == 0
+
+
+def test_replaying_processed_event_changes_nothing(client, make_user):
+    user = make_user(email="kunde@example.com", stripe_customer_id="cus_1")
+    post_event(client, event_id="evt_1", obj={"customer": "cus_1"}, created=1000)
+    jobs.run_pending()
+    post_event(client, event_id="evt_2", event_type="customer.subscription.deleted",
+               obj={"customer": "cus_1"}, created=2000)
+    jobs.run_pending()
+    post_event(client, event_id="evt_1", obj={"customer": "cus_1"}, created=1000)
+    assert stripe_events.pending_count() == 0
+    assert not db.session.get(User, user.id).is_premium
+
+
+def test_events_wait_for_the_worker_process_by_default(monkeypatch):
+    # Web-Prozess pollt die Queue nur auf ausdrücklichen Wunsch (worker.py übernimmt)
+    monkeypatch.delenv("JOBS_INPROCESS_WORKERS", raising=False)
+    assert config.load("production")["JOBS_INPROCESS_WORKERS"] == 0
+    monkeypatch.setenv("JOBS_INPROCESS_WORKERS", "2")
+    assert config.load("production")["JOBS_INPROCESS_WORKERS"] == 2
@@ -0,0 +1,91 @@
+import io
+import os
+import time
+
+import pytest
+from PIL import Image
+
+import thumbnails
+from bench.stubs import StubServer, _Handler
+from thumbnails import DiskLRU
+
+
+def png(width=1000, height=500):
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(out, "PNG")
+    return out.getvalue()
+
+
+class ImageHandler(_Handler):
+    # Bild-Quelle wie i.ebayimg.com; /missing.jpg -> 404
+    def do_GET(self):
+        self.stats["requests"] += 1
+        if self.path.startswith("/missing"):
+            return self._send(404, {"error": "not found"})
+        body = self.config["image"]
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def images(monkeypatch, tmp_path):
+    monkeypatch.setattr(thumbnails, "cache", DiskLRU(str(tmp_path / "thumbs")))
+    server = StubServer(ImageHandler, image=png()).start()
+    yield server
+    server.stop()
+
+
+def thumb(app, client, image, width=400, accept="image/jpeg,*/*"):
+    with app.test_request_context():
+        url = thumbnails.thumb_url(image, width)
+    return client.get(url, headers={"Accept": accept})
+
+
+def test_thumbnail_is_resized_and_cached(app, client, images):
+    image = images.url + "/item.png"
+    first = thumb(app, client, image, width=380)
+    assert first.status_code == 200 and first.mimetype == "image/jpeg"
+    assert Image.open(io.BytesIO(first.data)).size == (400, 200)
+    assert "immutable" in first.headers["Cache-Control"]
+    second = thumb(app, client, image, width=380)
+    assert second.data == first.data
+    assert images.stats["requests"] == 1
+    # gleiche ETag -> 304 ohne Body
+    assert client.get(second.request.url, headers={"If-None-Match": second.headers["ETag"],
+                                                   "Accept": "image/jpeg"}).status_code == 304
+
+
+def test_webp_when_accepted(app, client, images):
+    response = thumb(app, client, images.url + "/item.png", width=200, accept="image/webp,*/*")
+    assert response.mimetype == "image/webp"
+    assert Image.open(io.BytesIO(response.data)).format == "WEBP"
+
+
+def test_unsigned_or_unknown_width_is_rejected(app, client, images):
+    image = images.url + "/item.png"
+    assert client.get(f"/img/0000?u={image}&w=400").status_code == 404
+    with app.test_request_context():
+        sig = thumbnails.sign(image, 333, app.config["SECRET_KEY"])
+    assert client.get(f"/img/{sig}?u={image}&w=333").status_code == 404
+    assert images.stats["requests"] == 0
+
+
+def test_broken_source_redirects_to_original(app, client, images):
+    image = images.url + "/missing.jpg"
+    response = thumb(app, client, image)
+    assert response.status_code == 302 and response.headers["Location"] == image
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskLRU(str(tmp_path), max_bytes=250)
+    cache.set("aa1", "jpeg", b"x" * 100)
+    cache.set("bb2", "jpeg", b"x" * 100)
+    old = time.time() - 3600
+    os.utime(cache.path("aa1", "jpeg"), (old, old))
+    cache.set("cc3", "jpeg", b"x" * 100)
+    assert cache.get("aa1", "jpeg") is None
+    assert cache.get("bb2", "jpeg") is not None and cache.get("cc3", "jpeg") is not None
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,236 @@
+import asyncio
+import time
+
+import pytest
+
+import ebay_api
+from bench.stubs import SearchUpstreamHandler, StubServer
+from ebay_api import (AsyncUpstreamClient, CircuitBreaker, CircuitOpenError, UpstreamClient, UpstreamError,
+                      UpstreamStatusError)
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_success_resets_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_breaker_half_open_admits_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    open_breaker(breaker)
+    time.sleep(0.02)
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_breaker_probe_success_closes():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    open_breaker(breaker)
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_breaker_probe_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    open_breaker(breaker)
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_client_retries_then_opens_circuit(upstream):
+    server = upstream(error_rate=1.0)
+    client = UpstreamClient(max_retries=1, backoff_base=0, breaker=CircuitBreaker(1, 60))
+    with pytest.raises(UpstreamError):
+        client.get_json(server.url + "/search", params={"q": "lego"})
+    assert server.stats["requests"] == 2
+    with pytest.raises(CircuitOpenError):
+        client.get_json(server.url + "/search", params={"q": "lego"})
+    assert server.stats["requests"] == 2
+    client.close()
+
+
+def test_client_keeps_connection_alive(upstream):
+    server = upstream(items=3)
+    client = UpstreamClient(breaker=CircuitBreaker(1, 60))
+    for _ in range(3):
+        assert len(client.get_json(server.url + "/search", params={"q": "lego"})) == 3
+    assert server.stats["connections"] == 1
+    assert client.breaker.state == "closed"
+    client.close()
+
+
+class StatusHandler(SearchUpstreamHandler):
+    # antwortet immer mit config["status"]
+    def do_GET(self):
+        self.stats["requests"] += 1
+        self._send(self.config["status"], {"error": "stub"})
+
+
+class ExpiringTokenHandler(SearchUpstreamHandler):
+    # Browse-Stub mit nummerierten Tokens; config["revoked"] lehnt es mit 401 ab
+    def do_GET(self):
+        if self.headers["Authorization"].split()[-1] in self.config.setdefault("revoked", set()):
+            self.stats["rejected"] = self.stats.get("rejected", 0) + 1
+            return self._send(401, {"errors": [{"message": "Invalid access token"}]})
+        super().do_GET()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.stats["tokens"] = self.stats.get("tokens", 0) + 1
+        self._send(200, {"access_token": f"token-{self.stats['tokens']}", "expires_in": 7200})
+
+
+@pytest.fixture
+def status_upstream():
+    servers = []
+
+    def start(status):
+        server = StubServer(StatusHandler, status=status).start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def test_client_error_is_not_retried_nor_a_breaker_success(status_upstream):
+    server = status_upstream(404)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    client = UpstreamClient(max_retries=2, backoff_base=0, breaker=breaker)
+    with pytest.raises(UpstreamStatusError) as info:
+        client.get_json(server.url + "/search", params={"q": "lego"})
+    assert info.value.status_code == 404
+    assert server.stats["requests"] == 1
+    assert breaker.failures == 1 and breaker.state == "closed"
+    client.close()
+
+
+def test_client_error_releases_half_open_probe(status_upstream):
+    server = status_upstream(400)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    open_breaker(breaker)
+    time.sleep(0.02)
+    client = UpstreamClient(breaker=breaker)
+    with pytest.raises(UpstreamStatusError):
+        client.get_json(server.url + "/search")
+    assert breaker.state == "half-open" and breaker.allow()
+    client.close()
+
+
+def test_unretried_server_error_counts_as_failure(status_upstream):
+    server = status_upstream(501)
+    client = UpstreamClient(max_retries=2, breaker=CircuitBreaker(1, 60))
+    with pytest.raises(UpstreamStatusError):
+        client.get_json(server.url + "/search")
+    assert server.stats["requests"] == 1
+    assert client.breaker.state == "open"
+    client.close()
+
+
+def test_browse_client_maps_items(upstream, monkeypatch):
+    server = upstream(items=2)
+    client = UpstreamClient(breaker=CircuitBreaker(1, 60))
+    monkeypatch.setattr(ebay_api, "spend_budget", lambda calls=1: None)
+    tokens = ebay_api.TokenCache("app", "cert", api_base=server.url, client=client, store_path=":memory:")
+    browse = ebay_api.BrowseClient("app", "cert", api_base=server.url, client=client, token_cache=tokens)
+    items = browse.search("lego")
+    assert [set(item) for item in items] == [{"id", "title", "price", "currency", "image", "url"}] * 2
+    assert items[0]["currency"] == "EUR"
+    client.close()
+
+
+def browse_client(server, store_path):
+    client = UpstreamClient(breaker=CircuitBreaker(1, 60))
+    tokens = ebay_api.TokenCache("app", "cert", api_base=server.url, client=client, store_path=store_path)
+    return ebay_api.BrowseClient("app", "cert", api_base=server.url, client=client, token_cache=tokens)
+
+
+def test_token_is_shared_between_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(ebay_api, "spend_budget", lambda calls=1: None)
+    server = StubServer(ExpiringTokenHandler, latency=0, items=1).start()
+    store = str(tmp_path / "tokens.sqlite3")
+    try:
+        for _ in range(3):
+            assert len(browse_client(server, store).search("lego")) == 1
+        assert server.stats["tokens"] == 1
+    finally:
+        server.stop()
+
+
+def test_revoked_token_is_refreshed_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(ebay_api, "spend_budget", lambda calls=1: None)
+    server = StubServer(ExpiringTokenHandler, latency=0, items=1).start()
+    store = str(tmp_path / "tokens.sqlite3")
+    try:
+        browse = browse_client(server, store)
+        browse.search("lego")
+        server.httpd.RequestHandlerClass.config["revoked"] = {"token-1"}
+        assert len(browse.search("lego")) == 1
+        assert server.stats["tokens"] == 2 and server.stats["rejected"] == 1
+        # ein anderer Worker übernimmt das neue Token aus shared_store
+        assert browse_client(server, store).tokens.get() == "token-2"
+        assert browse.client.breaker.state == "closed"
+    finally:
+        server.stop()
+
+
+def test_cancelled_async_probe_releases_breaker(upstream):
+    slow = upstream(latency=2, jitter=0)
+    fast = upstream(items=1)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    open_breaker(breaker)
+    time.sleep(0.02)
+
+    async def scenario():
+        client = AsyncUpstreamClient(breaker=breaker)
+        # wie async_search bei FANOUT_DEADLINE: Probe-Task wird mitten im Request gecancelt
+        probe = asyncio.ensure_future(client.get_json(slow.url + "/search", params={"q": "lego"}))
+        await asyncio.sleep(0.2)
+        assert breaker.state == "half-open" and not breaker.allow()
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        assert breaker.state == "half-open"
+        items = await client.get_json(fast.url + "/search", params={"q": "lego"})
+        await client.aclose()
+        return items
+
+    assert len(asyncio.run(scenario())) == 1
+    assert breaker.state == "closed"
+
+
+def test_retries_stop_at_total_timeout(upstream):
+    server = upstream(latency=1.0, jitter=0)
+    client = UpstreamClient(read_timeout=0.3, max_retries=10, backoff_base=0, total_timeout=0.8,
+                            breaker=CircuitBreaker(5, 60))
+    start = time.monotonic()
+    with pytest.raises(UpstreamError):
+        client.get_json(server.url + "/search", params={"q": "lego"})
+    assert time.monotonic() - start < 1.2
+    assert server.stats["requests"] <= 3
+    client.close()
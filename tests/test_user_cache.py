@@ -0,0 +1,62 @@
+import pytest
+
+import user_cache
+from models import db
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(app, monkeypatch):
+    monkeypatch.setattr(user_cache, "_versions", {"checked_at": float("-inf"), "seen": 0, "data": {}})
+    user_cache._cache.clear()
+
+
+@pytest.fixture
+def store_reads(monkeypatch):
+    reads = []
+    conn = user_cache._conn
+
+    def counting():
+        reads.append(1)
+        return conn()
+    monkeypatch.setattr(user_cache, "_conn", counting)
+    return reads
+
+
+def test_cached_user_needs_no_db_query(make_user):
+    user = make_user()
+    assert user_cache.load(user.id)._record is not None
+    cached = user_cache.load(str(user.id))
+    assert cached._record is None
+    assert (cached.id, cached.email, cached.is_premium) == (user.id, "user@example.com", False)
+
+
+def test_versions_are_polled_not_read_per_request(make_user, monkeypatch, store_reads):
+    monkeypatch.setattr(user_cache, "VERSION_CHECK_INTERVAL", 60)
+    user = make_user()
+    for _ in range(5):
+        user_cache.load(user.id)
+    assert len(store_reads) == 1
+
+
+def test_own_invalidation_is_seen_immediately(make_user, monkeypatch):
+    monkeypatch.setattr(user_cache, "VERSION_CHECK_INTERVAL", 60)
+    user = make_user()
+    assert not user_cache.load(user.id).is_premium
+    user.is_premium = True
+    db.session.commit()
+    user_cache.invalidate(user.id)
+    assert user_cache.load(user.id).is_premium
+
+
+def test_other_workers_invalidation_is_seen_after_interval(make_user, monkeypatch):
+    monkeypatch.setattr(user_cache, "VERSION_CHECK_INTERVAL", 60)
+    user = make_user()
+    user_cache.load(user.id)
+    user.is_premium = True
+    db.session.commit()
+    # anderer Prozess (z. B. Job-Worker mit Stripe-Event): nur shared_store ändert sich
+    user_cache._conn().execute("INSERT OR REPLACE INTO user_versions (user_id, version)"
+                               " SELECT ?, COALESCE(MAX(version), 0) + 1 FROM user_versions", (user.id,))
+    assert not user_cache.load(user.id).is_premium
+    user_cache._versions["checked_at"] = float("-inf")
+    assert user_cache.load(user.id).is_premium
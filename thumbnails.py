@@ -0,0 +1,249 @@
+import hashlib
+import hmac
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from urllib.parse import urlencode, urlsplit
+
+from flask import Response, abort, current_app, redirect, request, url_for
+
+# Bild-Proxy für Ergebnis-Thumbnails: /img/<sig>?u=<bild-url>&w=400
+# Jede Quelle wird einmal geladen, verkleinert (WebP, sonst JPEG) und auf Platte gecacht (LRU nach Größe).
+# Signatur (HMAC mit SECRET_KEY) -> nur von uns gerenderte URLs werden geladen, kein offener Proxy.
+THUMB_CACHE_PATH = os.getenv("THUMB_CACHE_PATH") or os.path.join("instance", "thumbs")
+THUMB_CACHE_MAX_BYTES = int(os.getenv("THUMB_CACHE_MAX_MB", "256")) * 1024 * 1024
+THUMB_WIDTHS = tuple(int(w) for w in os.getenv("THUMB_WIDTHS", "200,400,800").split(","))
+THUMB_WORKERS = int(os.getenv("THUMB_WORKERS", "4"))
+THUMB_QUALITY = int(os.getenv("THUMB_QUALITY", "78"))
+THUMB_TIMEOUT = float(os.getenv("THUMB_TIMEOUT", "8"))
+THUMB_MAX_SOURCE_BYTES = int(os.getenv("THUMB_MAX_SOURCE_MB", "10")) * 1024 * 1024
+THUMB_MAX_AGE = int(os.getenv("THUMB_MAX_AGE", str(30 * 24 * 3600)))
+# Zugriffszeit höchstens so oft auffrischen (spart utime-Syscalls bei heißen Bildern)
+TOUCH_INTERVAL = 300
+
+FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+class ThumbnailError(Exception):
+    pass
+
+
+def sign(url, width, secret):
+    return hmac.new(secret.encode("utf-8"), f"{width}|{url}".encode("utf-8"), hashlib.sha256).hexdigest()[:20]
+
+
+def thumb_url(image, width=400):
+    if not image:
+        return url_for("static", filename="placeholder.jpg")
+    if urlsplit(image).scheme not in ("http", "https"):
+        return image
+    width = min(THUMB_WIDTHS, key=lambda w: abs(w - width))
+    sig = sign(image, width, current_app.config["SECRET_KEY"])
+    return url_for("thumbnail", sig=sig) + "?" + urlencode({"u": image, "w": width})
+
+
+class DiskLRU:
+    # Dateien unter root/ab/<key>.<ext>; mtime = letzter Zugriff, Räumen nach mtime bis 90 % von max_bytes
+    def __init__(self, root=THUMB_CACHE_PATH, max_bytes=THUMB_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.size = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def path(self, key, ext):
+        return os.path.join(self.root, key[:2], f"{key}.{ext}")
+
+    def get(self, key, ext):
+        # Inhalt statt Pfad: ein anderer Worker könnte die Datei direkt danach räumen
+        path = self.path(key, ext)
+        try:
+            with open(path, "rb") as f:
+                mtime = os.fstat(f.fileno()).st_mtime
+                data = f.read()
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        now = time.time()
+        if now - mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+        return data
+
+    def set(self, key, ext, data):
+        path = self.path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self.lock:
+            if self.size is None:
+                self.size = self._scan_size()
+            else:
+                self.size += len(data)
+            if self.size > self.max_bytes:
+                self._evict()
+        return data
+
+    def _entries(self):
+        for base, dirs, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(base, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        # andere Worker schreiben in dasselbe Verzeichnis -> echte Größe neu zählen
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for mtime, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+        self.size = total
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "bytes": self.size, "max_bytes": self.max_bytes}
+
+
+_session = None
+_pool = None
+_pending = {}
+_pending_lock = threading.Lock()
+cache = DiskLRU()
+
+
+def get_session():
+    # requests erst beim ersten Bild laden, nicht beim App-Start
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=THUMB_WORKERS * 2)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+        _session.headers["User-Agent"] = "ebay-thumbs/1.0"
+    return _session
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(THUMB_WORKERS, thread_name_prefix="thumbs")
+    return _pool
+
+
+def fetch_source(url):
+    import requests
+
+    try:
+        with get_session().get(url, timeout=(3, THUMB_TIMEOUT), stream=True) as resp:
+            if resp.status_code != 200:
+                raise ThumbnailError(f"Quelle HTTP {resp.status_code}")
+            chunks, total = [], 0
+            for chunk in resp.iter_content(64 * 1024):
+                total += len(chunk)
+                if total > THUMB_MAX_SOURCE_BYTES:
+                    raise ThumbnailError("Quelle zu groß")
+                chunks.append(chunk)
+            return b"".join(chunks)
+    except requests.RequestException as e:
+        raise ThumbnailError(str(e)) from e
+
+
+def render(data, width, fmt):
+    from PIL import Image
+
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.draft("RGB", (width, width))  # JPEG: schon beim Dekodieren verkleinern
+        img = img.convert("RGB")
+    except Exception as e:
+        raise ThumbnailError(f"kein Bild: {e}") from e
+    if img.width > width:
+        img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+    out = io.BytesIO()
+    if fmt == "webp":
+        img.save(out, "WEBP", quality=THUMB_QUALITY, method=4)
+    else:
+        img.save(out, "JPEG", quality=THUMB_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def cache_key(url, width, fmt):
+    return hashlib.sha256(f"{width}|{fmt}|{url}".encode("utf-8")).hexdigest()
+
+
+def generate(url, width, fmt):
+    key = cache_key(url, width, fmt)
+    data = cache.get(key, fmt)
+    if data is not None:
+        return data
+    return cache.set(key, fmt, render(fetch_source(url), width, fmt))
+
+
+def get_thumbnail(url, width, fmt, timeout=THUMB_TIMEOUT + 2):
+    # gleiche Anfrage parallel -> ein Job im Pool, alle warten darauf
+    key = cache_key(url, width, fmt)
+    data = cache.get(key, fmt)
+    if data is not None:
+        return data
+    with _pending_lock:
+        future = _pending.get(key)
+        if future is None:
+            future = _pending[key] = get_pool().submit(generate, url, width, fmt)
+            future.add_done_callback(lambda f: _pending.pop(key, None))
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        raise ThumbnailError("Timeout") from None
+
+
+def thumbnail(sig):
+    url = request.args.get("u", "")
+    width = request.args.get("w", type=int)
+    if width not in THUMB_WIDTHS or not hmac.compare_digest(sig, sign(url, width, current_app.config["SECRET_KEY"])):
+        abort(404)
+    # nur bei ausdrücklichem image/webp; "*/*" schicken auch Browser ohne WebP (ältere Safari)
+    fmt = "webp" if any(m == "image/webp" and q > 0 for m, q in request.accept_mimetypes) else "jpeg"
+    try:
+        data = get_thumbnail(url, width, fmt)
+    except ThumbnailError as e:
+        # Seite bleibt nutzbar: Browser lädt das Original
+        current_app.logger.warning("Thumbnail %s: %s", url, e)
+        return redirect(url, code=302)
+    response = Response(data, mimetype=FORMATS[fmt])
+    response.set_etag(cache_key(url, width, fmt)[:32])
+    response.headers["Cache-Control"] = f"public, max-age={THUMB_MAX_AGE}, immutable"
+    response.vary.add("Accept")
+    return response.make_conditional(request)
+
+
+def init_app(app):
+    app.add_url_rule("/img/<sig>", "thumbnail", thumbnail)
+    app.jinja_env.globals["thumb_url"] = thumb_url
@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+
+from flask import session
+from flask_login import UserMixin
+
+import shared_store
+from models import db, User
+from search_cache import MemoryCache
+
+# Identitäts-Cache für load_user: spart den User-Query pro Request.
+# Invalidierung über eine Versionsnummer pro User im shared_store, damit auch andere
+# Worker (und der Job-Worker, der Stripe-Events anwendet) Änderungen sehen. Versionen sind global
+# fortlaufend; jeder Prozess holt höchstens alle VERSION_CHECK_INTERVAL Sekunden die neuen Einträge.
+CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "5000"))
+CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "300"))
+VERSION_CHECK_INTERVAL = float(os.getenv("USER_VERSION_CHECK", "5"))
+SESSION_CLAIMS = os.getenv("USER_SESSION_CLAIMS", "0") == "1"
+CLAIM_TTL = int(os.getenv("USER_CLAIM_TTL", "300"))
+CLAIM_KEY = "_uc"
+
+_cache = MemoryCache(max_size=CACHE_SIZE, ttl=CACHE_TTL)
+_store_ready = threading.Event()
+# bekannte Versionen dieses Prozesses (user_id -> version), seen = höchste gelesene Version
+_versions = {"checked_at": float("-inf"), "seen": 0, "data": {}}
+_versions_lock = threading.Lock()
+
+
+class CachedUser(UserMixin):
+    # schlanker Ersatz für User in current_user; alles außer id/email/is_premium lädt den echten Datensatz nach
+    def __init__(self, id, email, is_premium, record=None):
+        self.id = id
+        self.email = email
+        self.is_premium = is_premium
+        self._record = record
+
+    @property
+    def record(self):
+        if self._record is None:
+            self._record = db.session.get(User, self.id)
+        return self._record
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.record, name)
+
+    def __repr__(self):
+        return f'<CachedUser {self.email}>'
+
+
+def _conn():
+    conn = shared_store.connect()
+    if not _store_ready.is_set():
+        conn.execute("CREATE TABLE IF NOT EXISTS user_versions (user_id INTEGER PRIMARY KEY, version INTEGER NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_user_versions_version ON user_versions (version)")
+        _store_ready.set()
+    return conn
+
+
+def _poll(now):
+    # nur Änderungen seit dem letzten Blick (Index auf version), nicht ein Query pro Request
+    with _versions_lock:
+        if now - _versions["checked_at"] < VERSION_CHECK_INTERVAL:
+            return
+        rows = _conn().execute("SELECT user_id, version FROM user_versions WHERE version > ?",
+                               (_versions["seen"],)).fetchall()
+        for user_id, value in rows:
+            _versions["data"][user_id] = value
+            _versions["seen"] = max(_versions["seen"], value)
+        _versions["checked_at"] = now
+
+
+def version(user_id):
+    now = time.monotonic()
+    if now - _versions["checked_at"] >= VERSION_CHECK_INTERVAL:
+        _poll(now)
+    return _versions["data"].get(user_id, 0)
+
+
+def invalidate(user_id):
+    conn = _conn()
+    with shared_store.transaction(conn):
+        # global fortlaufend, damit _poll() mit "version > seen" alle Änderungen findet
+        conn.execute(
+            "INSERT INTO user_versions (user_id, version)"
+            " SELECT ?, COALESCE(MAX(version), 0) + 1 FROM user_versions WHERE true"
+            " ON CONFLICT(user_id) DO UPDATE SET version = excluded.version",
+            (user_id,),
+        )
+        value = conn.execute("SELECT version FROM user_versions WHERE user_id = ?", (user_id,)).fetchone()[0]
+    # dieser Prozess sieht die eigene Änderung sofort, andere spätestens nach VERSION_CHECK_INTERVAL
+    with _versions_lock:
+        _versions["data"][user_id] = max(_versions["data"].get(user_id, 0), value)
+    _cache.delete(user_id)
+
+
+def _claims_user(user_id, current_version):
+    # signierter Session-Cookie (Flask-Session) als schnellster Pfad – kein DB-Zugriff, kein Cache
+    claims = session.get(CLAIM_KEY)
+    if not claims or claims.get("uid") != user_id or claims.get("v") != current_version:
+        return None
+    if claims.get("exp", 0) < time.time():
+        return None
+    return CachedUser(user_id, claims.get("email"), bool(claims.get("premium")))
+
+
+def load(user_id):
+    user_id = int(user_id)
+    current_version = version(user_id)
+    if SESSION_CLAIMS:
+        user = _claims_user(user_id, current_version)
+        if user is not None:
+            return user
+    entry = _cache.get(user_id)
+    if entry is not None and entry[2] == current_version:
+        return CachedUser(user_id, entry[0], entry[1])
+    record = db.session.get(User, user_id)
+    if record is None:
+        return None
+    _cache.set(user_id, (record.email, bool(record.is_premium), current_version))
+    if SESSION_CLAIMS:
+        session[CLAIM_KEY] = {"uid": user_id, "email": record.email, "premium": bool(record.is_premium),
+                              "v": current_version, "exp": int(time.time()) + CLAIM_TTL}
+    return CachedUser(user_id, record.email, bool(record.is_premium), record)
+
+
+def clear_claims():
+    session.pop(CLAIM_KEY, None)
+
+
+def stats():
+    return _cache.stats()
@@ -0,0 +1,15 @@
+import os
+
+from app import app, cached_search  # zuerst: lädt .env, bevor Module ENV lesen
+import alerts
+from jobs import Worker
+from saved_searches import Scheduler
+
+# Separater Worker-Prozess für lange Jobs (eBay-Sync …), z. B. als Render Background Worker
+if __name__ == '__main__':
+    concurrency = int(os.getenv("JOBS_CONCURRENCY", "4"))
+    print(f"\U0001F7E2 Job-Worker gestartet ({concurrency} Threads)")
+    Scheduler(app, cached_search).start()
+    if alerts.enabled():
+        alerts.Dispatcher(app).start()
+    Worker(app, concurrency=concurrency).run()